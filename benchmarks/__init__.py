@@ -0,0 +1 @@
+"""Benchmarks of uchimata, see conftest.py for how to run them."""
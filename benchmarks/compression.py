@@ -0,0 +1,51 @@
+"""
+Size and latency of the IPC payload compression codecs on the bundled datasets.
+
+Measures the IPC buffer compression of the bytes returned by the public API;
+the frame compression of widget payloads uses the same codecs.
+
+Run with:
+    uv run python benchmarks/compression.py
+"""
+
+import pathlib
+import time
+
+import uchimata as uchi
+from uchimata import transport
+
+DATA = pathlib.Path(__file__).parent.parent / "data"
+DATASETS = {
+    "Stevens 2017 (model 1)": DATA / "stevens-2017" / "out" / "Stevens-2017_GSM2219497_Cell_1_model_1.arrow",
+    "Tan 2018 (gm12878_01)": DATA / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow",
+}
+REPEATS = 5
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    print("| dataset | encoding | codec | bytes | ratio | encode ms | decode ms |")
+    print("|---|---|---|---:|---:|---:|---:|")
+    for name, path in DATASETS.items():
+        structure = uchi.Structure(path)
+        for encoding in [None, "float32", "int16"]:
+            table = structure.table if encoding is None else transport.encode_coordinates(structure.table, encoding)
+            uncompressed = None
+            for codec in [None, "lz4", "zstd"]:
+                transport.set_compression(codec, min_bytes=0)
+                encode_time, payload = best_of(lambda: uchi.Structure(table).to_bytes())
+                decode_time, _ = best_of(lambda: uchi.Structure(payload).table)
+                if uncompressed is None:
+                    uncompressed = len(payload)
+                print(f"| {name} | {encoding or 'float64'} | {codec or '-'} | {len(payload):,} "
+                      f"| {uncompressed / len(payload):.2f} | {encode_time * 1e3:.1f} | {decode_time * 1e3:.1f} |")
+    transport.set_compression(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Shared setup of the benchmark suite.
+
+Run the suite with pytest-benchmark, and compare against the stored baseline:
+
+    uv run pytest benchmarks --benchmark-storage=file://benchmarks/baselines --benchmark-compare=0001 \
+        --benchmark-compare-fail=mean:25%
+
+Save a new baseline (e.g. after an intended change, or on another machine):
+
+    uv run pytest benchmarks --benchmark-storage=file://benchmarks/baselines --benchmark-save=baseline
+
+Synthetic structures have 10k and 100k beads by default. --genome-scale adds
+1M and 10M beads, which need a few GB of memory.
+"""
+
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import uchimata as uchi
+from uchimata import structure
+
+from .genomes import GENOME_SCALE_SIZES, SIZES, synthetic_genome
+
+def pytest_addoption(parser):
+    parser.addoption("--genome-scale", action="store_true", default=False,
+                     help="also benchmark synthetic structures with 1M and 10M beads")
+
+def pytest_generate_tests(metafunc):
+    if "num_beads" in metafunc.fixturenames:
+        sizes = SIZES + (GENOME_SCALE_SIZES if metafunc.config.getoption("--genome-scale") else [])
+        metafunc.parametrize("num_beads", sizes, ids=[f"{n // 1000}k" for n in sizes], scope="module")
+
+@pytest.fixture(scope="module")
+def genome(num_beads):
+    return synthetic_genome(num_beads)
+
+@pytest.fixture(scope="module")
+def genome_bytes(genome):
+    points, chroms, coords = genome
+    return uchi.from_numpy(points, chr=chroms, coord=coords)
+
+@pytest.fixture(scope="module")
+def genome_dataframe(genome):
+    points, chroms, coords = genome
+    return pd.DataFrame({"x": points[:, 0], "y": points[:, 1], "z": points[:, 2], "chr": chroms, "coord": coords})
+
+def clear_caches():
+    """Forget decoded structures, so every round measures the path from bytes."""
+    structure._STRUCTURE_CACHE.clear()
+
+# memory pools of the measured runs; buffers allocated from a pool (e.g. an
+# index cached on a fixture) must not outlive it
+_measured_pools = []
+
+@pytest.fixture
+def measure(benchmark):
+    """
+    Benchmark a function with cold caches and record its memory use.
+
+    The function is run once with its memory use recorded first. tracemalloc
+    only sees Python and numpy allocations, so Arrow's native allocations are
+    tracked separately, through a proxy of the default memory pool that is
+    installed for that run. The benchmark's extra_info gets:
+
+    - 'peak_python_mb': peak Python and numpy allocations (tracemalloc)
+    - 'peak_arrow_mb': peak Arrow allocations during the run
+    - 'arrow_retained_mb': Arrow memory still held when the function returns
+      (e.g. the result table)
+    """
+    def run(fn, *args, rounds=5, **kwargs):
+        clear_caches()
+        default_pool = pa.default_memory_pool()
+        pool = pa.proxy_memory_pool(default_pool)
+        _measured_pools.append(pool)
+        pa.set_memory_pool(pool)
+        tracemalloc.start()
+        try:
+            result = fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            pa.set_memory_pool(default_pool)
+        benchmark.extra_info["peak_python_mb"] = round(peak / 2**20, 2)
+        benchmark.extra_info["peak_arrow_mb"] = round(pool.max_memory() / 2**20, 2)
+        benchmark.extra_info["arrow_retained_mb"] = round(pool.bytes_allocated() / 2**20, 2)
+        del result
+
+        return benchmark.pedantic(fn, args=args, kwargs=kwargs, setup=clear_caches, rounds=rounds)
+
+    return run
@@ -0,0 +1,44 @@
+"""
+Inputs of the benchmark suite: the bundled models and synthetic genomes.
+
+Imported by conftest.py (for the fixtures) and by the benchmark modules.
+"""
+
+import pathlib
+
+import numpy as np
+
+DATA = pathlib.Path(__file__).parent.parent / "data"
+STEVENS_MODEL = DATA / "stevens-2017" / "out" / "Stevens-2017_GSM2219497_Cell_1_model_1.arrow"
+TAN_MODEL = DATA / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow"
+
+SIZES = [10_000, 100_000]
+GENOME_SCALE_SIZES = [1_000_000, 10_000_000]
+
+# synthetic genomes: 20 chromosomes of 100 kb bins
+NUM_CHROMOSOMES = 20
+RESOLUTION = 100_000
+
+def synthetic_coordinates(num_beads, seed=0):
+    """A random walk of num_beads steps, shaped like a chromatin fiber."""
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.standard_normal((num_beads, 3), dtype=np.float32), axis=0)
+
+def synthetic_genome(num_beads, seed=0):
+    """
+    Coordinates and genomic columns of a synthetic structure.
+
+    Returns:
+        tuple: (coordinates, chr, coord), an (n, 3) float32 random walk, the
+            chromosome name of each bead ("chr1" to "chr20", equal sizes) and
+            the start of its 100 kb bin.
+    """
+    per_chromosome = -(-num_beads // NUM_CHROMOSOMES)
+    names = np.array([f"chr{i + 1}" for i in range(NUM_CHROMOSOMES)])
+    chroms = np.repeat(names, per_chromosome)[:num_beads]
+    coords = np.tile(np.arange(per_chromosome, dtype=np.int64) * RESOLUTION, NUM_CHROMOSOMES)[:num_beads]
+    return synthetic_coordinates(num_beads, seed), chroms, coords
+
+def rounds_for(num_beads):
+    """Number of benchmark rounds, fewer for larger structures."""
+    return max(1, min(5, 1_000_000 // num_beads))
@@ -0,0 +1,51 @@
+"""
+Text readers versus the line-by-line parsing of the dataset notebooks.
+
+Run with:
+    uv run python benchmarks/readers.py
+"""
+
+import pathlib
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from uchimata.readers import read_3dg
+
+DATA = pathlib.Path(__file__).parent.parent / "data"
+TAN_3DG = DATA / "tan-2018" / "GSE117876_RAW" / "selected" / "GSM3271347_gm12878_01.impute.3dg.txt"
+REPEATS = 5
+
+def notebook_3dg(path):
+    """The parsing loop of data/tan-2018/notebook.ipynb."""
+    x_arr, y_arr, z_arr, chr_arr, coord_arr = [], [], [], [], []
+    with open(path, 'r') as file:
+        for line in file:
+            tokens = line.strip().split("\t")
+            x_arr.append(float(tokens[2]))
+            y_arr.append(float(tokens[3]))
+            z_arr.append(float(tokens[4]))
+            chr_arr.append(tokens[0])
+            coord_arr.append(int(tokens[1]))
+    return pa.Table.from_arrays([np.array(x_arr), np.array(y_arr), np.array(z_arr), np.array(chr_arr),
+                                 np.array(coord_arr)], ["x", "y", "z", "chr", "coord"])
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    baseline = best_of(lambda: notebook_3dg(TAN_3DG))
+    fast = best_of(lambda: read_3dg(TAN_3DG).table)
+    streamed = best_of(lambda: sum(batch.num_rows for batch in read_3dg(TAN_3DG, stream=True)))
+    print(f"notebook loop:      {baseline * 1e3:7.1f} ms")
+    print(f"read_3dg:           {fast * 1e3:7.1f} ms ({baseline / fast:.0f}x)")
+    print(f"read_3dg (stream):  {streamed * 1e3:7.1f} ms ({baseline / streamed:.0f}x)")
+
+if __name__ == "__main__":
+    main()
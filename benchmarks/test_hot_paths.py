@@ -0,0 +1,64 @@
+"""
+Benchmarks of the conversion, query and widget construction paths.
+
+Every benchmark starts from Arrow IPC bytes (or numpy / pandas inputs) with
+the structure caches cleared, as a notebook cell running for the first time
+would. See conftest.py for how to run them and compare with the baseline.
+"""
+
+import pandas as pd
+import pytest
+
+import uchimata as uchi
+
+from .genomes import NUM_CHROMOSOMES, RESOLUTION, STEVENS_MODEL, TAN_MODEL, rounds_for
+
+def test_from_numpy(measure, genome, num_beads):
+    points, chroms, coords = genome
+    measure(uchi.from_numpy, points, chr=chroms, coord=coords, rounds=rounds_for(num_beads))
+
+def test_from_pandas_dataframe(measure, genome_dataframe, num_beads):
+    measure(uchi.from_pandas_dataframe, genome_dataframe, rounds=rounds_for(num_beads))
+
+def test_select_chromosome(measure, genome_bytes, num_beads):
+    measure(uchi.select, genome_bytes, "chr7", rounds=rounds_for(num_beads))
+
+def test_select_range(measure, genome_bytes, num_beads):
+    end = num_beads // NUM_CHROMOSOMES * RESOLUTION // 2
+    measure(uchi.select, genome_bytes, f"chr7:0-{end}", rounds=rounds_for(num_beads))
+
+def test_select_bioframe(measure, genome_bytes, num_beads):
+    # 100 regions of 10 bins on every chromosome
+    starts = [i * 10 * RESOLUTION for i in range(100)]
+    regions = pd.DataFrame({
+        "chrom": [f"chr{c + 1}" for c in range(NUM_CHROMOSOMES) for _ in starts],
+        "start": starts * NUM_CHROMOSOMES,
+        "end": [start + 5 * RESOLUTION for start in starts] * NUM_CHROMOSOMES,
+    })
+    measure(uchi.select_bioframe, genome_bytes, regions, rounds=rounds_for(num_beads))
+
+def test_cut(measure, genome_bytes, num_beads):
+    measure(uchi.cut, genome_bytes, rounds=rounds_for(num_beads))
+
+def test_widget(measure, genome_bytes, num_beads):
+    measure(uchi.Widget, genome_bytes, rounds=rounds_for(num_beads))
+
+def test_widget_lod(measure, genome_bytes, num_beads):
+    measure(uchi.Widget, genome_bytes, lod=8, encoding="int16", rounds=rounds_for(num_beads))
+
+@pytest.fixture(scope="module", params=[STEVENS_MODEL, TAN_MODEL], ids=["stevens", "tan"])
+def bundled_bytes(request):
+    return request.param.read_bytes()
+
+def test_bundled_read(measure, bundled_bytes):
+    measure(lambda data: uchi.Structure(data).table, bundled_bytes)
+
+def test_bundled_select(measure, bundled_bytes):
+    chrom = uchi.Structure(bundled_bytes).index.chromosomes[0]
+    measure(uchi.select, bundled_bytes, chrom)
+
+def test_bundled_cut(measure, bundled_bytes):
+    measure(uchi.cut, bundled_bytes)
+
+def test_bundled_widget(measure, bundled_bytes):
+    measure(uchi.Widget, bundled_bytes)
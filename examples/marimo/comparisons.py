@@ -66,6 +66,28 @@ def _(mo, w4, w5):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""Instead of comparing the models by eye, we can superpose them onto the first model and color the beads by how much they vary between models:""")
+    return
+
+
+@app.cell
+def _(model, model2, model3, model4, model5, uchi):
+    alignment = uchi.align(model, model, model2, model3, model4, model5)
+    alignment.rmsd
+    return (alignment,)
+
+
+@app.cell
+def _(alignment, uchi):
+    uchi.Widget(
+        uchi.select(alignment.reference, "chr f"),
+        viewconfig={"color": {"field": "rmsd", "colorScale": "Viridis"}, "links": True},
+    )
+    return
+
+
 @app.cell
 def _(requests):
     def fetchFile(url):
@@ -52,14 +52,6 @@ def _(mo):
     return
 
 
-@app.cell
-def _(bioframe):
-    assembly_mouse = "mm10"
-    chromsizes_mouse = bioframe.fetch_chromsizes(assembly_mouse)
-    # chromsizes_mouse
-    return (chromsizes_mouse,)
-
-
 @app.cell
 def _(bioframe):
     # taken from here: https://www.encodeproject.org/files/ENCFF871VGR/
@@ -69,21 +61,12 @@ def _(bioframe):
     return (mouse_genes,)
 
 
-@app.cell
-def _(bioframe, chromsizes_mouse, mouse_genes):
-    bins = bioframe.binnify(chromsizes_mouse, 100_000)
-
-    bin_gene_counts = bioframe.count_overlaps(bins, mouse_genes)
-    bin_gene_counts
-    return (bin_gene_counts,)
-
-
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(
         r"""
     ## Process the 3D structures
-    The structures have been published in a format that requires some processing before we can merge / join them with a bedfile-like columnar format.
+    The structures have been published with chromosome names that differ from the 'mm10' assembly, so we rename them first.
     """
     )
     return
@@ -98,90 +81,26 @@ def _(fetchFile):
 
 
 @app.cell
-def _(ipc, model, pa):
-    # Converting the Arrow IPC bytes to Arrow Table and then a pandas dataframe
-    buf = pa.BufferReader(model)
-    reader = ipc.RecordBatchFileReader(buf)
-
-    table = reader.read_all()
-    table_as_df = table.to_pandas()
-    table_as_df
-    return (table_as_df,)
+def _(model, uchi):
+    # rename 'chr a' to 'chr1' etc. (only the dictionary of chromosome names is rewritten)
+    mapping = {f"chr {letter}": f"chr{i + 1}" for i, letter in enumerate("abcdefghijklmnopqrs")}
+    structure = uchi.rename_chromosomes(uchi.Structure(model), mapping)
+    structure
+    return (structure,)
 
 
 @app.cell(hide_code=True)
 def _(mo):
-    mo.md(r"""Next, we need to process the 3D structure dataframe:""")
+    mo.md(r"""## Mapping the genes onto the structure""")
     return
 
 
 @app.cell
-def _(table_as_df):
-    # 1. rename 'chr a' to 'chr1' etc.
-    table_df = table_as_df.copy()
-    mapping = {
-        'chr a': 'chr1',
-        'chr b': 'chr2',
-        'chr c': 'chr3',
-        'chr d': 'chr4',
-        'chr e': 'chr5',
-        'chr f': 'chr6',
-        'chr g': 'chr7',
-        'chr h': 'chr8',
-        'chr i': 'chr9',
-        'chr j': 'chr10',
-        'chr k': 'chr11',
-        'chr l': 'chr12',
-        'chr m': 'chr13',
-        'chr n': 'chr14',
-        'chr o': 'chr15',
-        'chr p': 'chr16',
-        'chr q': 'chr17',
-        'chr r': 'chr18',
-        'chr s': 'chr19',
-        # 'chr a': 'chrX',
-    }
-    table_df['chr'] = table_df['chr'].map(mapping).fillna(table_df['chr'])
-
-    # 2. add 'end' column, based on the binning resolution of the model
-    table_df['end'] = table_df['coord'] + 100_000
-
-    # 3. rename 'coord' to 'start'
-    table_df = table_df.rename(columns={'coord': 'start'})
-
-    # 4. rename 'chr' to 'chrom'
-    table_df = table_df.rename(columns={'chr': 'chrom'})
-
-    table_df
-    return (table_df,)
-
-
-@app.cell(hide_code=True)
-def _(mo):
-    mo.md(r"""## Joining the gene density and structure dataframes""")
-    return
-
-
-@app.cell
-def _(bin_gene_counts, pd, table_df):
-    merged_df = pd.merge(table_df, bin_gene_counts, on=["chrom", "start", "end"], how="inner")
-    merged_df
-    return (merged_df,)
-
-
-@app.cell
-def _(merged_df, pa):
-    merged_table = pa.Table.from_pandas(merged_df)
-    # xyzArrowTable = pa.Table.from_pandas(df)
-    # Convert the Table to bytes
-    output_stream = pa.BufferOutputStream()
-    with pa.ipc.RecordBatchStreamWriter(output_stream, merged_table.schema) as writer:
-        writer.write_table(merged_table)
-
-    # Get the table as Bytes
-    merged_table_bytes = output_stream.getvalue().to_pybytes()
-
-    # merged_table # this actually shouldn't really be needed, because I can just directly feed the pandas DF to uchimata widget
+def _(mouse_genes, structure, uchi):
+    # counts the genes overlapping each bead; the bin size of the model (100 kb) is inferred from its coordinates
+    annotated = uchi.annotate(structure, mouse_genes, how="count")
+    merged_table_bytes = annotated.to_bytes()
+    annotated.table
     return (merged_table_bytes,)
 
 
@@ -16,7 +16,9 @@ Example:
     >>> uchi.Widget(structure, viewconfig={'color': 'red', 'scale': 0.01})
 """
 
+import hashlib
 import importlib.metadata
+import os
 import pathlib
 
 import anywidget
@@ -26,15 +28,29 @@ import numpy as np
 import pandas as pd
 import pyarrow as pa
 
-import duckdb
-import re
-import bioframe
+from . import db, distances, instrumentation, lod, spatial
+from .index import StructureIndex, parse_region
+from .spatial import SpatialIndex
+from . import transport
+from .transport import encode_coordinates, set_compression
+from .structure import Structure, as_structure, _table_from_numpy, _table_to_bytes
+from .ensemble import StructureEnsemble
+from .instrumentation import Stats, stats
+from .readers import LoadResult, load_many, read_3dg, read_pdb, read_xyz
+from .superposition import Alignment, align
 
 try:
     __version__ = importlib.metadata.version("uchimata")
 except importlib.metadata.PackageNotFoundError:
     __version__ = "unknown"
 
+def _as_output(model, result):
+    """Return query results as a Structure for Structure inputs and as bytes otherwise."""
+    if isinstance(model, Structure):
+        return result
+    return result.to_bytes()
+
+@instrumentation.instrumented("select_bioframe")
 def select_bioframe(model, df):
     """
     Select genomic regions from a 3D structure using a bioframe bedframe.
@@ -44,13 +60,16 @@ def select_bioframe(model, df):
     This is useful for extracting specific genomic loci or ranges from a larger structure.
 
     Args:
-        model (bytes): Apache Arrow IPC file bytes containing the 3D structure data.
-            The structure table should have 'chr' and 'coord' columns for genomic positions.
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            should have 'chr' and 'coord' columns for genomic positions.
         df (pd.DataFrame): A bioframe-compatible DataFrame with 'chrom', 'start', and 'end'
             columns defining the genomic regions to select.
 
     Returns:
-        bytes: Apache Arrow IPC stream bytes containing only the selected regions.
+        bytes or Structure: Apache Arrow IPC stream bytes containing only the selected
+            regions, or a Structure if model is a Structure.
 
     Raises:
         ValueError: If df is not a valid bedframe (missing required columns).
@@ -65,34 +84,9 @@ def select_bioframe(model, df):
         ... })
         >>> filtered_model = select_bioframe(model_bytes, regions)
     """
-    # convert arrow Bytes to Table
-    reader = pa.ipc.open_file(model)
-    struct_table = reader.read_all()
-
-    if not bioframe.is_bedframe(df):
-        # This makes sure that there are 'chrom', 'start', 'end' columns in the dataframe
-        raise ValueError("DataFrame is not a valid bedframe.")
-
-    sqlQuery = f'SELECT * FROM struct_table WHERE '
-    for index, row in df.iterrows():
-        chrom = row['chrom']
-        start = row['start']
-        end = row['end']
-        if index > 0:
-            sqlQuery += ' OR '
-        sqlQuery += f'(chr = \'{chrom}\' AND coord >= {start} AND coord <= {end})'
-
-    con = duckdb.connect()
-    new_table = con.execute(sqlQuery).arrow()
-    sink = pa.BufferOutputStream()
-    writer = pa.ipc.new_stream(sink, new_table.schema)
-    writer.write_table(new_table)
-    writer.close()
-
-    # Get the bytes
-    arrow_bytes = sink.getvalue().to_pybytes()
-    return arrow_bytes
+    return _as_output(model, as_structure(model).select_bioframe(df))
 
+@instrumentation.instrumented("cut")
 def cut(model):
     """
     Filter a 3D structure to include only points with positive x coordinates.
@@ -103,37 +97,387 @@ def cut(model):
     a plane.
 
     Args:
-        model (bytes): Apache Arrow IPC stream bytes containing the 3D structure data.
-            The structure table must have an 'x' column for x coordinates.
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have an 'x' column for x coordinates.
 
     Returns:
-        bytes: Apache Arrow IPC stream bytes containing only points where x > 0.
+        bytes or Structure: Apache Arrow IPC stream bytes containing only points
+            where x > 0, or a Structure if model is a Structure.
 
     Example:
         >>> filtered_model = cut(model_bytes)
         >>> # Display only the positive-x half of the structure
         >>> Widget(filtered_model)
     """
-    # convert arrow Bytes to Table
-    buf = pa.BufferReader(model)
-    reader = pa.ipc.RecordBatchStreamReader(buf)
+    return _as_output(model, as_structure(model).cut())
+
+@instrumentation.instrumented("clip")
+def clip(model, plane=None, box=None, sphere=None, slab=None, invert=False):
+    """
+    Filter a 3D structure to the beads inside one or more clip shapes.
+
+    Generalizes cut() to arbitrary half-spaces, axis-aligned boxes, spheres
+    and slabs. Every shape argument takes a single shape tuple or a list of
+    shape tuples, and all shapes are intersected. The mask is computed with
+    numpy directly on the coordinate buffers, in a single pass.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have 'x', 'y' and 'z' columns.
+        plane (tuple or list, optional): Half-space (normal, offset). Keeps points p
+            with dot(normal, p) > offset.
+        box (tuple or list, optional): Axis-aligned box (min_corner, max_corner).
+            Keeps points inside the box, inclusive.
+        sphere (tuple or list, optional): Ball (center, radius). Keeps points within
+            radius of center.
+        slab (tuple or list, optional): Slab (normal, low, high). Keeps points p with
+            low <= dot(normal, p) <= high.
+        invert (bool): Keep the points outside the intersection of the shapes instead.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing only the clipped
+            points, or a Structure if model is a Structure.
+
+    Example:
+        >>> # Same as cut(model_bytes)
+        >>> half = clip(model_bytes, plane=((1, 0, 0), 0))
+        >>>
+        >>> # Look inside the nucleus: remove a ball around the center
+        >>> shell = clip(model_bytes, sphere=((0, 0, 0), 3.0), invert=True)
+        >>>
+        >>> # Thin slab through the structure, limited to a box
+        >>> Widget(clip(model_bytes, slab=((0, 0, 1), -0.5, 0.5), box=((-5, -5, -5), (5, 5, 5))))
+    """
+    return _as_output(model, as_structure(model).clip(plane=plane, box=box, sphere=sphere, slab=slab, invert=invert))
+
+def neighbors(model, point_or_locus, radius):
+    """
+    Select the beads of a 3D structure within a distance of a point or locus.
+
+    Uses the structure's spatial index (a uniform voxel grid built on first
+    use and cached with the structure), so only the beads in grid cells near
+    the query are inspected.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+        point_or_locus: Query point (x, y, z), or a locus string in the format
+            accepted by select() (e.g. "chr1:1000-2000"), which stands for the
+            centroid of its beads.
+        radius (float): Search radius, in the units of the coordinates.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the beads within
+            radius, or a Structure if model is a Structure.
+
+    Raises:
+        ValueError: If the locus does not contain any beads.
+
+    Example:
+        >>> # Everything within 2 units of a locus
+        >>> Widget(neighbors(model_bytes, "chr a:3000000-3100000", 2.0))
+    """
+    return _as_output(model, as_structure(model).neighbors(point_or_locus, radius))
+
+def nearest(model, point_or_locus, k):
+    """
+    Select the k beads of a 3D structure nearest to a point or locus.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+        point_or_locus: Query point (x, y, z), or a locus string in the format
+            accepted by select(), which stands for the centroid of its beads.
+        k (int): Number of neighbours.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the k nearest
+            beads, or a Structure if model is a Structure.
+
+    Raises:
+        ValueError: If the locus does not contain any beads.
+
+    Example:
+        >>> Widget(nearest(model_bytes, (0.0, 0.0, 0.0), 100))
+    """
+    return _as_output(model, as_structure(model).nearest(point_or_locus, k))
+
+def coarsen(model, factor, sum=lod.COUNT_COLUMNS):
+    """
+    Reduce the resolution of a 3D structure by merging consecutive beads.
+
+    Every `factor` consecutive beads of a chromosome become one bead at their
+    mean position. Floating point value columns are averaged, the count
+    columns named in `sum` are summed and other integer columns (e.g. IDs or
+    categories) keep the first bead's value, using vectorized group
+    reductions.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+        factor (int): Number of beads merged into one.
+        sum (tuple): Names of the count columns to sum. Defaults to 'count',
+            the column annotate() counts intervals in.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the coarsened
+            structure, or a Structure if model is a Structure.
+
+    Raises:
+        ValueError: If factor is smaller than 1, or a column to sum is not
+            numeric.
+
+    Example:
+        >>> Widget(coarsen(model_bytes, 4))
+        >>> Widget(coarsen(annotate(model_bytes, peaks, name="peaks"), 4, sum=("peaks",)))
+    """
+    return _as_output(model, as_structure(model).coarsen(factor, sum))
+
+def pyramid(model, factors=(2, 4, 8), sum=lod.COUNT_COLUMNS):
+    """
+    Build a multi-resolution (level-of-detail) pyramid of a 3D structure.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+        factors (tuple): Coarsening factors of the levels to build.
+        sum (tuple): Names of the count columns to sum, see coarsen().
+
+    Returns:
+        dict: Apache Arrow IPC stream bytes (or Structures, if model is a
+            Structure) keyed by coarsening factor, including the full
+            resolution under factor 1.
+
+    Example:
+        >>> levels = pyramid(model_bytes, factors=(2, 4, 8, 16))
+        >>> Widget(levels[16])
+    """
+    return {factor: _as_output(model, level) for factor, level in as_structure(model).pyramid(factors, sum).items()}
+
+def rename_chromosomes(model, mapping):
+    """
+    Rename the chromosomes of a 3D structure.
+
+    The 'chr' column is stored as an Arrow dictionary column, so only the
+    dictionary of chromosome names is rewritten, whatever the number of beads.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have a 'chr' column.
+        mapping (dict or callable): New name for each chromosome name, e.g.
+            {"chr a": "chr1"} or a function. Names missing from a dict are kept.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the renamed
+            structure, or a Structure if model is a Structure.
+
+    Example:
+        >>> renamed = rename_chromosomes(model_bytes, {"chr a": "chr1", "chr b": "chr2"})
+    """
+    return _as_output(model, as_structure(model).rename_chromosomes(mapping))
 
-    # table = reader.read_all()
-    struct_table = reader.read_all()
+def split_haplotypes(model):
+    """
+    Move haplotype suffixes of chromosome names into a 'haplotype' column.
+
+    Phased structures (e.g. Tan et al. 2018) name chromosomes like "15(pat)"
+    and "15(mat)". After splitting, 'chr' holds "15" and 'haplotype' holds
+    "pat" or "mat". select() still accepts "15(pat)" for one haplotype, and
+    "15" selects both.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have a 'chr' column.
 
-    sqlQuery = f'SELECT * FROM struct_table WHERE x > 0'
-    
-    con = duckdb.connect()
-    new_table = con.execute(sqlQuery).arrow()
-    sink = pa.BufferOutputStream()
-    writer = pa.ipc.new_stream(sink, new_table.schema)
-    writer.write_table(new_table)
-    writer.close()
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the split
+            structure, or a Structure if model is a Structure.
+
+    Example:
+        >>> model = split_haplotypes(Structure(model_bytes))
+        >>> model = rename_chromosomes(model, lambda name: f"chr{name}")
+        >>> Widget(select(model, "chr16(mat)"))
+    """
+    return _as_output(model, as_structure(model).split_haplotypes())
+
+def annotate(model, track, how="count", value="value", name=None, resolution=None):
+    """
+    Map a genomic track onto the beads of a 3D structure.
 
-    # Get the bytes
-    arrow_bytes = sink.getvalue().to_pybytes()
-    return arrow_bytes
+    Every bead stands for a genomic bin, from 'coord' to 'end' or, without an
+    'end' column, to 'coord' plus the resolution of the model (inferred from
+    the bead coordinates). The intervals of the track overlapping each bin are
+    counted, or their values summed or averaged, and the result is added as a
+    new column, ready to be used as a viewconfig field.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have 'chr' and 'coord' columns.
+        track (pd.DataFrame or pa.Table): Intervals with 'chrom', 'start' and
+            'end' columns, e.g. a bioframe bedframe. Chromosome names must
+            match the 'chr' column (see rename_chromosomes()).
+        how (str): "count" (number of overlapping intervals), "sum" or "mean"
+            (of the track's `value` column).
+        value (str): Column of the track aggregated by "sum" and "mean".
+        name (str, optional): Name of the new column. Defaults to "count", or
+            e.g. "value_sum" for how="sum".
+        resolution (int, optional): Bin width in base pairs, instead of the
+            inferred one.
+
+    Returns:
+        bytes or Structure: Apache Arrow IPC stream bytes containing the
+            annotated structure, or a Structure if model is a Structure.
+
+    Raises:
+        ValueError: If `how` is not supported, the track is missing columns,
+            or the resolution cannot be inferred.
+
+    Example:
+        >>> genes = bioframe.read_table(url, schema="gtf").query('feature=="CDS"')
+        >>> model = rename_chromosomes(Structure(model_bytes), {"chr a": "chr1"})
+        >>> Widget(annotate(model, genes), viewconfig={"color": {"field": "count", "colorScale": "Blues"}})
+    """
+    return _as_output(model, as_structure(model).annotate(track, how=how, value=value, name=name, resolution=resolution))
+
+def bounds(model):
+    """
+    Compute the bounding box and centroid of a 3D structure.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+
+    Returns:
+        dict: 'min' and 'max' corners of the bounding box, 'centroid' and
+            'count' (number of beads).
+
+    Example:
+        >>> bounds(model_bytes)["centroid"]
+        [0.12, -0.53, 1.08]
+    """
+    return as_structure(model).bounds
+
+def frame(*models, center=True, normalize=True):
+    """
+    Compute one display frame for several 3D structures.
+
+    Passing the frame to several widgets shows their structures at the same
+    position and scale, e.g. to compare models side by side.
+
+    Args:
+        *models: Structure inputs (bytes, paths or Structures) or
+            StructureEnsembles. The frame covers all their beads.
+        center (bool): Move the common centroid to the origin.
+        normalize (bool): Scale the common bounding box to unit size.
+
+    Returns:
+        dict: Frame with 'offset' and 'scale', see uchimata.spatial.frame().
 
+    Example:
+        >>> f = frame(model1, model2)
+        >>> Widget(model1, frame=f)
+        >>> Widget(model2, frame=f)
+    """
+    structures = []
+    for model in models:
+        structures.extend(model.to_structures() if isinstance(model, StructureEnsemble) else [as_structure(model)])
+    return spatial.frame(spatial.merge_bounds([s.bounds for s in structures]), center, normalize)
+
+def distance_matrix(model, region_a=None, region_b=None, dtype=np.float32, out=None,
+                    block_size=distances.BLOCK_SIZE, workers=None):
+    """
+    Compute the matrix of 3D distances between the beads of genomic regions.
+
+    The regions are looked up in the structure's genomic index, so only the
+    selected beads are used, and the matrix is computed in tiles (see
+    uchimata.distances.distance_matrix()), optionally in parallel and into a
+    memory-mapped .npy file. A 20,000-bead model takes 1.6 GB as float32,
+    which a memory-mapped output keeps on disk.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data.
+        region_a (str, optional): Region of the rows, in the format accepted
+            by select(). Defaults to the whole structure.
+        region_b (str, optional): Region of the columns. Defaults to
+            region_a, which gives a symmetric matrix.
+        dtype: Data type of the matrix, float32 by default.
+        out (str or pathlib.Path, optional): Path of a .npy file to write the
+            matrix to, as a memory map.
+        block_size (int): Number of beads per side of a tile.
+        workers (int, optional): Number of threads computing tiles.
+
+    Returns:
+        np.ndarray or np.memmap: Distances between the beads of region_a
+            (rows) and region_b (columns), in the order returned by select().
+
+    Raises:
+        ValueError: If a region does not match the expected format.
+
+    Example:
+        >>> d = distance_matrix(model_bytes, "chr a", out="chr_a.npy", workers=4)
+        >>> contacts = d < 1.5
+    """
+    structure = as_structure(model)
+    rows = structure if region_a is None else structure.select(region_a)
+    points_a = spatial._points(rows.table)
+    points_b = None
+    if region_b is not None and region_b != region_a:
+        points_b = spatial._points(structure.select(region_b).table)
+    return distances.distance_matrix(points_a, points_b, dtype=dtype, out=out, block_size=block_size,
+                                     workers=workers)
+
+def contacts(model, cutoff):
+    """
+    Derive a sparse contact map from a 3D structure or an ensemble.
+
+    Pairs of beads closer than the cutoff are found with a voxel grid of
+    cutoff-sized cells (see SpatialIndex.query_pairs()), so the n^2 distances
+    are never computed. For an ensemble, the contacts of all models are
+    counted together.
+
+    Args:
+        model: Apache Arrow IPC bytes, a path, a Structure, or a
+            StructureEnsemble.
+        cutoff (float): Largest distance between two beads in contact, in the
+            units of the coordinates.
+
+    Returns:
+        pa.Table: Pixels of the upper triangle of the contact map, like the
+            pixel table of a cooler: 'bin1_id' < 'bin2_id' are rows of the
+            structure table (or of ensemble.shared), sorted by bin1_id and
+            then bin2_id, and 'count' is the number of models the pair is in
+            contact in. Pairs without contacts are omitted.
+
+    Example:
+        >>> ensemble = StructureEnsemble(sorted(pathlib.Path("out").glob("*.arrow")))
+        >>> pixels = contacts(ensemble, cutoff=2.0)
+        >>> bins = ensemble.shared.select(["chr", "coord"])
+    """
+    if isinstance(model, StructureEnsemble):
+        models = model.coordinates
+    else:
+        models = [spatial._points(as_structure(model).table)]
+    bin1, bin2, count = spatial.contact_counts(models, cutoff)
+    return pa.table({'bin1_id': bin1, 'bin2_id': bin2, 'count': count})
+
+@instrumentation.instrumented("select")
 def select(_model, _query):
     """
     Select a genomic region from a 3D structure using a query string.
@@ -143,14 +487,20 @@ def select(_model, _query):
     specific range within a chromosome.
 
     Args:
-        _model (bytes): Apache Arrow IPC file bytes containing the 3D structure data.
-            The structure table must have 'chr' and 'coord' columns for genomic positions.
+        _model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have a 'chr' column, and a 'coord' column for coordinate
+            ranges.
         _query (str): Query string in one of two formats:
             - Chromosome only: "chr1" (selects entire chromosome)
             - Chromosome with range: "chr1:1000-2000" (selects coordinate range)
 
     Returns:
-        bytes: Apache Arrow IPC stream bytes containing only the selected region.
+        bytes or Structure: Apache Arrow IPC stream bytes containing only the selected
+            region, or a Structure if _model is a Structure. Beads are ordered
+            by coordinate, which is the table order for structures stored
+            chromosome by chromosome.
 
     Example:
         >>> # Select entire chromosome 1
@@ -159,80 +509,93 @@ def select(_model, _query):
         >>> # Select a specific range on chromosome 2
         >>> region_model = select(model_bytes, "chr2:5000-10000")
         >>> Widget(region_model)
+        >>>
+        >>> # Chain operations without serializing in between
+        >>> Widget(cut(select(Structure(model_bytes), "chr2")))
     """
-    # convert arrow Bytes to Table
-    reader = pa.ipc.open_file(_model)
-    struct_table = reader.read_all()
-    # separate query into "chromosome:starCoord-endCoord"
-    if ":" in _query:
-        # means it should have a start-end range
-        match = re.match(r"([^\:]+):(\d+)-(\d+)", _query)
-        if match:
-            chrom, start, end = match.groups()
-            sqlQuery = f'SELECT * FROM struct_table WHERE chr = \'{chrom}\' AND coord >= {start} AND coord <= {end}'
-        else:
-            print("Pattern does not match.")
-            return
-    else:
-        # otherwise let's assume that it's a chromosome name
-        sqlQuery = f'SELECT * FROM struct_table WHERE chr = \'{_query}\''
-
-    con = duckdb.connect()
-    new_table = con.execute(sqlQuery).arrow()
-    sink = pa.BufferOutputStream()
-    writer = pa.ipc.new_stream(sink, new_table.schema)
-    writer.write_table(new_table)
-    writer.close()
-
-    # Get the bytes
-    arrow_bytes = sink.getvalue().to_pybytes()
-    return arrow_bytes
-
-    # vc2 = {
-    #     "color": "lightgreen",
-    #     "scale": 0.01, 
-    #     "links": True, 
-    #     "mark": "sphere"
-    # }
-    #
-    # return Widget(structure=arrow_bytes, viewconfig=vc2)
-
-def from_numpy(nparr):
+    if parse_region(_query) is None:
+        print("Pattern does not match.")
+        return
+
+    return _as_output(_model, as_structure(_model).select(_query))
+
+@instrumentation.instrumented("select_many")
+def select_many(model, queries):
+    """
+    Select several genomic regions from the same 3D structure in one call.
+
+    The structure is decoded and indexed once, and every query is then answered
+    with a binary search on the index. This is considerably faster than calling
+    select() in a loop for many regions of a large structure.
+
+    Args:
+        model (bytes, str, pathlib.Path or Structure): Apache Arrow IPC bytes (file
+            or stream format), a path to an Arrow IPC file (memory-mapped), or a
+            Structure containing the 3D structure data. The structure table
+            must have 'chr' and 'coord' columns for genomic positions.
+        queries (list): Regions to select. Each item is either a query string in
+            the format accepted by select() or a (chrom, start, end) tuple.
+
+    Returns:
+        list: Apache Arrow IPC stream bytes (or Structures, if model is a
+            Structure) for each query, in the same order.
+
+    Raises:
+        ValueError: If a query string does not match the expected format.
+
+    Example:
+        >>> parts = select_many(model_bytes, ["chr1", "chr2:5000-10000", ("chr3", 0, 1000)])
+        >>> Widget(*parts)
+    """
+    return [_as_output(model, result) for result in as_structure(model).select_many(queries)]
+
+@instrumentation.instrumented("from_numpy")
+def from_numpy(nparr, **columns):
     """
     Convert a numpy array of 3D coordinates to Apache Arrow bytes.
 
     Takes a 2D numpy array where each row represents a point in 3D space with
     [x, y, z] coordinates, and converts it to Apache Arrow IPC stream bytes
-    suitable for use with the Widget class.
+    suitable for use with the Widget class. The conversion goes straight from
+    numpy to Arrow, without building an intermediate pandas DataFrame.
 
     Args:
         nparr (np.ndarray): A 2D numpy array with shape (n, 3) where n is the
             number of points. Each row should contain [x, y, z] coordinates.
             The array will be converted to float32 precision.
+        **columns: Optional extra columns, each a 1D numpy array of length n,
+            e.g. chr=..., coord=... or value columns referenced by a viewconfig.
 
     Returns:
         bytes: Apache Arrow IPC stream bytes containing the structure data.
 
+    Raises:
+        ValueError: If nparr is not of shape (n, 3) or a column has the wrong length.
+
     Example:
         >>> import numpy as np
         >>> # Create a random 3D chromatin structure with 1000 points
         >>> structure = np.random.rand(1000, 3)
         >>> arrow_bytes = from_numpy(structure)
         >>> Widget(arrow_bytes)
+        >>>
+        >>> # Attach genomic positions and a value column in the same call
+        >>> arrow_bytes = from_numpy(structure, chr=np.repeat("chr1", 1000),
+        ...                          coord=np.arange(1000) * 100_000, count=np.random.rand(1000))
     """
-    xyz = nparr.astype(np.float32)
-    # Convert numpy array to pandas dataframe
-    xyzDF = pd.DataFrame({'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2]})
-
-    return from_pandas_dataframe(xyzDF)
+    with instrumentation.stage("convert") as stage:
+        table = _table_from_numpy(np.asarray(nparr), columns)
+        stage.update(rows_out=table.num_rows)
+    return _table_to_bytes(table)
 
+@instrumentation.instrumented("from_pandas_dataframe")
 def from_pandas_dataframe(df):
     """
     Convert a pandas DataFrame to Apache Arrow bytes.
 
     Takes a pandas DataFrame containing 3D coordinates (with 'x', 'y', 'z' columns)
     and converts it to Apache Arrow IPC stream bytes suitable for use with the
-    Widget class. This function is used internally by from_numpy and Widget.__init__.
+    Widget class.
 
     Args:
         df (pd.DataFrame): A pandas DataFrame with columns 'x', 'y', and 'z'
@@ -253,15 +616,25 @@ def from_pandas_dataframe(df):
         >>> Widget(arrow_bytes)
     """
     # Convert pandas DF to Arrow Table
-    xyzArrowTable = pa.Table.from_pandas(df)
+    with instrumentation.stage("convert", rows_in=len(df)) as stage:
+        xyzArrowTable = pa.Table.from_pandas(df)
+        stage.update(rows_out=xyzArrowTable.num_rows)
     # Convert the Table to bytes
-    output_stream = pa.BufferOutputStream()
-    with pa.ipc.RecordBatchStreamWriter(output_stream, xyzArrowTable.schema) as writer:
-        writer.write_table(xyzArrowTable)
+    return _table_to_bytes(xyzArrowTable)
 
-    # Get the table as Bytes
-    table_bytes = output_stream.getvalue().to_pybytes()
-    return table_bytes
+def _as_source(structure):
+    """
+    Wrap any supported Widget input in a Structure, without serializing it.
+
+    The structure is serialized once, when the Widget prepares it for the
+    front end.
+    """
+    if isinstance(structure, (np.ndarray, pd.DataFrame)):
+        with instrumentation.stage("convert", rows_in=len(structure)) as stage:
+            structure = as_structure(structure)
+            stage.update(rows_out=structure.num_rows)
+        return structure
+    return as_structure(structure)
 
 class Widget(anywidget.AnyWidget):
     _esm = pathlib.Path(__file__).parent / "static" / "widget.js"
@@ -274,7 +647,13 @@ class Widget(anywidget.AnyWidget):
     # options
     options = traitlets.Dict().tag(sync=True)
 
-    def __init__(self, *structures, viewconfig=None, options=None):
+    # Columns shared by the models of a StructureEnsemble, sent once and keyed
+    # by the id in the 'uchimata:shared' schema metadata of each model
+    shared = traitlets.Dict().tag(sync=True)
+
+    @instrumentation.instrumented("Widget")
+    def __init__(self, *structures, viewconfig=None, options=None, lod=None, progressive=False,
+                 encoding=None, project=True, frame=None, bake=True):
         """
         Create a widget with one or more 3D structures.
 
@@ -283,14 +662,55 @@ class Widget(anywidget.AnyWidget):
                 - 2D numpy array: [[x, y, z], ...]
                 - pandas dataframe: columns need to be 'x', 'y', 'z'
                 - Apache Arrow bytes
+                - path to an Arrow IPC file (str or pathlib.Path)
+                - Structure
+                - StructureEnsemble: adds every model, with the shared
+                  genomic columns sent to the browser only once
             viewconfig: Optional viewconfig(s). Can be:
                 - None: uses default empty viewconfig for all structures
                 - dict: same viewconfig applied to all structures
                 - list of dicts: each structure gets corresponding viewconfig
                   (if fewer viewconfigs than structures, cycles through them)
+                'values' given as numpy or Arrow arrays (one value per bead)
+                are sent as binary columns of the structure rather than as
+                JSON lists.
             options: Optional dict with display options. Supported fields:
                 - normalize: bool, whether to normalize coordinates
                 - center: bool, whether to center the structure
+                Both default to True. The centroid and bounding box are
+                computed in Python, and the resulting frame is applied to
+                the coordinates before they are sent (see bake).
+            lod: Optional coarsening factor. Each structure is sent to the
+                browser with every `lod` consecutive beads merged into one
+                (see coarsen()). Viewconfig 'values', including lists, are
+                averaged over the merged beads.
+            progressive: If True (and lod is set), the coarse level is shown
+                first and replaced with the full-resolution structures as soon
+                as the front end has rendered it.
+            encoding: Optional compact coordinate encoding for sending the
+                structures to the browser (see uchimata.transport):
+                - "float32": 32-bit floats
+                - "float16": 16-bit floats relative to the bounding box center
+                - "int16": 16-bit integers quantized over the bounding box
+                The front end restores the coordinates transparently.
+            project: If True (the default), each structure is reduced to the
+                columns the front end needs before it is sent: 'x', 'y', 'z',
+                'chr' and the columns its viewconfig refers to through 'field'
+                keys. 'chr' is sent as plain strings, with labels like
+                "15(pat)" for structures with split haplotypes, and other
+                string columns are dictionary-encoded. Set to False to send
+                all columns.
+            frame: Optional display frame of the structures:
+                - None: each structure is centered and normalized on its own,
+                  as set by options
+                - "shared": one frame for all structures of the widget, so
+                  their relative positions and sizes are kept
+                - a frame from uchimata.frame(), e.g. shared between widgets
+            bake: If True (the default), the frame is applied to the
+                coordinates in Python before sending them, so the front end
+                can load them as they are. If False, the original coordinates
+                are sent and the front end moves them into the frame on every
+                load.
 
         Examples:
             Widget(structure1)
@@ -300,6 +720,14 @@ class Widget(anywidget.AnyWidget):
             Widget(s1, s2, s3, viewconfig=[vc1, vc2, vc3])
             Widget(s1, s2, s3, viewconfig=[vc1])  # vc1 used for all three
             Widget(structure1, options={'normalize': True, 'center': False})
+            Widget(large_structure, lod=8)  # send every 8 beads merged into one
+            Widget(large_structure, lod=8, progressive=True)  # coarse first, then full
+            Widget(large_structure, encoding='int16')  # 6 bytes per bead for coordinates
+            Widget(df, viewconfig={'color': {'field': 'count'}})  # sends x, y, z, chr and count
+            Widget(structure1, viewconfig={'color': {'values': np.arange(n)}})  # binary values
+            Widget(StructureEnsemble(model_paths))  # chr and coord sent once for all models
+            Widget(s1, s2, frame="shared")  # one normalization for both structures
+            Widget(s1, frame=uchi.frame(s1, s2))  # same frame as another widget showing s2
         """
         if not structures:
             raise ValueError("At least one structure must be provided")
@@ -316,23 +744,294 @@ class Widget(anywidget.AnyWidget):
         if options is None:
             options = {}
 
-        # Convert all structures to Arrow bytes
-        processed_structures = []
+        self._lod = lod
+        self._encoding = encoding
+        self._project = project
+        self._frame = frame
+        self._bake = bake
+        # recorders and call of uchimata.stats() that front-end timings are reported to
+        self._recorders = instrumentation.active()
+        self._call = instrumentation.current_call()
+        # shared column payloads of ensembles, and the ones not synced yet
+        self._shared_payloads = {}
+        self._unsynced_shared = []
+
+        # Wrap all structures in Structures, expanding ensembles into their models
+        sources = []
+        ensembles = []
         for structure in structures:
-            if isinstance(structure, np.ndarray):
-                processed_structures.append(from_numpy(structure))
-            elif isinstance(structure, pd.DataFrame):
-                processed_structures.append(from_pandas_dataframe(structure))
+            if isinstance(structure, StructureEnsemble):
+                sources.extend(structure.to_structures())
+                ensembles.extend([structure] * structure.num_models)
             else:
-                # Assume Arrow as Bytes
-                processed_structures.append(structure)
+                sources.append(_as_source(structure))
+                ensembles.append(None)
 
         # Match structures with viewconfigs (cycle through viewconfigs if needed)
         matched_viewconfigs = []
-        for i in range(len(processed_structures)):
+        for i in range(len(sources)):
             # Cycle through viewconfigs if there are fewer than structures
             vc_index = i % len(viewconfigs_list)
             matched_viewconfigs.append(viewconfigs_list[vc_index])
 
-        super().__init__(structures=processed_structures, viewconfigs=matched_viewconfigs, options=options)
+        # Send numpy and Arrow viewconfig values as hidden columns of their structure
+        for i, vc in enumerate(matched_viewconfigs):
+            matched_viewconfigs[i], values = transport.detach_values(vc, lists=lod is not None)
+            if values:
+                sources[i] = self._with_values(sources[i], values)
+
+        # Center and normalize in Python, from the full-resolution structures
+        self._sources = sources
+        self._options = options
+        self._frames = self._compute_frames()
+
+        # Send a coarser level of detail, keeping the full resolution for refine()
+        processed_structures = [self._for_transport(s, vc, lod, e, f)
+                                for s, vc, e, f in zip(sources, matched_viewconfigs, ensembles, self._frames)]
+        if lod is None:
+            full_structures = None
+        else:
+            full_structures = [self._for_transport(s, vc, None, e, f)
+                               for s, vc, e, f in zip(sources, matched_viewconfigs, ensembles, self._frames)]
+
+        payload_bytes = sum(len(s) for s in processed_structures) + sum(map(len, self._shared_payloads.values()))
+        with instrumentation.stage("sync", bytes=payload_bytes):
+            super().__init__(structures=processed_structures, viewconfigs=matched_viewconfigs, options=options,
+                             shared=dict(self._shared_payloads))
+        self._unsynced_shared = []
+
+        # kept to re-project a structure when its viewconfig needs other columns
+        self._ensembles = ensembles
+        self._full_structures = full_structures
+        self._progressive = progressive
+        self.on_msg(self._handle_message)
+        self.observe(self._reframe, names="options")
+
+    @staticmethod
+    def _with_values(source, values):
+        """Attach value arrays detached from a viewconfig to a structure source."""
+        return Structure(transport.attach_values(source.table, values))
+
+    def _frame_for(self, source, shared_frame):
+        """Display frame of one structure, or None if it is neither centered nor normalized."""
+        if shared_frame is not None:
+            return shared_frame
+        center = self._options.get("center", True)
+        normalize = self._options.get("normalize", True)
+        if not center and not normalize:
+            return None
+        return spatial.frame(source.bounds, center, normalize)
+
+    def _shared_frame(self, sources):
+        """The frame all structures are shown in, or None if each structure has its own."""
+        if self._frame is None:
+            return None
+        if isinstance(self._frame, dict):
+            return self._frame
+        if self._frame != "shared":
+            raise ValueError(f"Unknown frame '{self._frame}', expected None, 'shared' or a frame from frame().")
+        stats = spatial.merge_bounds([source.bounds for source in sources])
+        return spatial.frame(stats, self._options.get("center", True), self._options.get("normalize", True))
+
+    def _compute_frames(self):
+        shared_frame = self._shared_frame(self._sources)
+        return [self._frame_for(source, shared_frame) for source in self._sources]
+
+    def _reframe(self, change):
+        """Re-send all structures in the frames of the new options."""
+        self._options = change["new"] or {}
+        self._frames = self._compute_frames()
+        viewconfigs = list(self.viewconfigs)
+        if self._full_structures is not None:
+            self._full_structures = [self._for_transport(s, vc, None, e, f) for s, vc, e, f
+                                     in zip(self._sources, viewconfigs, self._ensembles, self._frames)]
+        self.structures = [self._for_transport(s, vc, self._lod, e, f) for s, vc, e, f
+                           in zip(self._sources, viewconfigs, self._ensembles, self._frames)]
+
+    def _for_transport(self, source, viewconfig, lod=None, ensemble=None, frame=None):
+        """Project, coarsen, frame and encode a structure as configured for sending it to the front end."""
+        with instrumentation.stage("transport") as stage:
+            arrow_bytes = self._transport_bytes(source, viewconfig, lod, ensemble, frame)
+            stage.update(bytes=len(arrow_bytes))
+        return arrow_bytes
+
+    def _transport_bytes(self, source, viewconfig, factor, ensemble, frame):
+        table = source.table
+        stats = source.bounds if frame is not None else None
+        if self._project:
+            table = transport.project(table, transport.viewconfig_fields(viewconfig))
+        if factor is not None:
+            table = lod.coarsen(table, factor)
+        if frame is not None:
+            if self._bake:
+                # coordinates are sent in their display frame
+                table = spatial.apply_frame(table, frame)
+                stats, frame = spatial.transform_bounds(stats, frame), {"offset": [0.0] * 3, "scale": 1.0}
+            table = transport.with_frame(table, stats, frame)
+        if self._encoding is not None:
+            table = encode_coordinates(table, self._encoding)
+        if ensemble is not None:
+            table = self._share(table, ensemble, factor)
+        if self._project:
+            # Structure tables hold 'chr' dictionary-encoded, which the front end would have to decode
+            table = transport.plain_chr(table)
+        return _table_to_bytes(table, frame_compression=True)
+
+    def _share(self, table, ensemble, lod):
+        """Move the shared columns of an ensemble model into the widget's shared payloads."""
+        names = [name for name in table.column_names if name in ensemble.shared.column_names]
+        # same ensemble, level of detail and projection give the same shared columns
+        key = hashlib.blake2b(ensemble._key + repr((lod, names)).encode(), digest_size=8).hexdigest()
+        if key not in self._shared_payloads:
+            self._shared_payloads[key] = _table_to_bytes(table.select(names).replace_schema_metadata(None),
+                                                         frame_compression=True)
+            self._unsynced_shared.append(key)
+
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"uchimata:shared"] = key.encode()
+        return table.drop(names).replace_schema_metadata(metadata)
+
+    def _send_structure(self, content, arrow_bytes):
+        """Send a structure message, together with the shared columns the front end does not have yet."""
+        keys, self._unsynced_shared = self._unsynced_shared, []
+        for key in keys:
+            # mutate in place so that the trait does not re-sync the whole dict
+            self.shared[key] = self._shared_payloads[key]
+        self.send({**content, "shared": keys}, buffers=[arrow_bytes] + [self._shared_payloads[key] for key in keys])
+
+    def _handle_message(self, widget, content, buffers):
+        if content.get("type") != "rendered":
+            return
+        self._record_timings(content.get("timings", []))
+        if self._progressive:
+            self.refine()
+
+    def _record_timings(self, timings):
+        """Add the load and first-frame timings reported by the front end to the recorders of this widget."""
+        for timing in timings:
+            record = instrumentation.Record(*self._call, "js." + timing["stage"], timing["seconds"],
+                                            rows_out=timing.get("rows"), bytes=timing.get("bytes"))
+            for recorder in self._recorders:
+                recorder.add(record)
+
+    def refine(self):
+        """
+        Replace the coarse level of detail with the full-resolution structures.
+
+        Called automatically after the first render when the widget was created
+        with progressive=True. Does nothing if the widget is already showing the
+        full resolution. Structures added or re-sent afterwards are sent at full
+        resolution too.
+        """
+        if self._full_structures is not None:
+            self.structures = self._full_structures
+            self._full_structures = None
+            self._lod = None
+
+    def update_viewconfig(self, index, viewconfig=None, **changes):
+        """
+        Change the viewconfig of one structure without re-syncing the others.
+
+        Only the new viewconfig is sent to the front end, which rebuilds its
+        renderer from the structures it has already decoded (this resets the
+        camera). If the new
+        viewconfig refers to columns that were projected away, the structure
+        is sent again with those columns.
+
+        Args:
+            index (int): Position of the structure in the widget.
+            viewconfig (dict, optional): Replacement viewconfig. If omitted,
+                the current viewconfig is kept and updated with changes.
+            **changes: Viewconfig fields to set, e.g. color="blue".
+
+        Example:
+            >>> w.update_viewconfig(0, color="blue", scale=0.02)
+            >>> w.update_viewconfig(0, color={"values": np.random.rand(n), "colorScale": "Viridis"})
+        """
+        index = range(len(self.viewconfigs))[index]
+        new_viewconfig = dict(self.viewconfigs[index] if viewconfig is None else viewconfig)
+        new_viewconfig.update(changes)
+        new_viewconfig, values = transport.detach_values(new_viewconfig, lists=self._lod is not None)
+        if values:
+            self._sources[index] = self._with_values(self._sources[index], values)
+
+        new_fields = transport.viewconfig_fields(new_viewconfig)
+        if values or (self._project and not new_fields <= transport.viewconfig_fields(self.viewconfigs[index])):
+            source = self._sources[index]
+            ensemble = self._ensembles[index]
+            frame = self._frames[index]
+            arrow_bytes = self._for_transport(source, new_viewconfig, self._lod, ensemble, frame)
+            if self._full_structures is not None:
+                self._full_structures[index] = self._for_transport(source, new_viewconfig, None, ensemble, frame)
+
+            # mutate in place so that the traits do not re-sync the whole lists
+            self.structures[index] = arrow_bytes
+            self.viewconfigs[index] = new_viewconfig
+            self._send_structure({"type": "update_structure", "index": index, "viewconfig": new_viewconfig},
+                                 arrow_bytes)
+            return
+
+        # mutate in place so that the trait does not re-sync the whole list
+        self.viewconfigs[index] = new_viewconfig
+        self.send({"type": "update_viewconfig", "index": index, "viewconfig": new_viewconfig})
+
+    def add_structure(self, structure, viewconfig=None):
+        """
+        Append a structure without re-sending the ones already displayed.
+
+        Args:
+            structure: Structure input, in any format accepted by Widget().
+                A StructureEnsemble adds all of its models.
+            viewconfig (dict, optional): Viewconfig of the new structure.
+
+        Example:
+            >>> w.add_structure(uchi.select(model, "chr b"), {"color": "blue"})
+        """
+        if isinstance(structure, StructureEnsemble):
+            for model in structure.to_structures():
+                self._add_source(model, viewconfig, structure)
+        else:
+            self._add_source(_as_source(structure), viewconfig, None)
+
+    def _add_source(self, source, viewconfig, ensemble):
+        viewconfig, values = transport.detach_values(viewconfig, lists=self._lod is not None)
+        if values:
+            source = self._with_values(source, values)
+        shared_frame = None
+        if self._frame is not None:
+            # keep the shared frame, so that the structures already shown do not move
+            shared_frame = self._frames[0] if self._frames else self._shared_frame([source])
+        frame = self._frame_for(source, shared_frame)
+        if self._full_structures is not None:
+            self._full_structures.append(self._for_transport(source, viewconfig, None, ensemble, frame))
+        arrow_bytes = self._for_transport(source, viewconfig, self._lod, ensemble, frame)
+        self._sources.append(source)
+        self._ensembles.append(ensemble)
+        self._frames.append(frame)
+
+        # mutate in place so that the traits do not re-sync the whole lists
+        self.structures.append(arrow_bytes)
+        self.viewconfigs.append(viewconfig)
+        self._send_structure({"type": "add_structure", "viewconfig": viewconfig}, arrow_bytes)
+
+    def remove_structure(self, index):
+        """
+        Remove one structure from the widget.
+
+        Args:
+            index (int): Position of the structure in the widget.
+
+        Example:
+            >>> w.remove_structure(0)
+        """
+        index = range(len(self.structures))[index]
+        if self._full_structures is not None:
+            del self._full_structures[index]
+        del self._sources[index]
+        del self._ensembles[index]
+        del self._frames[index]
 
+        # mutate in place so that the traits do not re-sync the whole lists
+        del self.structures[index]
+        del self.viewconfigs[index]
+        self.send({"type": "remove_structure", "index": index})
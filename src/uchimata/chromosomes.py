@@ -0,0 +1,157 @@
+"""
+Chromosome columns of 3D structure tables.
+
+Structures store 'chr' as an Arrow dictionary column: one small array of
+chromosome names plus an integer code per bead. Renaming chromosomes or
+splitting haplotype suffixes (e.g. "15(pat)") only rewrites the dictionary,
+so it costs O(#chromosomes) instead of O(#beads).
+"""
+
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# chromosome names with a haplotype suffix, e.g. "15(pat)" or "X(mat)"
+HAPLOTYPE_PATTERN = r"^(.*)\((\w+)\)$"
+
+def _dictionary_column(column):
+    """A chunked string column as a single-dictionary DictionaryArray."""
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column)
+    if isinstance(column, pa.ChunkedArray):
+        column = column.unify_dictionaries().combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    return column
+
+def _set_column(table, name, column):
+    return table.set_column(table.column_names.index(name), name, column)
+
+def _remap(column, names):
+    """
+    Replace the dictionary of a column with new names, merging duplicates.
+
+    If the new names are unique only the dictionary is replaced, otherwise
+    the codes are remapped through a lookup array.
+    """
+    unique, inverse = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+    if len(unique) == len(names):
+        return pa.DictionaryArray.from_arrays(column.indices, pa.array(names, pa.string()))
+
+    # keep the merged names in order of first appearance in the old dictionary
+    _, first = np.unique(inverse, return_index=True)
+    order = np.argsort(first)
+    lookup = np.empty(len(order), dtype=np.int32)
+    lookup[order] = np.arange(len(order), dtype=np.int32)
+    codes = lookup[inverse].astype(np.int32)
+    indices = pc.take(pa.array(codes), column.indices)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(unique[order].tolist(), pa.string()))
+
+def encode(table):
+    """
+    Store the 'chr' (and 'haplotype') column of a structure table as a dictionary column.
+
+    Args:
+        table (pa.Table): Structure table.
+
+    Returns:
+        pa.Table: The table with dictionary-encoded 'chr' and 'haplotype'
+            columns with one dictionary each, in order of first appearance.
+            Columns that are missing, or already have a single dictionary, are
+            left unchanged.
+    """
+    for name in ('chr', 'haplotype'):
+        if name not in table.column_names:
+            continue
+        column = table.column(name)
+        if pa.types.is_dictionary(column.type) and column.num_chunks <= 1:
+            continue
+        if (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+                or pa.types.is_dictionary(column.type)):
+            table = _set_column(table, name, _dictionary_column(column))
+    return table
+
+def rename(table, mapping):
+    """
+    Rename chromosomes by rewriting the dictionary of the 'chr' column.
+
+    Args:
+        table (pa.Table): Structure table with a 'chr' column.
+        mapping (dict or callable): New name for each chromosome name. Names
+            missing from a dict are kept. Several chromosomes can be given the
+            same name, which merges them.
+
+    Returns:
+        pa.Table: The table with renamed chromosomes.
+    """
+    column = _dictionary_column(table.column('chr'))
+    rename_one = mapping if callable(mapping) else (lambda name: mapping.get(name, name))
+    names = [rename_one(name) for name in column.dictionary.to_pylist()]
+    return _set_column(table, 'chr', _remap(column, names))
+
+def split_haplotypes(table, pattern=HAPLOTYPE_PATTERN):
+    """
+    Move haplotype suffixes of chromosome names into a 'haplotype' column.
+
+    "15(pat)" becomes chromosome "15" with haplotype "pat". Both columns are
+    dictionary-encoded, and the names are parsed once per dictionary entry.
+
+    Args:
+        table (pa.Table): Structure table with a 'chr' column.
+        pattern (str): Regular expression with two groups, the chromosome and
+            the haplotype. Names that do not match keep their name and get a
+            null haplotype.
+
+    Returns:
+        pa.Table: The table with the split 'chr' column and a 'haplotype'
+            column after it.
+    """
+    column = _dictionary_column(table.column('chr'))
+    regex = re.compile(pattern)
+    chromosomes = []
+    haplotypes = []
+    for name in column.dictionary.to_pylist():
+        match = regex.match(name) if name is not None else None
+        chromosomes.append(match.group(1) if match else name)
+        haplotypes.append(match.group(2) if match else None)
+
+    haplotype = pc.dictionary_encode(pc.take(pa.array(haplotypes, pa.string()), column.indices))
+    table = _set_column(table, 'chr', _remap(column, chromosomes))
+    if 'haplotype' in table.column_names:
+        return _set_column(table, 'haplotype', haplotype)
+    return table.add_column(table.column_names.index('chr') + 1, 'haplotype', haplotype)
+
+def labels(table):
+    """
+    Chromosome label of every bead, combining 'chr' and 'haplotype' if present.
+
+    Args:
+        table (pa.Table): Structure table with a 'chr' column.
+
+    Returns:
+        pa.DictionaryArray: Labels like "15(pat)" (or plain chromosome names),
+            with the dictionary in order of first appearance.
+    """
+    column = _dictionary_column(table.column('chr'))
+    if 'haplotype' not in table.column_names:
+        return column
+
+    haplotype = _dictionary_column(table.column('haplotype'))
+    chr_names = column.dictionary.to_pylist()
+    haplotype_names = haplotype.dictionary.to_pylist()
+    chr_codes = pc.fill_null(column.indices, -1).to_numpy().astype(np.int64)
+    haplotype_codes = pc.fill_null(haplotype.indices, len(haplotype_names)).to_numpy().astype(np.int64)
+
+    # one code per (chromosome, haplotype) pair, renumbered by first appearance
+    pair_codes = chr_codes * (len(haplotype_names) + 1) + haplotype_codes
+    pairs, first, inverse = np.unique(pair_codes, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    lookup = np.empty(len(order), dtype=np.int32)
+    lookup[order] = np.arange(len(order), dtype=np.int32)
+
+    names = []
+    for pair in pairs[order]:
+        chrom, hap = divmod(int(pair), len(haplotype_names) + 1)
+        name = chr_names[chrom] if chrom >= 0 else None
+        names.append(name if hap == len(haplotype_names) else f"{name}({haplotype_names[hap]})")
+    return pa.DictionaryArray.from_arrays(pa.array(lookup[inverse]), pa.array(names, pa.string()))
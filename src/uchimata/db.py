@@ -0,0 +1,28 @@
+"""
+DuckDB support of Structures backed by a DuckDB relation.
+
+Relations are executed lazily, when the table of their Structure is needed
+(see Structure). Genomic queries on in-memory tables are answered by the
+StructureIndex and do not use DuckDB.
+"""
+
+from . import instrumentation
+
+def to_arrow(result):
+    """
+    Materialize a query result or a relation as an Arrow Table.
+
+    Args:
+        result: A DuckDB cursor holding a result, or a DuckDB relation.
+
+    Returns:
+        pa.Table: The materialized result.
+    """
+    with instrumentation.stage("duckdb") as stage:
+        if hasattr(result, "to_arrow_table"):
+            table = result.to_arrow_table()
+        else:
+            # duckdb < 1.4
+            table = result.fetch_arrow_table()
+        stage.update(rows_out=table.num_rows)
+    return table
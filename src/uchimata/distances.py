@@ -0,0 +1,86 @@
+"""
+Pairwise distance matrices of 3D structures.
+
+A distance matrix grows with the square of the number of beads, so it is
+computed in square tiles of at most block_size x block_size beads and each
+tile is written straight into the output, which can be a memory-mapped .npy
+file. Only one tile per worker is held in memory at a time.
+"""
+
+import concurrent.futures
+
+import numpy as np
+
+# beads per side of a tile, about 32 MB of float64 scratch space per tile
+BLOCK_SIZE = 2048
+
+def _tile(a, b, a_norms, b_norms):
+    """Euclidean distances between two blocks of points, through one matrix product."""
+    squared = a_norms[:, None] + b_norms[None, :] - 2.0 * (a @ b.T)
+    np.maximum(squared, 0.0, out=squared)
+    return np.sqrt(squared, out=squared)
+
+def distance_matrix(points_a, points_b=None, dtype=np.float32, out=None, block_size=BLOCK_SIZE, workers=None):
+    """
+    Compute the Euclidean distances between two sets of points, tile by tile.
+
+    Args:
+        points_a (np.ndarray): (n, 3) points of the rows.
+        points_b (np.ndarray, optional): (m, 3) points of the columns. If
+            omitted, the symmetric matrix of points_a is computed, and only
+            the tiles on and above the diagonal are evaluated.
+        dtype: Data type of the matrix.
+        out (str or pathlib.Path, optional): Path of a .npy file to write the
+            matrix to, as a memory map, instead of keeping it in memory.
+        block_size (int): Number of points per side of a tile.
+        workers (int, optional): Number of threads computing tiles. Defaults
+            to 1. The matrix products release the GIL.
+
+    Returns:
+        np.ndarray or np.memmap: The (n, m) distance matrix.
+    """
+    symmetric = points_b is None
+    points_a = np.asarray(points_a, dtype=np.float64)
+    points_b = points_a if symmetric else np.asarray(points_b, dtype=np.float64)
+    # distances do not change when both sets are moved, but the precision of the
+    # matrix product formula is best around the origin
+    center = np.concatenate([points_a, points_b]).mean(axis=0) if len(points_a) + len(points_b) else np.zeros(3)
+    points_a = points_a - center
+    points_b = points_a if symmetric else points_b - center
+    a_norms = np.einsum('ij,ij->i', points_a, points_a)
+    b_norms = a_norms if symmetric else np.einsum('ij,ij->i', points_b, points_b)
+
+    shape = (len(points_a), len(points_b))
+    if out is None:
+        matrix = np.empty(shape, dtype=dtype)
+    else:
+        matrix = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+
+    a_starts = range(0, shape[0], block_size)
+    b_starts = range(0, shape[1], block_size)
+
+    def fill_row(i):
+        a = slice(i, i + block_size)
+        for j in b_starts:
+            if symmetric and j < i:
+                # filled as the transpose of tile (j, i)
+                continue
+            b = slice(j, j + block_size)
+            tile = _tile(points_a[a], points_b[b], a_norms[a], b_norms[b])
+            matrix[a, b] = tile
+            if symmetric and j > i:
+                matrix[b, a] = tile.T
+        if symmetric:
+            # exact zeros on the diagonal, despite rounding in the product formula
+            np.fill_diagonal(matrix[a, i:i + block_size], 0)
+
+    if workers is None or workers <= 1:
+        for i in a_starts:
+            fill_row(i)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fill_row, a_starts))
+
+    if out is not None:
+        matrix.flush()
+    return matrix
@@ -0,0 +1,167 @@
+"""
+Ensembles of 3D structures of the same genome.
+
+Population models (e.g. the ten models of a cell in Stevens et al. 2017) place
+the same beads in different positions. A StructureEnsemble keeps the genomic
+columns of those beads once and the coordinates of all models in a single
+(models, beads, 3) float32 array, so selections are resolved with one index
+lookup and apply to every model at once.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .index import StructureIndex, parse_region
+from .structure import Structure, as_structure
+
+_AXES = ('x', 'y', 'z')
+
+def _shared_table(shared, num_beads):
+    """Turn the shared columns given to StructureEnsemble into a pa.Table."""
+    if shared is None:
+        # a table without columns, but with one row per bead
+        return pa.table({'bead': np.zeros(num_beads, dtype=np.int8)}).drop(['bead'])
+    if isinstance(shared, pd.DataFrame):
+        shared = pa.Table.from_pandas(shared, preserve_index=False)
+    elif isinstance(shared, dict):
+        shared = pa.table(shared)
+    if shared.num_rows != num_beads:
+        raise ValueError(f"Shared columns have {shared.num_rows} rows, expected one per bead ({num_beads}).")
+    return shared
+
+class StructureEnsemble:
+    """
+    Several 3D models of the same beads, sharing their genomic columns.
+
+    The columns other than 'x', 'y' and 'z' (e.g. 'chr' and 'coord') are
+    stored once for the whole ensemble, and the coordinates of every model
+    are stored in one (models, beads, 3) float32 array. Widget sends the
+    shared columns to the browser once instead of once per model.
+
+    Args:
+        models: The models, either as a list of structure inputs (anything
+            accepted by Structure) with identical non-coordinate columns, or
+            as a (models, beads, 3) coordinate array.
+        shared (optional): Genomic columns for a coordinate array input, as a
+            pa.Table, pd.DataFrame or dict of arrays with one row per bead.
+            Structure inputs take their shared columns from the first model.
+
+    Attributes:
+        coordinates (np.ndarray): (models, beads, 3) float32 coordinates.
+        shared (pa.Table): Columns shared by all models, one row per bead.
+
+    Raises:
+        ValueError: If the models do not have the same beads.
+
+    Example:
+        >>> ensemble = StructureEnsemble(sorted(pathlib.Path("out").glob("*.arrow")))
+        >>> Widget(ensemble.select("chr f"))
+    """
+
+    def __init__(self, models, shared=None):
+        self._index = None
+        # identifies the shared columns, e.g. for the widget's shared payloads
+        self._key = os.urandom(16)
+
+        if isinstance(models, np.ndarray):
+            if models.ndim != 3 or models.shape[2] != 3:
+                raise ValueError(f"Expected an array of shape (models, beads, 3), got {models.shape}.")
+            self.coordinates = np.asarray(models, dtype=np.float32)
+            self.shared = _shared_table(shared, models.shape[1])
+            return
+
+        tables = [as_structure(model).table for model in models]
+        if not tables:
+            raise ValueError("At least one model must be provided.")
+        names = [name for name in tables[0].column_names if name not in _AXES]
+        self.shared = tables[0].select(names)
+        self.coordinates = np.empty((len(tables), tables[0].num_rows, 3), dtype=np.float32)
+        for i, table in enumerate(tables):
+            if table.num_rows != self.shared.num_rows or not table.select(names).equals(self.shared):
+                raise ValueError(f"Model {i} does not have the same beads as the first model.")
+            for axis, name in enumerate(_AXES):
+                self.coordinates[i, :, axis] = table.column(name).to_numpy()
+
+    @property
+    def index(self):
+        """StructureIndex: Genomic index of the shared columns, built on first use."""
+        if self._index is None:
+            self._index = StructureIndex(self.shared)
+        return self._index
+
+    @property
+    def num_models(self):
+        """int: Number of models in the ensemble."""
+        return self.coordinates.shape[0]
+
+    @property
+    def num_beads(self):
+        """int: Number of beads in every model."""
+        return self.coordinates.shape[1]
+
+    def __len__(self):
+        return self.num_models
+
+    def __getitem__(self, model):
+        """
+        Get one model of the ensemble as a Structure.
+
+        The shared columns are not copied, only the model's coordinates.
+        """
+        xyz = self.coordinates[model]
+        table = self.shared
+        for axis, name in enumerate(_AXES):
+            table = table.append_column(name, pa.array(np.ascontiguousarray(xyz[:, axis])))
+        return Structure(table.select(list(_AXES) + self.shared.column_names))
+
+    def __repr__(self):
+        return (f"StructureEnsemble({self.num_models} models, {self.num_beads} beads, "
+                f"shared columns={self.shared.column_names})")
+
+    def select(self, query):
+        """
+        Select a genomic region in every model.
+
+        The region is looked up once in the shared index, and the same beads
+        are taken from all models. A chromosome name without a haplotype
+        selects all of its haplotypes, as in Structure.select().
+
+        Args:
+            query (str): Query string in the format accepted by select(), e.g.
+                "chr1" or "chr1:1000-2000".
+
+        Returns:
+            StructureEnsemble: The selected region of every model.
+
+        Raises:
+            ValueError: If the query does not match the expected format.
+        """
+        region = parse_region(query)
+        if region is None:
+            raise ValueError(f"Query '{query}' does not match the 'chrom:start-end' format.")
+        ranges = self.index.ranges(*region)
+
+        order = self.index._order
+        if len(ranges) == 1:
+            lo, hi = ranges[0]
+            if order is None:
+                # zero-copy: the shared slice and a view of the coordinates
+                return StructureEnsemble(self.coordinates[:, lo:hi], self.index.table.slice(lo, hi - lo))
+            return StructureEnsemble(self.coordinates[:, order[lo:hi]], self.index.table.slice(lo, hi - lo))
+
+        # several haplotypes, one after the other
+        rows = np.concatenate([np.arange(lo, hi) for lo, hi in ranges])
+        coordinates = self.coordinates[:, rows if order is None else order[rows]]
+        return StructureEnsemble(coordinates, self.index.table.take(pa.array(rows)))
+
+    def to_structures(self):
+        """
+        Split the ensemble into one Structure per model.
+
+        Returns:
+            list: A Structure for each model, in order.
+        """
+        return [self[i] for i in range(self.num_models)]
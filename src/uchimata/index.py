@@ -0,0 +1,256 @@
+"""
+Genomic index over 3D structure tables.
+
+A StructureIndex orders the beads of a structure by (chromosome, coordinate)
+once and then answers region queries with binary searches. Query results are
+slices of the indexed table, so they share memory with it instead of copying.
+"""
+
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import chromosomes
+
+def parse_region(query):
+    """
+    Parse a region query string into its chromosome and coordinate range.
+
+    Args:
+        query (str): Query string in one of two formats:
+            - Chromosome only: "chr1"
+            - Chromosome with range: "chr1:1000-2000"
+
+    Returns:
+        tuple: (chrom, start, end) where start and end are ints, or None for a
+            chromosome-only query. Returns None if the query has a ':' but
+            does not match the range format.
+    """
+    if ":" in query:
+        # means it should have a start-end range
+        match = re.match(r"([^\:]+):(\d+)-(\d+)", query)
+        if not match:
+            return None
+        chrom, start, end = match.groups()
+        return chrom, int(start), int(end)
+    # otherwise let's assume that it's a chromosome name
+    return query, None, None
+
+class StructureIndex:
+    """
+    Sorted per-chromosome coordinate index of a 3D structure.
+
+    Beads are ordered by chromosome (in dictionary order, which is the order
+    of first appearance for structures loaded by this package) and then by
+    genomic coordinate. If the table is already in that order, which is the
+    case for structures stored chromosome by chromosome, the index uses the
+    table as is. Otherwise it keeps a reordered copy. Every query returns a
+    zero-copy slice of the indexed table, so the selected beads are in
+    (chromosome, coordinate) order rather than in table order.
+
+    Tables without a 'coord' column are indexed by chromosome alone, keeping
+    the table order within each chromosome. They only support queries of
+    whole chromosomes.
+
+    Tables with a 'haplotype' column (see split_haplotypes()) are indexed by
+    chromosome and haplotype: "15(pat)" selects one haplotype, and "15"
+    selects all haplotypes of the chromosome, one after the other.
+
+    Args:
+        table (pa.Table): Structure table with a 'chr' and optionally a
+            'coord' column.
+
+    Attributes:
+        table (pa.Table): The indexed table in (chromosome, coordinate) order.
+        chromosomes (list): Chromosome labels in index order, as strings.
+
+    Example:
+        >>> index = StructureIndex(table)
+        >>> index.query("chr a", 3000000, 5000000).num_rows
+        21
+    """
+
+    def __init__(self, table):
+        encoded_chr = chromosomes.labels(table)
+        chr_codes = pc.fill_null(encoded_chr.indices, -1).to_numpy()
+        self._has_coords = 'coord' in table.column_names
+        if self._has_coords:
+            coords = table.column('coord').to_numpy()
+        else:
+            # a stable sort on the chromosome keeps the table order within chromosomes
+            coords = np.zeros(table.num_rows, dtype=np.int64)
+
+        order = np.lexsort((coords, chr_codes))
+        if np.array_equal(order, np.arange(len(order))):
+            self.table = table
+            # rows of the indexed table are rows of the input table
+            self._order = None
+        else:
+            self.table = table.take(pa.array(order))
+            self._order = order
+            chr_codes = chr_codes[order]
+            coords = coords[order]
+
+        # names as strings, so that queries also match integer 'chr' columns
+        self._dictionary = encoded_chr.dictionary.cast(pa.string())
+        self.chromosomes = self._dictionary.to_pylist()
+        self._coords = coords
+        # _chr_bounds[c]:_chr_bounds[c + 1] is the run of rows on chromosome c
+        self._chr_bounds = np.searchsorted(chr_codes, np.arange(len(self.chromosomes) + 1))
+        self._chr_codes = {name: code for code, name in enumerate(self.chromosomes)}
+
+        # labels of every haplotype of a chromosome, e.g. "15" -> ["15(pat)", "15(mat)"]
+        self._haplotypes = {}
+        if 'haplotype' in table.column_names:
+            base_names = chromosomes.labels(table.select(['chr'])).dictionary.cast(pa.string()).to_pylist()
+            for base in base_names:
+                self._haplotypes[base] = [label for label in self.chromosomes
+                                          if label == base or label.startswith(f"{base}(")]
+
+    def locate(self, chrom, start=None, end=None):
+        """
+        Find the row offsets of a genomic region in the indexed table.
+
+        Args:
+            chrom (str): Chromosome name.
+            start (int, optional): Inclusive start coordinate.
+            end (int, optional): Inclusive end coordinate.
+
+        Returns:
+            tuple: (first, last) so that rows first..last-1 of the indexed
+                table lie in the region. Unknown chromosomes give (0, 0).
+
+        Raises:
+            ValueError: If a coordinate range is given for a table without a
+                'coord' column.
+        """
+        if not self._has_coords and (start is not None or end is not None):
+            raise ValueError("Cannot select a coordinate range in a structure without a 'coord' column.")
+        code = self._chr_codes.get(chrom)
+        if code is None:
+            return 0, 0
+        first, last = int(self._chr_bounds[code]), int(self._chr_bounds[code + 1])
+        chr_coords = self._coords[first:last]
+        lo = first if start is None else first + int(np.searchsorted(chr_coords, start, side='left'))
+        hi = last if end is None else first + int(np.searchsorted(chr_coords, end, side='right'))
+        return lo, max(lo, hi)
+
+    def ranges(self, chrom, start=None, end=None):
+        """
+        Find the row ranges of a genomic region, one per haplotype of the chromosome.
+
+        Args:
+            chrom (str): Chromosome name, or the name of a chromosome without
+                its haplotype to get the ranges of all of its haplotypes.
+            start (int, optional): Inclusive start coordinate.
+            end (int, optional): Inclusive end coordinate.
+
+        Returns:
+            list: (first, last) row offsets of the indexed table, see locate().
+        """
+        if chrom not in self._chr_codes and chrom in self._haplotypes:
+            return [self.locate(label, start, end) for label in self._haplotypes[chrom]]
+        return [self.locate(chrom, start, end)]
+
+    def query(self, chrom, start=None, end=None):
+        """
+        Select a single genomic region.
+
+        Args:
+            chrom (str): Chromosome name.
+            start (int, optional): Inclusive start coordinate.
+            end (int, optional): Inclusive end coordinate.
+
+        Returns:
+            pa.Table: Zero-copy slice of the indexed table, or a concatenation
+                of slices for a chromosome with several haplotypes.
+        """
+        slices = [self.table.slice(lo, hi - lo) for lo, hi in self.ranges(chrom, start, end)]
+        return slices[0] if len(slices) == 1 else pa.concat_tables(slices)
+
+    def query_intervals(self, chroms, starts, ends):
+        """
+        Select the union of many genomic intervals.
+
+        All intervals are resolved in one vectorized pass: two binary searches
+        per interval, grouped by chromosome. Overlapping intervals are merged,
+        so every bead appears at most once in the result.
+
+        Args:
+            chroms (pa.Array): Chromosome name of each interval.
+            starts (np.ndarray): Inclusive start coordinate of each interval.
+            ends (np.ndarray): Inclusive end coordinate of each interval.
+
+        Returns:
+            pa.Table: Concatenation of zero-copy slices of the indexed table.
+        """
+        lo, hi = self._interval_offsets(chroms, starts, ends)
+        slices = [self.table.slice(first, last - first) for first, last in _merge_ranges(lo, hi)]
+        if not slices:
+            return self.table.slice(0, 0)
+        return pa.concat_tables(slices)
+
+    def _interval_offsets(self, chroms, starts, ends):
+        if not self._has_coords:
+            raise ValueError("Cannot select intervals in a structure without a 'coord' column.")
+        if self._haplotypes:
+            chroms, starts, ends = self._expand_haplotypes(chroms, starts, ends)
+        interval_codes = pc.index_in(chroms.cast(self._dictionary.type), value_set=self._dictionary)
+        interval_codes = pc.fill_null(interval_codes, -1).to_numpy()
+        starts = np.asarray(starts)
+        ends = np.asarray(ends)
+
+        lo_parts = []
+        hi_parts = []
+        for code in np.unique(interval_codes):
+            if code < 0:
+                # chromosome not present in the structure
+                continue
+            on_chr = interval_codes == code
+            first, last = self._chr_bounds[code], self._chr_bounds[code + 1]
+            chr_coords = self._coords[first:last]
+            lo_parts.append(first + np.searchsorted(chr_coords, starts[on_chr], side='left'))
+            hi_parts.append(first + np.searchsorted(chr_coords, ends[on_chr], side='right'))
+
+        if not lo_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(lo_parts), np.concatenate(hi_parts)
+
+    def _expand_haplotypes(self, chroms, starts, ends):
+        """Repeat intervals on chromosome names for each haplotype label of the chromosome."""
+        chroms = pa.array(chroms).cast(pa.string())
+        names = chroms.to_numpy(zero_copy_only=False).astype(object)
+        repeats = np.ones(len(names), dtype=np.int64)
+        expanded = {}
+        for name in set(names.tolist()):
+            if name not in self._chr_codes and name in self._haplotypes:
+                expanded[name] = self._haplotypes[name]
+                repeats[names == name] = len(self._haplotypes[name])
+        if not expanded:
+            return chroms, starts, ends
+
+        labels = np.repeat(names, repeats)
+        # position of each repeated interval among the copies of its original
+        rank = np.arange(len(labels)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        for name, haplotype_labels in expanded.items():
+            on_name = labels == name
+            labels[on_name] = np.asarray(haplotype_labels, dtype=object)[rank[on_name]]
+        return pa.array(labels.tolist(), pa.string()), np.repeat(starts, repeats), np.repeat(ends, repeats)
+
+def _merge_ranges(lo, hi):
+    """Merge half-open [lo, hi) row ranges into sorted, disjoint ranges."""
+    keep = hi > lo
+    lo = lo[keep]
+    hi = hi[keep]
+    if len(lo) == 0:
+        return []
+    order = np.argsort(lo, kind='stable')
+    lo = lo[order]
+    hi = np.maximum.accumulate(hi[order])
+    # a new range starts wherever the previous ranges end before this one begins
+    starts_new = np.concatenate(([True], lo[1:] > hi[:-1]))
+    range_starts = lo[starts_new]
+    range_ends = hi[np.concatenate((starts_new[1:], [True]))]
+    return list(zip(range_starts.tolist(), range_ends.tolist()))
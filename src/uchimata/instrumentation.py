@@ -0,0 +1,294 @@
+"""
+Opt-in timings of the conversion, query and widget paths.
+
+Nothing is recorded unless a Stats recorder is active:
+
+    >>> with uchimata.stats() as stats:
+    ...     w = uchimata.Widget(uchimata.select(model_bytes, "chr1"))
+    >>> w  # the front end reports its load and first-frame timings back
+    >>> print(stats.report())
+
+Every top-level call (select(), cut(), from_numpy(), Widget(), ...) records
+its total wall time, and the stages inside it record theirs together with
+the rows going in and out and the bytes they read or wrote: decoding Arrow
+IPC, querying the index or DuckDB, re-encoding, preparing the widget payloads
+and syncing them. Stages run from a call inside another call (e.g. from_numpy()
+converting a Widget input) are attributed to the outer call.
+
+When no recorder is active, stage() returns a shared no-op context manager,
+so the instrumented code paths only pay for one check of a list.
+"""
+
+import functools
+import itertools
+import threading
+import time
+from typing import NamedTuple
+
+import pyarrow as pa
+
+_lock = threading.Lock()
+# active recorders, in the order they were started
+_recorders = []
+_local = threading.local()
+_call_ids = itertools.count(1)
+
+class Record(NamedTuple):
+    """
+    Timing of one stage of a call.
+
+    Attributes:
+        call (str): Top-level function the stage ran in, e.g. "select" or
+            "Widget", or None for a stage run outside of any call.
+        call_id (int): Number of the call, identifying the stages of one
+            call. None for stages outside of any call.
+        stage (str): Name of the stage. "total" is the whole call, stages
+            reported by the front end start with "js.".
+        seconds (float): Wall time.
+        rows_in (int): Rows the stage read, if known.
+        rows_out (int): Rows the stage produced, if known.
+        bytes (int): Size of the serialized data the stage read or wrote,
+            if any.
+    """
+    call: str
+    call_id: int
+    stage: str
+    seconds: float
+    rows_in: int = None
+    rows_out: int = None
+    bytes: int = None
+
+SCHEMA = pa.schema([
+    ('call', pa.string()),
+    ('call_id', pa.int64()),
+    ('stage', pa.string()),
+    ('seconds', pa.float64()),
+    ('rows_in', pa.int64()),
+    ('rows_out', pa.int64()),
+    ('bytes', pa.int64()),
+])
+
+class Stats:
+    """
+    Recorder of stage timings, active between start() and stop() or inside a with block.
+
+    Records of the front end arrive after the widget was displayed, which is
+    usually after the with block ended. They are still added to the recorders
+    that were active when the widget was created.
+
+    Attributes:
+        records (list): The recorded Records, in the order the stages ended.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def start(self):
+        """Start recording. Returns the recorder."""
+        with _lock:
+            if self not in _recorders:
+                _recorders.append(self)
+        return self
+
+    def stop(self):
+        """Stop recording. Records already taken are kept."""
+        with _lock:
+            if self in _recorders:
+                _recorders.remove(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add(self, record):
+        """Add a Record, e.g. of a stage measured elsewhere."""
+        with _lock:
+            self.records.append(record)
+
+    def clear(self):
+        """Forget all records."""
+        with _lock:
+            self.records.clear()
+
+    def to_table(self):
+        """
+        All records, one row per stage run.
+
+        Returns:
+            pa.Table: Columns call, call_id, stage, seconds, rows_in, rows_out
+                and bytes, with nulls where a value is unknown.
+        """
+        with _lock:
+            records = list(self.records)
+        return pa.Table.from_pylist([record._asdict() for record in records], schema=SCHEMA)
+
+    def summary(self):
+        """
+        Records aggregated by call and stage.
+
+        Returns:
+            pa.Table: One row per (call, stage), in the order they were first
+                recorded, with the number of runs and the total seconds, rows
+                and bytes.
+        """
+        table = self.to_table()
+        summary = table.group_by(['call', 'stage'], use_threads=False).aggregate([
+            ('stage', 'count'),
+            ('seconds', 'sum'),
+            ('rows_in', 'sum'),
+            ('rows_out', 'sum'),
+            ('bytes', 'sum'),
+        ])
+        return summary.rename_columns({
+            'stage_count': 'runs', 'seconds_sum': 'seconds', 'rows_in_sum': 'rows_in',
+            'rows_out_sum': 'rows_out', 'bytes_sum': 'bytes',
+        }).select(['call', 'stage', 'runs', 'seconds', 'rows_in', 'rows_out', 'bytes'])
+
+    def report(self):
+        """
+        The summary as a text table.
+
+        Returns:
+            str: One line per (call, stage), with milliseconds, rows and bytes.
+        """
+        rows = self.summary().to_pylist()
+        header = f"{'call':<22} {'stage':<14} {'runs':>5} {'ms':>10} {'rows in':>11} {'rows out':>11} {'bytes':>13}"
+        lines = [header, "-" * len(header)]
+        blank = lambda value: "-" if value is None else f"{value:,}"
+        for row in rows:
+            lines.append(f"{row['call'] or '-':<22} {row['stage']:<14} {row['runs']:>5} "
+                         f"{row['seconds'] * 1000:>10.2f} {blank(row['rows_in']):>11} "
+                         f"{blank(row['rows_out']):>11} {blank(row['bytes']):>13}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"Stats({len(self.records)} records)"
+
+def stats():
+    """
+    Create a recorder of stage timings, to use as a context manager.
+
+    Returns:
+        Stats: A recorder, started when the with block is entered (or when
+            its start() method is called).
+
+    Example:
+        >>> with uchimata.stats() as stats:
+        ...     part = uchimata.select(model_bytes, "chr1")
+        >>> print(stats.report())
+    """
+    return Stats()
+
+def active():
+    """
+    Get the recorders that are active.
+
+    Returns:
+        list: The active Stats recorders, empty if instrumentation is off.
+    """
+    with _lock:
+        return list(_recorders)
+
+def current_call():
+    """(call, call_id) of the call running on this thread, or (None, None)."""
+    return getattr(_local, "call", (None, None))
+
+class _Stage:
+    """Context manager timing one stage and adding its Record to the recorders."""
+
+    __slots__ = ("recorders", "call", "name", "rows_in", "rows_out", "bytes", "start")
+
+    def __init__(self, recorders, call, name, rows_in, rows_out, bytes):
+        self.recorders = recorders
+        self.call = call
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.bytes = bytes
+
+    def update(self, rows_in=None, rows_out=None, bytes=None):
+        """Set the rows and bytes of the stage, once they are known."""
+        if rows_in is not None:
+            self.rows_in = rows_in
+        if rows_out is not None:
+            self.rows_out = rows_out
+        if bytes is not None:
+            self.bytes = bytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record = Record(*self.call, self.name, time.perf_counter() - self.start,
+                        self.rows_in, self.rows_out, self.bytes)
+        for recorder in self.recorders:
+            recorder.add(record)
+
+class _NoStage:
+    """Stand-in for _Stage while no recorder is active."""
+
+    __slots__ = ()
+
+    def update(self, rows_in=None, rows_out=None, bytes=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_STAGE = _NoStage()
+
+def stage(name, rows_in=None, rows_out=None, bytes=None):
+    """
+    Time a stage of the running call.
+
+    Args:
+        name (str): Name of the stage.
+        rows_in, rows_out, bytes (int, optional): Rows and bytes of the stage,
+            if already known. Others can be set through update() on the
+            object returned by the with statement.
+
+    Returns:
+        A context manager, which does nothing if no recorder is active.
+    """
+    if not _recorders:
+        return _NO_STAGE
+    return _Stage(active(), current_call(), name, rows_in, rows_out, bytes)
+
+def _output_size(result):
+    """(rows, bytes) of a call result, where they are known without computing anything."""
+    if isinstance(result, (bytes, bytearray)):
+        return None, len(result)
+    table = getattr(result, "_table", None)
+    if isinstance(table, pa.Table):
+        return table.num_rows, None
+    return None, None
+
+def instrumented(name):
+    """
+    Decorator recording the total wall time of a top-level function as its "total" stage.
+
+    Stages run inside the function are attributed to this call, unless it
+    runs inside another instrumented call.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _recorders or hasattr(_local, "call"):
+                return function(*args, **kwargs)
+            _local.call = (name, next(_call_ids))
+            try:
+                with stage("total") as total:
+                    result = function(*args, **kwargs)
+                    rows, size = _output_size(result)
+                    total.update(rows_out=rows, bytes=size)
+                return result
+            finally:
+                del _local.call
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+"""
+Level-of-detail pyramids for large 3D structures.
+
+Coarser levels merge runs of consecutive beads on the same chromosome into a
+single bead at their mean position, so million-bead models can be shown (and
+sent to the browser) at a fraction of their size.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import chromosomes, transport
+
+# columns summed by default when beads are merged, see coarsen()
+COUNT_COLUMNS = ('count',)
+
+def _is_numeric(column_type):
+    return pa.types.is_integer(column_type) or pa.types.is_floating(column_type)
+
+def _group_starts(table, factor):
+    """
+    First row of every group of up to `factor` consecutive beads on one chromosome.
+
+    Haplotypes of a chromosome (see chromosomes.split_haplotypes()) are
+    separate chromosomes here, so beads of two haplotypes are never merged.
+    """
+    num_rows = table.num_rows
+    if 'chr' in table.column_names:
+        chr_codes = pc.fill_null(chromosomes.labels(table).indices, -1).to_numpy()
+        run_starts = np.flatnonzero(np.concatenate(([True], chr_codes[1:] != chr_codes[:-1])))
+    else:
+        run_starts = np.array([0])
+
+    # position of every row within its chromosome run
+    run_lengths = np.diff(np.append(run_starts, num_rows))
+    rank = np.arange(num_rows) - np.repeat(run_starts, run_lengths)
+    return np.flatnonzero(rank % factor == 0)
+
+def coarsen(table, factor, sum=COUNT_COLUMNS):
+    """
+    Merge runs of consecutive beads on the same chromosome.
+
+    Every `factor` consecutive beads of a chromosome (in table order) become one
+    bead. The haplotypes of a chromosome are coarsened separately.
+    Coordinates and floating point columns are averaged, the count columns
+    named in `sum` are summed, 'coord' keeps the start of the first bead and
+    'end' the end of the last one, and all other columns (including integer
+    IDs and categories) keep the first bead's value. Per-bead viewconfig
+    values attached by the Widget are averaged (as float64 for integer
+    values), so they stay within the range of the original values. All
+    reductions are vectorized with np.add.reduceat.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y', 'z' and optionally
+            'chr' and 'coord' columns.
+        factor (int): Number of beads merged into one.
+        sum (tuple): Names of the numeric columns holding counts, which are
+            summed. Names that are not in the table are ignored. Defaults to
+            'count', the column annotate() counts intervals in.
+
+    Returns:
+        pa.Table: The coarsened table, with the same columns and types
+            (except for integer viewconfig values, which become float64).
+
+    Raises:
+        ValueError: If factor is smaller than 1, or a column to sum is not
+            numeric.
+    """
+    if factor < 1:
+        raise ValueError(f"Coarsening factor must be at least 1, got {factor}.")
+    for name in sum:
+        if name in table.column_names and not _is_numeric(table.schema.field(name).type):
+            raise ValueError(f"Cannot sum column '{name}' of type {table.schema.field(name).type}.")
+    if factor == 1 or table.num_rows == 0:
+        return table
+
+    starts = _group_starts(table, factor)
+    counts = np.diff(np.append(starts, table.num_rows))
+    last_rows = starts + counts - 1
+
+    columns = []
+    fields = []
+    for field, column in zip(table.schema, table.columns):
+        name, column_type = field.name, column.type
+        viewconfig_values = name.startswith(transport._VALUES_PREFIX)
+        if name == 'end':
+            columns.append(column.take(pa.array(last_rows)))
+        elif name in sum:
+            dtype = np.int64 if pa.types.is_integer(column_type) else np.float64
+            values = np.asarray(column.to_numpy(), dtype=dtype)
+            columns.append(pa.array(np.add.reduceat(values, starts)).cast(column_type))
+        elif name == 'coord' or not (pa.types.is_floating(column_type)
+                                     or (viewconfig_values and pa.types.is_integer(column_type))):
+            columns.append(column.take(pa.array(starts)))
+        else:
+            values = np.asarray(column.to_numpy(), dtype=np.float64)
+            means = np.add.reduceat(values, starts) / counts
+            if pa.types.is_integer(column_type):
+                # averaged integer values are not integers any more
+                field = field.with_type(pa.float64())
+                column_type = field.type
+            columns.append(pa.array(means).cast(column_type))
+        fields.append(field)
+
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=table.schema.metadata))
+
+def pyramid(table, factors=(2, 4, 8), sum=COUNT_COLUMNS):
+    """
+    Build a multi-resolution pyramid of a structure.
+
+    Every level is coarsened directly from the full-resolution table, so the
+    averages are exact at each level.
+
+    Args:
+        table (pa.Table): Structure table.
+        factors (tuple): Coarsening factors of the levels to build.
+        sum (tuple): Names of the count columns to sum, see coarsen().
+
+    Returns:
+        dict: Coarsened tables keyed by factor, including the full-resolution
+            table under factor 1.
+    """
+    levels = {1: table}
+    for factor in factors:
+        levels[factor] = coarsen(table, factor, sum)
+    return levels
@@ -0,0 +1,303 @@
+"""
+Reading structure files.
+
+The text formats (.3dg, PDB and XYZ) are parsed by pyarrow.csv in blocks of
+bytes, and the fields of every block are extracted with Arrow compute
+kernels, so no Python object is created per line. The readers can return a
+stream of record batches, which keeps memory bounded for large files.
+
+load_many() reads a batch of files concurrently. Decoding Arrow data releases
+the GIL, so a thread pool keeps several cores busy without the cost of
+moving tables between processes.
+"""
+
+import concurrent.futures
+import os
+import pathlib
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from . import chromosomes
+from .structure import Structure
+
+# bytes of text parsed per record batch
+_BLOCK_SIZE = 1 << 20
+
+_3DG_COLUMNS = ["chr", "coord", "x", "y", "z"]
+_CHR_TYPE = pa.dictionary(pa.int32(), pa.string())
+_3DG_TYPES = {"chr": _CHR_TYPE, "coord": pa.int64(), "x": pa.float64(), "y": pa.float64(), "z": pa.float64()}
+
+class LoadResult(NamedTuple):
+    """
+    Outcome of loading one file with load_many().
+
+    Attributes:
+        path: The path, as given.
+        structure (Structure): The loaded structure, or None if loading failed.
+        seconds (float): Time spent reading and processing the file.
+        error (Exception): The exception raised while loading, or None.
+    """
+    path: os.PathLike
+    structure: Optional[Structure]
+    seconds: float
+    error: Optional[Exception]
+
+def _output(schema, batches, stream):
+    reader = pa.RecordBatchReader.from_batches(schema, batches)
+    return reader if stream else Structure(reader.read_all())
+
+def _lines(path, block_size, ignore_empty_lines=True):
+    """Stream the lines of a text file as Arrow string arrays."""
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(column_names=["line"], block_size=block_size),
+        # a delimiter that does not occur in the supported formats: one column per line
+        parse_options=pacsv.ParseOptions(delimiter="\x1f", quote_char=False, double_quote=False,
+                                         ignore_empty_lines=ignore_empty_lines),
+        convert_options=pacsv.ConvertOptions(column_types={"line": pa.string()}),
+    )
+    for batch in reader:
+        yield batch.column(0)
+
+def _field(lines, start, stop):
+    """Fixed-width field of every line, without surrounding whitespace."""
+    return pc.utf8_trim_whitespace(pc.utf8_slice_codeunits(lines, start, stop))
+
+def read_3dg(path, stream=False, block_size=_BLOCK_SIZE, split_haplotypes=False):
+    """
+    Read a .3dg structure file (e.g. from Tan et al. 2018).
+
+    The file has one bead per line, with tab-separated chromosome, genomic
+    coordinate, x, y and z fields and no header. 'chr' is read as a dictionary
+    column.
+
+    Args:
+        path (str or pathlib.Path): Path to the file.
+        stream (bool): Return a stream of record batches instead of a
+            Structure.
+        block_size (int): Bytes of text parsed per record batch.
+        split_haplotypes (bool): Move haplotype suffixes such as "(pat)" into
+            a 'haplotype' column (see Structure.split_haplotypes()).
+
+    Returns:
+        Structure or pa.RecordBatchReader: The structure, with 'x', 'y', 'z',
+            'chr' and 'coord' columns (and 'haplotype' if split).
+
+    Example:
+        >>> model = read_3dg("GSM3271347_gm12878_01.impute.3dg.txt")
+        >>> Widget(model.select("1(mat)"))
+    """
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(column_names=_3DG_COLUMNS, block_size=block_size),
+        parse_options=pacsv.ParseOptions(delimiter="\t"),
+        convert_options=pacsv.ConvertOptions(column_types=_3DG_TYPES, include_columns=["x", "y", "z", "chr", "coord"]),
+    )
+    if not split_haplotypes:
+        return _output(reader.schema, reader, stream)
+
+    schema = reader.schema.insert(reader.schema.get_field_index("chr") + 1, pa.field("haplotype", _CHR_TYPE))
+    batches = (_split_batch(batch) for batch in reader)
+    return _output(schema, batches, stream)
+
+def _split_batch(batch):
+    table = chromosomes.split_haplotypes(pa.Table.from_batches([batch]))
+    return table.combine_chunks().to_batches()[0]
+
+def _pdb_batches(path, model, block_size):
+    # position of the last MODEL record seen in any block, -1 before the first one
+    current = -1
+    for lines in _lines(path, block_size):
+        # positional index of the model each line belongs to
+        is_model = pc.starts_with(lines, "MODEL ").to_numpy(zero_copy_only=False)
+        positions = current + np.cumsum(is_model)
+        if len(positions):
+            current = int(positions[-1])
+        # records before the first MODEL record belong to the first model
+        model_ids = np.maximum(positions, 0)
+
+        keep = pc.or_(pc.starts_with(lines, "ATOM  "), pc.starts_with(lines, "HETATM")).to_numpy(zero_copy_only=False)
+        if model is not None:
+            keep &= model_ids == model
+        records = lines.filter(pa.array(keep))
+
+        coord = _field(records, 80, 90)
+        columns = [pc.cast(_field(records, start, start + 8), pa.float64()) for start in (30, 38, 46)]
+        columns += [pc.dictionary_encode(_field(records, 17, 22)), pc.cast(pc.if_else(pc.equal(coord, ""), None, coord), pa.int64())]
+        if model is None:
+            columns.append(pa.array(model_ids[keep]))
+        yield pa.RecordBatch.from_arrays(columns, names=_pdb_schema(model).names)
+
+        if model is not None and current > model:
+            # the requested model is complete
+            return
+
+def _pdb_schema(model):
+    fields = [("x", pa.float64()), ("y", pa.float64()), ("z", pa.float64()), ("chr", _CHR_TYPE), ("coord", pa.int64())]
+    if model is None:
+        fields.append(("model", pa.int64()))
+    return pa.schema(fields)
+
+def read_pdb(path, model=0, stream=False, block_size=_BLOCK_SIZE):
+    """
+    Read the ATOM and HETATM records of a PDB file.
+
+    Coordinates are read from the standard columns. As in the genome
+    structure models of Stevens et al. 2017, 'chr' is read from columns
+    18-22 (residue name and chain) as a dictionary column and 'coord' from
+    columns 81-90 (null if the file has nothing there).
+
+    Args:
+        path (str or pathlib.Path): Path to the file.
+        model (int, optional): Position of the model to read (0 is the first
+            MODEL record, or the whole file if there are none). None reads
+            all models and adds a 'model' column with their positions.
+        stream (bool): Return a stream of record batches instead of a
+            Structure.
+        block_size (int): Bytes of text parsed per record batch.
+
+    Returns:
+        Structure or pa.RecordBatchReader: The structure, with 'x', 'y', 'z',
+            'chr' and 'coord' columns.
+
+    Example:
+        >>> models = [read_pdb("GSM2219497_Cell_1_genome_structure_model.pdb", model=i) for i in range(10)]
+        >>> Widget(StructureEnsemble(models))
+    """
+    return _output(_pdb_schema(model), _pdb_batches(path, model, block_size), stream)
+
+def _xyz_batches(path, model, block_size):
+    frame = -1
+    remaining = 0
+    comment = False
+    for lines in _lines(path, block_size, ignore_empty_lines=False):
+        pos = 0
+        while pos < len(lines):
+            if comment:
+                pos += 1
+                comment = False
+            elif remaining == 0:
+                header = lines[pos].as_py().strip()
+                pos += 1
+                if not header:
+                    continue
+                # a new frame: atom count line, then a comment line
+                frame += 1
+                remaining = int(header)
+                comment = True
+                if model is not None and frame > model:
+                    return
+            else:
+                take = min(remaining, len(lines) - pos)
+                if model is None or frame == model:
+                    tokens = pc.utf8_split_whitespace(lines.slice(pos, take))
+                    columns = [pc.cast(pc.list_element(tokens, i), pa.float64()) for i in (1, 2, 3)]
+                    if model is None:
+                        columns.append(pa.array(np.full(take, frame)))
+                    yield pa.RecordBatch.from_arrays(columns, names=_xyz_schema(model).names)
+                pos += take
+                remaining -= take
+
+def _xyz_schema(model):
+    fields = [("x", pa.float64()), ("y", pa.float64()), ("z", pa.float64())]
+    if model is None:
+        fields.append(("model", pa.int64()))
+    return pa.schema(fields)
+
+def read_xyz(path, model=0, stream=False, block_size=_BLOCK_SIZE):
+    """
+    Read an XYZ file.
+
+    Every frame starts with a line holding its number of atoms and a comment
+    line, followed by one "element x y z" line per atom.
+
+    Args:
+        path (str or pathlib.Path): Path to the file.
+        model (int, optional): Position of the frame to read (0 is the
+            first). None reads all frames and adds a 'model' column with
+            their positions.
+        stream (bool): Return a stream of record batches instead of a
+            Structure.
+        block_size (int): Bytes of text parsed per record batch.
+
+    Returns:
+        Structure or pa.RecordBatchReader: The structure, with 'x', 'y' and
+            'z' columns.
+
+    Example:
+        >>> Widget(read_xyz("sample_data/test.xyz"))
+    """
+    return _output(_xyz_schema(model), _xyz_batches(path, model, block_size), stream)
+
+# Readers by (lowercase) file extension, other files are read as Arrow IPC
+_READERS = {".arrow": Structure, ".3dg": read_3dg, ".pdb": read_pdb, ".xyz": read_xyz}
+
+def read(path):
+    """
+    Read a structure file, choosing the reader by its extension.
+
+    Args:
+        path (str or pathlib.Path): Path to the file. Files ending in .3dg,
+            .pdb or .xyz (possibly followed by another extension, e.g.
+            .3dg.txt) are read with read_3dg(), read_pdb() or read_xyz(), and
+            other files as Arrow IPC (file or stream format).
+
+    Returns:
+        Structure: The structure in the file.
+    """
+    for suffix in reversed(pathlib.Path(path).suffixes):
+        reader = _READERS.get(suffix.lower())
+        if reader is not None:
+            return reader(path)
+    return Structure(path)
+
+def _load_one(path, region, lod, transform):
+    start = time.perf_counter()
+    try:
+        structure = read(path)
+        if region is not None:
+            structure = structure.select(region)
+        if lod is not None:
+            structure = structure.coarsen(lod)
+        if transform is not None:
+            structure = transform(structure)
+    except Exception as error:
+        return LoadResult(path, None, time.perf_counter() - start, error)
+    return LoadResult(path, structure, time.perf_counter() - start, None)
+
+def load_many(paths, workers=None, region=None, lod=None, transform=None):
+    """
+    Read many structure files concurrently.
+
+    Every file is read, and optionally filtered and coarsened, on a bounded
+    thread pool. A file that fails to load does not abort the batch: its
+    result holds the exception instead of a structure.
+
+    Args:
+        paths (list): Paths to the structure files (str or pathlib.Path).
+        workers (int, optional): Number of threads. Defaults to the
+            concurrent.futures default for the machine.
+        region (str, optional): Query string in the format accepted by
+            select(), applied to every structure.
+        lod (int, optional): Coarsening factor applied to every structure
+            (see coarsen()).
+        transform (callable, optional): Function applied to every Structure
+            last, returning a Structure.
+
+    Returns:
+        list: A LoadResult (path, structure, seconds, error) for each path,
+            in input order.
+
+    Example:
+        >>> results = load_many(sorted(pathlib.Path("out").glob("*.arrow")), workers=8, lod=4)
+        >>> failed = [r for r in results if r.error is not None]
+        >>> Widget(*[r.structure for r in results if r.error is None])
+    """
+    paths = list(paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda path: _load_one(path, region, lod, transform), paths))
@@ -0,0 +1,376 @@
+"""
+Spatial operations on 3D structure tables.
+
+Coordinates are read from the 'x', 'y' and 'z' columns as numpy views of the
+Arrow buffers, and all filters are computed as vectorized numpy masks.
+
+The display frame (centering and normalization) of structures is computed
+here too, from bounding statistics that the widget sends along with each
+structure, so the front end does not need to reduce over the beads.
+"""
+
+import numpy as np
+import pyarrow as pa
+
+def coordinates(table):
+    """
+    Get the coordinate columns of a structure table as numpy arrays.
+
+    Single-chunk columns without nulls are returned as zero-copy views of the
+    Arrow buffers.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+
+    Returns:
+        tuple: (x, y, z) 1D numpy arrays.
+    """
+    return tuple(table.column(axis).to_numpy() for axis in ('x', 'y', 'z'))
+
+def _shapes(shapes):
+    """Accept a single clip shape or a list of them."""
+    if shapes is None:
+        return []
+    if isinstance(shapes, list):
+        return shapes
+    return [shapes]
+
+def clip_mask(table, plane=None, box=None, sphere=None, slab=None, invert=False):
+    """
+    Compute which beads of a structure lie inside all of the given clip shapes.
+
+    Each shape argument takes a single shape or a list of shapes. All shapes
+    are intersected, so combining e.g. a box and a plane keeps only the part of
+    the box in front of the plane.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+        plane: Half-space (normal, offset). Keeps points p with dot(normal, p) > offset.
+        box: Axis-aligned box (min_corner, max_corner). Keeps points inside, inclusive.
+        sphere: Ball (center, radius). Keeps points within radius of center.
+        slab: Slab (normal, low, high). Keeps points p with low <= dot(normal, p) <= high.
+        invert (bool): Keep the points outside the intersection instead.
+
+    Returns:
+        np.ndarray: Boolean mask with one entry per bead.
+    """
+    x, y, z = coordinates(table)
+    mask = np.ones(table.num_rows, dtype=bool)
+
+    for normal, offset in _shapes(plane):
+        nx, ny, nz = normal
+        mask &= nx * x + ny * y + nz * z > offset
+
+    for min_corner, max_corner in _shapes(box):
+        for values, low, high in zip((x, y, z), min_corner, max_corner):
+            mask &= (values >= low) & (values <= high)
+
+    for center, radius in _shapes(sphere):
+        cx, cy, cz = center
+        mask &= (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 <= radius ** 2
+
+    for normal, low, high in _shapes(slab):
+        nx, ny, nz = normal
+        projection = nx * x + ny * y + nz * z
+        mask &= (projection >= low) & (projection <= high)
+
+    if invert:
+        mask = ~mask
+    return mask
+
+def bounds(table):
+    """
+    Compute the bounding box and centroid of a structure.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+
+    Returns:
+        dict: JSON-serializable statistics: 'min' and 'max' corners of the
+            bounding box, 'centroid' (mean bead position) and 'count' (number
+            of beads). An empty structure has all corners at the origin.
+    """
+    points = _points(table)
+    if len(points) == 0:
+        return {"min": [0.0] * 3, "max": [0.0] * 3, "centroid": [0.0] * 3, "count": 0}
+    return {
+        "min": points.min(axis=0).tolist(),
+        "max": points.max(axis=0).tolist(),
+        "centroid": points.mean(axis=0).tolist(),
+        "count": len(points),
+    }
+
+def merge_bounds(all_bounds):
+    """
+    Combine the statistics of several structures, see bounds().
+
+    Args:
+        all_bounds (list): Statistics of each structure.
+
+    Returns:
+        dict: Statistics of all beads of the structures together.
+    """
+    all_bounds = [b for b in all_bounds if b["count"] > 0]
+    if not all_bounds:
+        return {"min": [0.0] * 3, "max": [0.0] * 3, "centroid": [0.0] * 3, "count": 0}
+    counts = np.array([b["count"] for b in all_bounds], dtype=np.float64)
+    centroids = np.array([b["centroid"] for b in all_bounds])
+    return {
+        "min": np.min([b["min"] for b in all_bounds], axis=0).tolist(),
+        "max": np.max([b["max"] for b in all_bounds], axis=0).tolist(),
+        "centroid": (counts @ centroids / counts.sum()).tolist(),
+        "count": int(counts.sum()),
+    }
+
+def frame(stats, center=True, normalize=True):
+    """
+    Compute the display frame of a structure from its statistics.
+
+    Displayed coordinates are (p - offset) * scale. Centering moves the
+    centroid to the origin, and normalizing scales the longest side of the
+    bounding box to 1.
+
+    Args:
+        stats (dict): Statistics from bounds() or merge_bounds().
+        center (bool): Move the centroid to the origin.
+        normalize (bool): Scale the bounding box to unit size.
+
+    Returns:
+        dict: JSON-serializable frame with 'offset' (3 floats) and 'scale'.
+    """
+    offset = stats["centroid"] if center else [0.0] * 3
+    extent = float(np.max(np.subtract(stats["max"], stats["min"])))
+    scale = 1.0 / extent if normalize and extent > 0 else 1.0
+    return {"offset": [float(o) for o in offset], "scale": scale}
+
+def apply_frame(table, frame):
+    """
+    Bake a display frame into the coordinates of a structure.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+        frame (dict): Frame from frame().
+
+    Returns:
+        pa.Table: The table with transformed coordinates. Floating point
+            columns keep their type, integer columns become float32.
+    """
+    for axis, values, offset in zip(('x', 'y', 'z'), coordinates(table), frame["offset"]):
+        dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.float32
+        transformed = ((np.asarray(values, dtype=np.float64) - offset) * frame["scale"]).astype(dtype)
+        table = table.set_column(table.schema.get_field_index(axis), axis, pa.array(transformed))
+    return table
+
+def transform_bounds(stats, frame):
+    """Statistics of a structure after applying a frame to it, see apply_frame()."""
+    moved = lambda point: ((np.asarray(point) - frame["offset"]) * frame["scale"]).tolist()
+    return {"min": moved(stats["min"]), "max": moved(stats["max"]), "centroid": moved(stats["centroid"]),
+            "count": stats["count"]}
+
+def _points(table):
+    """Stack the coordinate columns of a structure table into an (n, 3) float64 array."""
+    return np.column_stack([np.asarray(values, dtype=np.float64) for values in coordinates(table)])
+
+def _concat_ranges(starts, ends):
+    """Concatenate the integer ranges [starts[i], ends[i]) without a Python loop."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # offset of each range's first element within the concatenated output
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+class SpatialIndex:
+    """
+    Uniform voxel grid over the beads of a 3D structure.
+
+    Beads are bucketed into cubic cells and sorted by cell, so a radius query
+    only inspects the cells overlapping the query ball and a nearest-neighbour
+    query grows its search radius until it provably contains the k nearest
+    beads. Building the grid is O(n log n), and queries touch a number of
+    beads proportional to the density around the query point.
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+        cell_size (float, optional): Edge length of the grid cells. Defaults to
+            a size that puts a handful of beads in an average occupied cell.
+
+    Attributes:
+        points (np.ndarray): (n, 3) bead coordinates in table row order.
+        cell_size (float): Edge length of the grid cells.
+
+    Example:
+        >>> index = SpatialIndex(table)
+        >>> rows = index.query_radius((0.0, 0.0, 0.0), 2.0)
+    """
+
+    def __init__(self, table, cell_size=None):
+        self.points = _points(table)
+        num_points = len(self.points)
+
+        if num_points == 0:
+            self._origin = np.zeros(3)
+            extent = np.zeros(3)
+        else:
+            self._origin = self.points.min(axis=0)
+            extent = self.points.max(axis=0) - self._origin
+
+        if cell_size is None:
+            # aim for about 8 beads per cell if they filled the bounding box evenly
+            volume = float(np.prod(np.maximum(extent, extent.max() * 1e-3 + 1e-12)))
+            cell_size = (8.0 * volume / max(num_points, 1)) ** (1.0 / 3.0)
+        self.cell_size = float(cell_size) if cell_size > 0 else 1.0
+
+        self._dims = np.floor(extent / self.cell_size).astype(np.int64) + 1
+        cell_keys = self._cell_keys(self._cells(self.points))
+        self._order = np.argsort(cell_keys, kind='stable')
+        self._sorted_keys = cell_keys[self._order]
+
+    def _cells(self, points):
+        cells = np.floor((points - self._origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self._dims - 1)
+
+    def _cell_keys(self, cells):
+        return (cells[..., 0] * self._dims[1] + cells[..., 1]) * self._dims[2] + cells[..., 2]
+
+    def _candidates(self, point, radius):
+        """Rows of all beads in the cells overlapping the ball around point."""
+        low = self._cells(point - radius)
+        high = self._cells(point + radius)
+        num_cells = np.prod(high - low + 1)
+        if num_cells > len(self.points):
+            # the ball covers most of the grid, scanning everything is cheaper
+            return np.arange(len(self.points))
+
+        # cells with the same (x, y) and consecutive z have consecutive keys
+        ix, iy = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1), indexing='ij')
+        columns = np.stack([ix.ravel(), iy.ravel()], axis=1)
+        first_keys = self._cell_keys(np.column_stack([columns, np.full(len(columns), low[2])]))
+        last_keys = self._cell_keys(np.column_stack([columns, np.full(len(columns), high[2])]))
+        starts = np.searchsorted(self._sorted_keys, first_keys, side='left')
+        ends = np.searchsorted(self._sorted_keys, last_keys, side='right')
+        return self._order[_concat_ranges(starts, ends)]
+
+    def query_radius(self, point, radius):
+        """
+        Find the beads within a distance of a point.
+
+        Args:
+            point (array-like): Query point (x, y, z).
+            radius (float): Search radius, in the units of the coordinates.
+
+        Returns:
+            np.ndarray: Row indices of the beads within radius, in row order.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        candidates = self._candidates(point, radius)
+        distances = np.sum((self.points[candidates] - point) ** 2, axis=1)
+        return np.sort(candidates[distances <= radius ** 2])
+
+    def query_knn(self, point, k):
+        """
+        Find the k beads nearest to a point.
+
+        Args:
+            point (array-like): Query point (x, y, z).
+            k (int): Number of neighbours.
+
+        Returns:
+            tuple: (rows, distances) of the k nearest beads, ordered by distance.
+                Fewer than k beads are returned if the structure is smaller.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        k = min(int(k), len(self.points))
+        radius = self.cell_size
+        while True:
+            candidates = self._candidates(point, radius)
+            distances = np.sqrt(np.sum((self.points[candidates] - point) ** 2, axis=1))
+            if len(candidates) >= k:
+                nearest = np.argsort(distances, kind='stable')[:k]
+                # exact once the k-th distance lies within the searched ball
+                if k == 0 or distances[nearest[-1]] <= radius or len(candidates) == len(self.points):
+                    return candidates[nearest], distances[nearest]
+            radius *= 2.0
+
+    def query_pairs(self, radius, chunk_size=1 << 16):
+        """
+        Find all pairs of beads within a distance of each other.
+
+        Every bead is compared with the beads of its own cell and of the
+        neighbouring cells in half of the directions, so each pair is found
+        once. Candidates are generated for chunk_size beads at a time, which
+        bounds the memory used. The search is fastest when the cell size is
+        about the radius.
+
+        Args:
+            radius (float): Largest distance between the beads of a pair.
+            chunk_size (int): Number of beads whose candidates are expanded
+                at once.
+
+        Returns:
+            tuple: (rows_a, rows_b) of all pairs with rows_a < rows_b.
+        """
+        reach = max(int(np.ceil(radius / self.cell_size)), 1)
+        steps = np.arange(-reach, reach + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+        # the half of the neighbourhood after the cell itself, in key order
+        offsets = offsets[[tuple(o) >= (0, 0, 0) for o in offsets.tolist()]]
+
+        sorted_cells = self._cells(self.points)[self._order]
+        sorted_points = self.points[self._order]
+        pairs_a = []
+        pairs_b = []
+        for chunk in range(0, len(sorted_points), chunk_size):
+            positions = np.arange(chunk, min(chunk + chunk_size, len(sorted_points)))
+            for offset in offsets:
+                cells = sorted_cells[positions] + offset
+                inside = np.all((cells >= 0) & (cells < self._dims), axis=1)
+                sources = positions[inside]
+                keys = self._cell_keys(cells[inside])
+                starts = np.searchsorted(self._sorted_keys, keys, side='left')
+                ends = np.searchsorted(self._sorted_keys, keys, side='right')
+                if not offset.any():
+                    # pairs within one cell: only the beads after the source
+                    starts = np.maximum(starts, sources + 1)
+                    ends = np.maximum(ends, starts)
+                targets = _concat_ranges(starts, ends)
+                sources = np.repeat(sources, ends - starts)
+                close = np.sum((sorted_points[sources] - sorted_points[targets]) ** 2, axis=1) <= radius ** 2
+                pairs_a.append(self._order[sources[close]])
+                pairs_b.append(self._order[targets[close]])
+
+        if not pairs_a:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows_a = np.concatenate(pairs_a)
+        rows_b = np.concatenate(pairs_b)
+        return np.minimum(rows_a, rows_b), np.maximum(rows_a, rows_b)
+
+def contact_counts(models, cutoff):
+    """
+    Count, over several models of the same beads, the pairs of beads in contact.
+
+    Args:
+        models (iterable): (beads, 3) coordinate arrays, one per model, with
+            the beads in the same order.
+        cutoff (float): Largest distance between two beads in contact.
+
+    Returns:
+        tuple: (bin1, bin2, count) np.ndarrays with the bead pairs
+            (bin1 < bin2) in contact in at least one model, sorted by bin1
+            and then bin2, and the number of models they are in contact in.
+    """
+    keys = []
+    num_beads = 0
+    for points in models:
+        num_beads = len(points)
+        xyz = np.asarray(points)
+        index = SpatialIndex(pa.table({'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2]}), cell_size=cutoff)
+        rows_a, rows_b = index.query_pairs(cutoff)
+        keys.append(rows_a * num_beads + rows_b)
+
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    pairs, counts = np.unique(np.concatenate(keys), return_counts=True)
+    bin1, bin2 = np.divmod(pairs, max(num_beads, 1))
+    return bin1, bin2, counts.astype(np.int32)
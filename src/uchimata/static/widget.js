@@ -1,5 +1,8 @@
 // @deno-types="npm:uchimata"
 import * as uchi from "https://esm.sh/uchimata@^0.3.x";
+import * as arrow from "https://esm.sh/apache-arrow@17";
+import { decompress as zstdDecompress } from "https://esm.sh/fzstd@0.1.1";
+import lz4 from "https://esm.sh/lz4js@0.2.0";
 
 /**
  * @typedef TextFile
@@ -15,29 +18,191 @@ import * as uchi from "https://esm.sh/uchimata@^0.3.x";
  * @property {string} delimiter
  */
 
-export default {
-  /** @type {import("npm:@anywidget/types@0.1.6").Render<Model>} */
-  render({ model, el }) {
-    //~ create a scene
-    let chromatinScene = uchi.initScene();
+/**
+ * Undo the frame compression of a payload (see uchimata/transport.py),
+ * recognized by the ZSTD or LZ4 frame magic number.
+ * @param {DataView} view
+ * @returns {DataView}
+ */
+function decompressTransport(view) {
+  const bytes = new Uint8Array(view.buffer, view.byteOffset, view.byteLength);
+  const magic = view.byteLength >= 4 ? view.getUint32(0, true) : 0;
+  let decompressed;
+  if (magic === 0xfd2fb528) {
+    decompressed = zstdDecompress(bytes);
+  } else if (magic === 0x184d2204) {
+    decompressed = new Uint8Array(lz4.decompress(bytes));
+  } else {
+    return view;
+  }
+  return new DataView(
+    decompressed.buffer,
+    decompressed.byteOffset,
+    decompressed.byteLength,
+  );
+}
+
+/**
+ * @param {DataView} view
+ * @returns {arrow.Table}
+ */
+function readTable(view) {
+  return arrow.tableFromIPC(
+    new Uint8Array(view.buffer, view.byteOffset, view.byteLength),
+  );
+}
+
+/**
+ * Columns of a table, with dictionary-encoded columns expanded.
+ * @param {arrow.Table} table
+ * @returns {Object<string, arrow.Vector>}
+ */
+function plainColumns(table) {
+  const columns = {};
+  for (const field of table.schema.fields) {
+    const column = table.getChild(field.name);
+    columns[field.name] = arrow.DataType.isDictionary(field.type)
+      ? arrow.vectorFromArray(Array.from(column), field.type.dictionary)
+      : column;
+  }
+  return columns;
+}
+
+/**
+ * Display frame computed in Python (see uchimata/spatial.py), or undefined
+ * if the structure should be centered and normalized by uchimata itself.
+ * @param {Map<string, string>} metadata
+ * @returns {{offset: number[], scale: number} | undefined}
+ */
+function readFrame(metadata) {
+  return metadata.has("uchimata:frame")
+    ? JSON.parse(metadata.get("uchimata:frame"))
+    : undefined;
+}
+
+/**
+ * @param {{offset: number[], scale: number}} frame
+ * @returns {boolean}
+ */
+function isIdentityFrame(frame) {
+  return frame.scale === 1 && frame.offset.every((o) => o === 0);
+}
+
+/**
+ * Restore float32 coordinates of a structure sent with a compact encoding,
+ * plain columns for dictionary-encoded ones and the shared columns of
+ * ensemble models, and move the coordinates into their display frame (see
+ * uchimata/transport.py and uchimata/ensemble.py). Other structures are
+ * passed through as is.
+ * @param {DataView} view
+ * @param {(key: string) => Object<string, arrow.Vector>} sharedColumns
+ * @returns {{buffer: ArrayBuffer, framed: boolean, numRows: number}}
+ */
+function decodeTransport(view, sharedColumns) {
+  const table = readTable(view);
+  const metadata = table.schema.metadata;
+  const encoded = metadata.has("uchimata:encoding");
+  const shared = metadata.has("uchimata:shared");
+  const frame = readFrame(metadata);
+  const moved = frame !== undefined && !isIdentityFrame(frame);
+  const fields = table.schema.fields;
+  if (
+    !encoded && !shared && !moved &&
+    !fields.some((f) => arrow.DataType.isDictionary(f.type))
+  ) {
+    const buffer =
+      (view.byteOffset === 0 && view.byteLength === view.buffer.byteLength)
+        ? view.buffer
+        : view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength);
+    return { buffer, framed: frame !== undefined, numRows: table.numRows };
+  }
+
+  //~ join the ensemble's shared columns (same rows, same order)
+  const columns = {
+    ...plainColumns(table),
+    ...(shared ? sharedColumns(metadata.get("uchimata:shared")) : {}),
+  };
+  if (encoded) {
+    decodeCoordinates(table, metadata, columns);
+  }
+  if (moved) {
+    applyFrame(table.numRows, frame, columns);
+  }
 
-    const structures = model.get("structures");
-    const viewconfigs = model.get("viewconfigs");
-    const options = model.get("options");
+  const ipc = arrow.tableToIPC(new arrow.Table(columns), "stream");
+  return {
+    buffer: ipc.buffer.slice(ipc.byteOffset, ipc.byteOffset + ipc.byteLength),
+    framed: frame !== undefined,
+    numRows: table.numRows,
+  };
+}
 
-    //~ displayable structure = structure + viewconfig
-    const displayableStructures = [];
-    for (const [i, s] of structures.entries()) {
-      displayableStructures.push({ structure: s, viewConfig: viewconfigs[i] });
+/**
+ * Move the coordinate columns into a display frame: (p - offset) * scale.
+ * @param {number} numRows
+ * @param {{offset: number[], scale: number}} frame
+ * @param {Object<string, arrow.Vector>} columns
+ */
+function applyFrame(numRows, frame, columns) {
+  for (const [i, axis] of ["x", "y", "z"].entries()) {
+    const values = columns[axis];
+    const moved = new Float32Array(numRows);
+    for (let j = 0; j < numRows; j++) {
+      moved[j] = (values.get(j) - frame.offset[i]) * frame.scale;
     }
+    columns[axis] = arrow.makeVector(moved);
+  }
+}
 
-    if (
-      displayableStructures.length === 0 ||
-      displayableStructures[0].structure === undefined
-    ) {
-      console.error("suplied structure is UNDEFINED");
+/**
+ * Dequantize the coordinate columns of an encoded structure into columns.
+ * @param {arrow.Table} table
+ * @param {Map<string, string>} metadata
+ * @param {Object<string, arrow.Vector>} columns
+ */
+function decodeCoordinates(table, metadata, columns) {
+  const scale = JSON.parse(metadata.get("uchimata:scale"));
+  const offset = JSON.parse(metadata.get("uchimata:offset"));
+  for (const [i, axis] of ["x", "y", "z"].entries()) {
+    const encoded = table.getChild(axis);
+    const decoded = new Float32Array(table.numRows);
+    for (let j = 0; j < table.numRows; j++) {
+      decoded[j] = encoded.get(j) * scale[i] + offset[i];
     }
+    columns[axis] = arrow.makeVector(decoded);
+  }
+}
+
+export default {
+  /** @type {import("npm:@anywidget/types@0.1.6").Initialize<Model>} */
+  initialize({ model }) {
+    //~ apply the targeted update messages to the shared model state (once
+    //~ per model; views then decode only the structures that changed)
+    model.on("msg:custom", (msg, buffers) => {
+      const structures = model.get("structures");
+      const viewconfigs = model.get("viewconfigs");
+      //~ shared ensemble columns the structure refers to, sent along with it
+      const shared = model.get("shared");
+      for (const [i, key] of (msg.shared ?? []).entries()) {
+        shared[key] = buffers[i + 1];
+      }
+      if (msg.type === "update_viewconfig") {
+        viewconfigs[msg.index] = msg.viewconfig;
+      } else if (msg.type === "update_structure") {
+        structures[msg.index] = buffers[0];
+        viewconfigs[msg.index] = msg.viewconfig;
+      } else if (msg.type === "add_structure") {
+        structures.push(buffers[0]);
+        viewconfigs.push(msg.viewconfig);
+      } else if (msg.type === "remove_structure") {
+        structures.splice(msg.index, 1);
+        viewconfigs.splice(msg.index, 1);
+      }
+    });
+  },
 
+  /** @type {import("npm:@anywidget/types@0.1.6").Render<Model>} */
+  render({ model, el }) {
     /** @type {import("http://localhost:5173/src/main.ts").ViewConfig} */
     const defaultViewConfig = {
       color: "red",
@@ -49,31 +214,141 @@ export default {
       normalize: true,
     };
 
-    const opts = (options === undefined) ? defaultOptions : {
-      center: options.center ?? defaultOptions.center,
-      normalize: options.normalize ?? defaultOptions.normalize,
+    let renderer = undefined;
+    let canvas = undefined;
+    //~ decoded structures, in the same order as model.get("structures")
+    let loadedStructures = [];
+    //~ decoded shared ensemble columns, by key
+    const sharedTables = new Map();
+
+    const sharedColumns = (key) => {
+      if (!sharedTables.has(key)) {
+        const table = readTable(decompressTransport(model.get("shared")[key]));
+        sharedTables.set(key, plainColumns(table));
+      }
+      return sharedTables.get(key);
+    };
+
+    const loadOptions = () => {
+      const options = model.get("options");
+      return (options === undefined) ? defaultOptions : {
+        center: options.center ?? defaultOptions.center,
+        normalize: options.normalize ?? defaultOptions.normalize,
+      };
     };
 
-    for (const ds of displayableStructures) {
-      console.log("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~");
-      const vc = (ds.viewConfig === undefined)
-        ? defaultViewConfig
-        : ds.viewConfig;
-      const structure = uchi.load(ds.structure.buffer, opts);
-      chromatinScene = uchi.addStructureToScene(
-        chromatinScene,
-        structure,
-        vc,
+    //~ stage timings of the first render, reported with the "rendered"
+    //~ message (see uchimata.stats()); undefined afterwards
+    let timings = [];
+    const renderStart = performance.now();
+    const seconds = (start) => (performance.now() - start) / 1000;
+
+    const loadStructure = (s) => {
+      let start = performance.now();
+      const { buffer, framed, numRows } = decodeTransport(
+        decompressTransport(s),
+        sharedColumns,
       );
-    }
+      timings?.push({
+        stage: "decode",
+        seconds: seconds(start),
+        rows: numRows,
+        bytes: s.byteLength,
+      });
+      start = performance.now();
+      //~ structures framed in Python are not centered or normalized again
+      const structure = uchi.load(
+        buffer,
+        framed ? { center: false, normalize: false } : loadOptions(),
+      );
+      timings?.push({ stage: "load", seconds: seconds(start), rows: numRows });
+      return structure;
+    };
+
+    const loadAll = () => {
+      const structures = model.get("structures");
+      if (structures.length === 0 || structures[0] === undefined) {
+        console.error("suplied structure is UNDEFINED");
+      }
+      loadedStructures = structures.map(loadStructure);
+    };
+
+    const show = () => {
+      //~ create a scene: displayable structure = structure + viewconfig
+      let chromatinScene = uchi.initScene();
+      const viewconfigs = model.get("viewconfigs");
+      for (const [i, structure] of loadedStructures.entries()) {
+        const vc = (viewconfigs[i] === undefined)
+          ? defaultViewConfig
+          : viewconfigs[i];
+        chromatinScene = uchi.addStructureToScene(
+          chromatinScene,
+          structure,
+          vc,
+        );
+      }
+
+      //~ The uchimata JS API (0.3.x) only renders a scene through display(),
+      //~ which creates a new renderer and canvas: there is no call to swap
+      //~ or update the scene of an existing renderer. So every change
+      //~ rebuilds the renderer (which resets the camera) from the decoded
+      //~ structures, which are kept. The new canvas replaces the old one in
+      //~ a single DOM operation, so the view is never empty in between.
+      const previous = [renderer, canvas];
+      [renderer, canvas] = uchi.display(chromatinScene, {
+        alwaysRedraw: false,
+      });
+      if (previous[0] !== undefined) {
+        previous[0].endDrawing();
+        el.replaceChild(canvas, previous[1]);
+      } else {
+        el.appendChild(canvas);
+      }
+    };
+
+    const reload = () => {
+      loadAll();
+      const start = performance.now();
+      show();
+      timings?.push({ stage: "display", seconds: seconds(start) });
+    };
+
+    //~ update messages only decode the structures that changed; the renderer
+    //~ is still rebuilt (see show())
+    const patch = (msg) => {
+      if (msg.type === "add_structure") {
+        loadedStructures.push(loadStructure(model.get("structures").at(-1)));
+      } else if (msg.type === "remove_structure") {
+        loadedStructures.splice(msg.index, 1);
+      } else if (msg.type === "update_structure") {
+        loadedStructures[msg.index] = loadStructure(
+          model.get("structures")[msg.index],
+        );
+      } else if (msg.type !== "update_viewconfig") {
+        return;
+      }
+      show();
+    };
+
+    reload();
+    model.on("change:structures", reload);
+    model.on("change:options", reload);
+    model.on("change:viewconfigs", show);
+    model.on("msg:custom", patch);
 
-    const [renderer, canvas] = uchi.display(chromatinScene, {
-      alwaysRedraw: false,
+    //~ lets the Python side swap a coarse level of detail for the full one;
+    //~ requested after display(), so it runs once the first frame is drawn
+    requestAnimationFrame(() => {
+      timings.push({ stage: "first_frame", seconds: seconds(renderStart) });
+      model.send({ type: "rendered", timings });
+      timings = undefined;
     });
-    el.appendChild(canvas);
 
     return () => {
-      // Optionally cleanup
+      model.off("change:structures", reload);
+      model.off("change:options", reload);
+      model.off("change:viewconfigs", show);
+      model.off("msg:custom", patch);
       renderer.endDrawing();
     };
   },
@@ -0,0 +1,481 @@
+"""
+In-memory 3D structures.
+
+A Structure keeps a 3D chromatin model as an Arrow Table (or a lazy DuckDB
+relation) between operations, so chains like select -> cut -> Widget decode
+the input once and serialize the result once.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+import bioframe
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from . import chromosomes, db, instrumentation, lod, spatial, tracks, transport
+from .index import StructureIndex, parse_region
+from .spatial import SpatialIndex, clip_mask
+
+# Recently queried structures, keyed by a hash of the structure bytes
+_STRUCTURE_CACHE = collections.OrderedDict()
+_STRUCTURE_CACHE_SIZE = 16
+# guards the cache, which load_many() uses from several threads
+_cache_lock = threading.Lock()
+
+def _structure_key(model):
+    """Hash of the structure bytes, used to key the per-structure caches."""
+    return hashlib.blake2b(model, digest_size=16).digest()
+
+def _read_table(model):
+    """
+    Decode Arrow IPC data, detecting whether it uses the file or the stream format.
+
+    Paths are memory-mapped rather than read, so the returned table references
+    the mapped file instead of a copy of it on the Python heap. Payloads
+    compressed with transport.compress() are decompressed first.
+    """
+    with instrumentation.stage("decode") as stage:
+        if isinstance(model, (str, os.PathLike)):
+            stage.update(bytes=os.path.getsize(model))
+            source = transport.decompress(pa.memory_map(os.fspath(model), 'r'))
+        else:
+            stage.update(bytes=memoryview(model).nbytes)
+            source = transport.decompress(model)
+
+        if isinstance(source, pa.NativeFile):
+            magic = source.read(6)
+            source.seek(0)
+        else:
+            magic = bytes(memoryview(source)[:6])
+
+        if magic == b"ARROW1":
+            table = pa.ipc.open_file(source).read_all()
+        else:
+            table = pa.ipc.open_stream(source).read_all()
+        stage.update(rows_out=table.num_rows)
+    return table
+
+def _table_to_bytes(table, frame_compression=False):
+    """
+    Serialize a table as Arrow IPC stream bytes.
+
+    With compression configured (see transport.set_compression()), the
+    buffers are compressed inside the IPC stream. With frame_compression, the
+    stream is instead written uncompressed and then compressed as a whole,
+    which is the format the widget front end reads.
+    """
+    with instrumentation.stage("encode", rows_in=table.num_rows) as stage:
+        options = pa.ipc.IpcWriteOptions() if frame_compression else transport.ipc_options(table)
+        sink = pa.BufferOutputStream()
+        writer = pa.ipc.new_stream(sink, table.schema, options=options)
+        writer.write_table(table)
+        writer.close()
+
+        # Get the bytes
+        data = sink.getvalue().to_pybytes()
+        if frame_compression:
+            data = transport.compress(data)
+        stage.update(bytes=len(data))
+    return data
+
+def _table_from_numpy(nparr, columns):
+    """
+    Build an Arrow Table from an (n, 3) coordinate array and extra 1D columns.
+
+    The coordinates are transposed into column-major float32 in a single pass
+    (no copy at all if the input already is Fortran-ordered float32), and each
+    contiguous column is then wrapped by Arrow without copying.
+    """
+    if nparr.ndim != 2 or nparr.shape[1] < 3:
+        raise ValueError(f"Expected an array of shape (n, 3), got {nparr.shape}.")
+
+    # rows of the transposed array are the contiguous x, y and z columns
+    xyz = np.asarray(nparr[:, :3].T, dtype=np.float32, order='C')
+    arrays = [pa.array(xyz[0]), pa.array(xyz[1]), pa.array(xyz[2])]
+    names = ['x', 'y', 'z']
+
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.shape != (nparr.shape[0],):
+            raise ValueError(f"Column '{name}' has shape {values.shape}, expected ({nparr.shape[0]},).")
+        arrays.append(pa.array(values))
+        names.append(name)
+
+    return pa.Table.from_arrays(arrays, names=names)
+
+def _path_key(path):
+    """Key of a structure file, derived from its location, size and modification time."""
+    stat = os.stat(path)
+    token = f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _structure_for(model):
+    """
+    Get the Structure for Arrow IPC bytes or a file path, decoding it on first use.
+
+    Structures are cached by a hash of the bytes (or of the file's location,
+    size and modification time), so repeated queries against the same model
+    reuse the decoded table and its indexes.
+    """
+    if isinstance(model, (str, os.PathLike)):
+        key = _path_key(model)
+    else:
+        key = _structure_key(model)
+    with _cache_lock:
+        structure = _STRUCTURE_CACHE.get(key)
+        if structure is not None:
+            _STRUCTURE_CACHE.move_to_end(key)
+            return structure
+
+    # decoded outside the lock, so that other threads can decode at the same time
+    structure = Structure(_read_table(model))
+    with _cache_lock:
+        _STRUCTURE_CACHE[key] = structure
+        if len(_STRUCTURE_CACHE) > _STRUCTURE_CACHE_SIZE:
+            _STRUCTURE_CACHE.popitem(last=False)
+    return structure
+
+def as_structure(data):
+    """
+    Wrap any supported structure input in a Structure.
+
+    Arrow IPC bytes and file paths go through the structure cache, Structures
+    are returned unchanged, and anything else is passed to the Structure
+    constructor.
+    """
+    if isinstance(data, Structure):
+        return data
+    if isinstance(data, (bytes, bytearray, memoryview, str, os.PathLike)):
+        return _structure_for(data)
+    return Structure(data)
+
+class Structure:
+    """
+    A 3D chromatin structure held in memory between operations.
+
+    Wraps an Arrow Table, or a lazy DuckDB relation that is only executed when
+    the table is needed. Operations return new Structures that share memory
+    with their input wherever possible: genomic selections are zero-copy
+    slices of the table, and filters on a relation are composed into a single
+    query. Nothing is serialized until to_bytes() is called, which Widget does
+    once when the structure is displayed.
+
+    The 'chr' column is stored as an Arrow dictionary column, so chromosome
+    renames and filters work on the chromosome names rather than on every bead.
+
+    Args:
+        data: The structure data. Can be:
+            - pa.Table with 'x', 'y', 'z' columns (plus optional 'chr', 'coord', ...)
+            - Apache Arrow IPC bytes (file or stream format)
+            - path to an Arrow IPC file (str or pathlib.Path), memory-mapped
+            - 2D numpy array: [[x, y, z], ...]
+            - pandas dataframe: columns need to be 'x', 'y', 'z'
+            - duckdb relation, executed lazily
+
+    Example:
+        >>> model = Structure(model_bytes)
+        >>> Widget(model.select("chr f").cut())
+        >>> Widget(model.clip(sphere=((0, 0, 0), 5.0), plane=((0, 0, 1), 0)))
+    """
+
+    def __init__(self, data):
+        self._table = None
+        self._relation = None
+        self._index = None
+        self._spatial_index = None
+        self._bounds = None
+
+        if isinstance(data, Structure):
+            self._table = data._table
+            self._relation = data._relation
+            self._index = data._index
+            self._spatial_index = data._spatial_index
+            self._bounds = data._bounds
+        elif isinstance(data, pa.Table):
+            self._table = chromosomes.encode(data)
+        elif isinstance(data, duckdb.DuckDBPyRelation):
+            self._relation = data
+        elif isinstance(data, (bytes, bytearray, memoryview, str, os.PathLike)):
+            self._table = chromosomes.encode(_read_table(data))
+        elif isinstance(data, np.ndarray):
+            self._table = _table_from_numpy(data, {})
+        elif isinstance(data, pd.DataFrame):
+            self._table = chromosomes.encode(pa.Table.from_pandas(data))
+        else:
+            raise TypeError(f"Cannot create a Structure from {type(data).__name__}.")
+
+    @property
+    def table(self):
+        """pa.Table: The structure data, executing the pending query first if needed."""
+        if self._table is None:
+            self._table = chromosomes.encode(db.to_arrow(self._relation))
+            self._relation = None
+        return self._table
+
+    @property
+    def index(self):
+        """StructureIndex: Genomic index of the structure, built on first use."""
+        if self._index is None:
+            self._index = StructureIndex(self.table)
+        return self._index
+
+    @property
+    def spatial_index(self):
+        """SpatialIndex: Voxel grid over the bead coordinates, built on first use."""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.table)
+        return self._spatial_index
+
+    @property
+    def bounds(self):
+        """dict: Bounding box, centroid and number of beads (see uchimata.spatial.bounds()), computed on first use."""
+        if self._bounds is None:
+            self._bounds = spatial.bounds(self.table)
+        return self._bounds
+
+    @property
+    def num_rows(self):
+        """int: Number of beads in the structure."""
+        return self.table.num_rows
+
+    def __len__(self):
+        return self.num_rows
+
+    def __repr__(self):
+        if self._table is None:
+            return "Structure(<pending query>)"
+        return f"Structure({self._table.num_rows} beads, columns={self._table.column_names})"
+
+    def select(self, query):
+        """
+        Select a genomic region.
+
+        Args:
+            query (str): Query string in one of two formats:
+                - Chromosome only: "chr1" (selects entire chromosome)
+                - Chromosome with range: "chr1:1000-2000" (selects coordinate range)
+
+        Returns:
+            Structure: The selected region, in (chromosome, coordinate) order.
+
+        Raises:
+            ValueError: If the query does not match the expected format, or
+                has a coordinate range but the table has no 'coord' column.
+        """
+        region = parse_region(query)
+        if region is None:
+            raise ValueError(f"Query '{query}' does not match the 'chrom:start-end' format.")
+        chrom, start, end = region
+
+        if self._table is None:
+            condition = duckdb.ColumnExpression('chr') == duckdb.ConstantExpression(chrom)
+            if start is not None:
+                coord = duckdb.ColumnExpression('coord')
+                condition = condition & (coord >= duckdb.ConstantExpression(start)) & (coord <= duckdb.ConstantExpression(end))
+            return Structure(self._relation.filter(condition))
+        with instrumentation.stage("query", rows_in=self._table.num_rows) as stage:
+            result = self.index.query(chrom, start, end)
+            stage.update(rows_out=result.num_rows)
+        return Structure(result)
+
+    def rename_chromosomes(self, mapping):
+        """
+        Rename chromosomes, rewriting only the dictionary of the 'chr' column.
+
+        Args:
+            mapping (dict or callable): New name for each chromosome name.
+                Names missing from a dict are kept.
+
+        Returns:
+            Structure: The structure with renamed chromosomes.
+        """
+        return Structure(chromosomes.rename(self.table, mapping))
+
+    def split_haplotypes(self, pattern=chromosomes.HAPLOTYPE_PATTERN):
+        """
+        Move haplotype suffixes of chromosome names into a 'haplotype' column.
+
+        "15(pat)" becomes chromosome "15" with haplotype "pat". Selections
+        still accept "15(pat)" for one haplotype, and "15" selects all of them.
+
+        Args:
+            pattern (str): Regular expression with two groups, the chromosome
+                and the haplotype.
+
+        Returns:
+            Structure: The structure with 'chr' and 'haplotype' columns.
+        """
+        return Structure(chromosomes.split_haplotypes(self.table, pattern))
+
+    def select_many(self, queries):
+        """
+        Select several genomic regions with one index.
+
+        Args:
+            queries (list): Query strings in the format accepted by select(),
+                or (chrom, start, end) tuples.
+
+        Returns:
+            list: A Structure for each query, in the same order.
+
+        Raises:
+            ValueError: If a query string does not match the expected format.
+        """
+        results = []
+        with instrumentation.stage("query", rows_in=self.num_rows) as stage:
+            for query in queries:
+                region = parse_region(query) if isinstance(query, str) else tuple(query)
+                if region is None:
+                    raise ValueError(f"Query '{query}' does not match the 'chrom:start-end' format.")
+                results.append(Structure(self.index.query(*region)))
+            stage.update(rows_out=sum(result.num_rows for result in results))
+        return results
+
+    def select_bioframe(self, df):
+        """
+        Select the genomic regions of a bioframe bedframe.
+
+        Args:
+            df (pd.DataFrame): A bioframe-compatible DataFrame with 'chrom',
+                'start', and 'end' columns.
+
+        Returns:
+            Structure: The beads inside any of the regions.
+
+        Raises:
+            ValueError: If df is not a valid bedframe (missing required columns).
+        """
+        if not bioframe.is_bedframe(df):
+            # This makes sure that there are 'chrom', 'start', 'end' columns in the dataframe
+            raise ValueError("DataFrame is not a valid bedframe.")
+
+        # resolve all intervals in one vectorized pass
+        chroms = pa.array(df['chrom'].astype(str).to_numpy())
+        starts = df['start'].to_numpy(dtype=np.int64)
+        ends = df['end'].to_numpy(dtype=np.int64)
+        with instrumentation.stage("query", rows_in=self.num_rows) as stage:
+            result = self.index.query_intervals(chroms, starts, ends)
+            stage.update(rows_out=result.num_rows)
+        return Structure(result)
+
+    def clip(self, plane=None, box=None, sphere=None, slab=None, invert=False):
+        """
+        Keep only the beads inside all of the given clip shapes.
+
+        Each shape argument takes a single shape tuple or a list of them; see
+        clip() for the shape definitions. The mask is computed in one
+        vectorized pass over the coordinate buffers.
+
+        Returns:
+            Structure: The clipped structure.
+        """
+        with instrumentation.stage("query", rows_in=self.num_rows) as stage:
+            mask = clip_mask(self.table, plane=plane, box=box, sphere=sphere, slab=slab, invert=invert)
+            result = self.table.filter(pa.array(mask))
+            stage.update(rows_out=result.num_rows)
+        return Structure(result)
+
+    def cut(self):
+        """
+        Keep only the points with positive x coordinates.
+
+        Returns:
+            Structure: The positive-x half of the structure.
+        """
+        if self._table is None:
+            return Structure(self._relation.filter(duckdb.ColumnExpression('x') > duckdb.ConstantExpression(0)))
+        return self.clip(plane=((1, 0, 0), 0))
+
+    def _resolve_point(self, point_or_locus):
+        """Turn a query point or a genomic locus (its beads' centroid) into coordinates."""
+        if not isinstance(point_or_locus, str):
+            return np.asarray(point_or_locus, dtype=np.float64)
+        locus = self.select(point_or_locus)
+        if locus.num_rows == 0:
+            raise ValueError(f"Locus '{point_or_locus}' does not contain any beads.")
+        return locus.spatial_index.points.mean(axis=0)
+
+    def neighbors(self, point_or_locus, radius):
+        """
+        Select the beads within a distance of a point or a genomic locus.
+
+        Args:
+            point_or_locus: Query point (x, y, z), or a locus string in the
+                format accepted by select(), which stands for the centroid of
+                its beads.
+            radius (float): Search radius, in the units of the coordinates.
+
+        Returns:
+            Structure: The beads within radius, in their original order.
+        """
+        point = self._resolve_point(point_or_locus)
+        rows = self.spatial_index.query_radius(point, radius)
+        return Structure(self.table.take(pa.array(rows)))
+
+    def nearest(self, point_or_locus, k):
+        """
+        Select the k beads nearest to a point or a genomic locus.
+
+        Args:
+            point_or_locus: Query point (x, y, z), or a locus string in the
+                format accepted by select(), which stands for the centroid of
+                its beads.
+            k (int): Number of neighbours.
+
+        Returns:
+            Structure: The k nearest beads, in their original order.
+        """
+        point = self._resolve_point(point_or_locus)
+        rows, _ = self.spatial_index.query_knn(point, k)
+        return Structure(self.table.take(pa.array(np.sort(rows))))
+
+    def coarsen(self, factor, sum=lod.COUNT_COLUMNS):
+        """
+        Merge every `factor` consecutive beads of a chromosome into one bead.
+
+        See uchimata.lod.coarsen() for how columns are aggregated.
+
+        Args:
+            factor (int): Number of beads merged into one.
+            sum (tuple): Names of the count columns to sum. Other integer
+                columns keep the first bead's value.
+
+        Returns:
+            Structure: The coarsened structure.
+        """
+        return Structure(lod.coarsen(self.table, factor, sum))
+
+    def pyramid(self, factors=(2, 4, 8), sum=lod.COUNT_COLUMNS):
+        """
+        Build a multi-resolution pyramid of the structure.
+
+        Returns:
+            dict: Structures keyed by coarsening factor, including this
+                structure under factor 1.
+        """
+        return {factor: Structure(table) for factor, table in lod.pyramid(self.table, factors, sum).items()}
+
+    def annotate(self, track, how="count", value="value", name=None, resolution=None):
+        """
+        Aggregate the intervals of a genomic track over the beads.
+
+        See uchimata.tracks.annotate() for how beads and intervals are matched.
+
+        Returns:
+            Structure: The structure with the aggregated column.
+        """
+        return Structure(tracks.annotate(self.table, track, how=how, value=value, name=name, resolution=resolution))
+
+    def to_bytes(self):
+        """
+        Serialize the structure for the widget.
+
+        Returns:
+            bytes: Apache Arrow IPC stream bytes.
+        """
+        return _table_to_bytes(self.table)
@@ -0,0 +1,223 @@
+"""
+Superposition of 3D structures.
+
+Models of the same genome are matched bead by bead on their genomic position
+('chr' and 'coord'), and then all of them are rotated and translated onto a
+reference in one batched Kabsch pass: the 3x3 covariance matrices of every
+model are built with a single batched matrix product, and numpy decomposes the
+whole stack of them with one SVD call.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import chromosomes, spatial
+from .ensemble import StructureEnsemble
+from .structure import Structure, as_structure
+
+def kabsch(coordinates, reference):
+    """
+    Optimally superpose a batch of models onto a reference.
+
+    Args:
+        coordinates (np.ndarray): (models, beads, 3) coordinates, with beads
+            in the same order as the reference.
+        reference (np.ndarray): (beads, 3) reference coordinates.
+
+    Returns:
+        tuple: (aligned, deviations), the (models, beads, 3) coordinates after
+            the rotation and translation that minimize the RMSD to the
+            reference, and the (models, beads) distances of every aligned bead
+            to its reference bead.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    # centroids as matrix products, which are faster than reductions over the short last axis
+    weights = np.full(len(reference), 1.0 / max(len(reference), 1))
+    model_centroids = (weights @ coordinates)[:, None]
+    reference_centroid = weights @ reference
+    moving = coordinates - model_centroids
+    target = reference - reference_centroid
+
+    # covariance of every model with the reference (batched matmul, which unlike
+    # einsum goes through BLAS), decomposed in one batched call
+    covariance = moving.transpose(0, 2, 1) @ target
+    u, _, vt = np.linalg.svd(covariance)
+    # flip the axis of the smallest singular value where the best fit would be a reflection
+    signs = np.sign(np.linalg.det(np.einsum('mij,mjk->mik', u, vt)))
+    signs[signs == 0] = 1.0
+    u[:, :, 2] *= signs[:, None]
+    rotations = np.einsum('mij,mjk->mik', u, vt)
+
+    aligned = moving @ rotations
+    aligned += reference_centroid
+    difference = aligned - reference
+    deviations = np.sqrt(difference[..., 0] ** 2 + difference[..., 1] ** 2 + difference[..., 2] ** 2)
+    return aligned, deviations
+
+def _bead_keys(table, names):
+    """One integer per bead identifying its (chromosome label, coord), with chromosome codes into names."""
+    labels = chromosomes.labels(table)
+    codes = pc.fill_null(pc.index_in(labels.dictionary, value_set=names), -1).to_numpy()
+    bead_codes = codes[pc.fill_null(labels.indices, 0).to_numpy()]
+    bead_codes[np.asarray(labels.is_null())] = -1
+    coords = np.asarray(table.column('coord').to_numpy(), dtype=np.int64)
+    return bead_codes, coords
+
+def match_beads(reference, table):
+    """
+    Find the beads of a structure at the same genomic positions as a reference.
+
+    Beads are matched on their chromosome (and haplotype) and 'coord'.
+    Tables without these columns are matched by position and must have the
+    same number of beads.
+
+    Args:
+        reference (pa.Table): Reference structure table.
+        table (pa.Table): Structure table to match.
+
+    Returns:
+        tuple: (reference_rows, rows), np.ndarrays so that bead rows[i] of
+            table is at the position of bead reference_rows[i], in the order
+            of the reference rows.
+
+    Raises:
+        ValueError: If the tables cannot be matched by position.
+    """
+    genomic = all(name in t.column_names for t in (reference, table) for name in ('chr', 'coord'))
+    if not genomic:
+        if reference.num_rows != table.num_rows:
+            raise ValueError(f"Cannot match {table.num_rows} beads to {reference.num_rows} reference beads "
+                             "without 'chr' and 'coord' columns.")
+        rows = np.arange(table.num_rows)
+        return rows, rows
+
+    names = chromosomes.labels(reference).dictionary
+    reference_codes, reference_coords = _bead_keys(reference, names)
+    codes, coords = _bead_keys(table, names)
+    span = int(max(reference_coords.max(initial=0), coords.max(initial=0))) + 1
+    reference_keys = np.where(reference_codes >= 0, reference_codes * span + reference_coords, -1)
+    keys = np.where(codes >= 0, codes * span + coords, -2)
+
+    _, reference_rows, rows = np.intersect1d(reference_keys, keys, assume_unique=False, return_indices=True)
+    order = np.argsort(reference_rows, kind='stable')
+    return reference_rows[order], rows[order]
+
+class Alignment(NamedTuple):
+    """
+    Result of align().
+
+    Attributes:
+        structures (list): The aligned models, one Structure per model,
+            restricted to the beads matched in all models and in reference
+            order. A 'deviation' column holds the distance of each bead to
+            its reference bead.
+        rmsd (np.ndarray): Root-mean-square deviation of each model from the
+            reference.
+        reference (Structure): The matched beads of the reference, with an
+            'rmsd' column: the root-mean-square deviation of each bead over
+            all models, e.g. to color the most variable regions.
+    """
+    structures: list
+    rmsd: np.ndarray
+    reference: Structure
+
+def _with_columns(table, xyz, **columns):
+    """Replace the coordinates of a structure table and add columns."""
+    for axis, name in enumerate(('x', 'y', 'z')):
+        column_type = table.schema.field(name).type
+        column = pa.array(xyz[:, axis])
+        if pa.types.is_floating(column_type):
+            column = column.cast(column_type)
+        table = table.set_column(table.schema.get_field_index(name), name, column)
+    for name, values in columns.items():
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, pa.array(values))
+        else:
+            table = table.append_column(name, pa.array(values))
+    return table
+
+def _groups(structures):
+    """(table, coordinates) pairs of models sharing their beads, keeping ensembles together."""
+    groups = []
+    for structure in structures:
+        if isinstance(structure, StructureEnsemble):
+            groups.append((structure.shared, structure.coordinates))
+        else:
+            table = as_structure(structure).table
+            groups.append((table, spatial._points(table)[None]))
+    return groups
+
+def align(reference, *structures):
+    """
+    Superpose 3D structures onto a reference structure.
+
+    Beads are matched on their genomic position ('chr', with the haplotype
+    if any, and 'coord'), or by position for structures without these
+    columns. Only the beads present in every structure are kept. All models
+    are then superposed in one batched Kabsch pass, which minimizes the RMSD
+    of each model to the reference by rotating and translating it.
+
+    Args:
+        reference: Reference structure input (bytes, path or Structure), or
+            a StructureEnsemble whose first model is the reference.
+        *structures: Structure inputs and StructureEnsembles to align. The
+            models of an ensemble are matched to the reference once.
+
+    Returns:
+        Alignment: (structures, rmsd, reference), the aligned models with a
+            per-bead 'deviation' column, the RMSD of each model and the
+            matched reference beads with a per-bead 'rmsd' column.
+
+    Raises:
+        ValueError: If a structure without genomic columns does not have as
+            many beads as the reference.
+
+    Example:
+        >>> ensemble = StructureEnsemble(sorted(pathlib.Path("out").glob("*.arrow")))
+        >>> result = align(ensemble, ensemble)
+        >>> result.rmsd
+        array([0.  , 1.42, 1.37, ...])
+        >>> Widget(result.reference, viewconfig={"color": {"field": "rmsd", "colorScale": "Viridis"}})
+    """
+    if isinstance(reference, StructureEnsemble):
+        reference = reference[0]
+    reference = as_structure(reference).table
+    groups = _groups(structures)
+
+    matches = [match_beads(reference, table) for table, _ in groups]
+    # beads present in every structure
+    common = np.arange(reference.num_rows)
+    for reference_rows, _ in matches:
+        common = np.intersect1d(common, reference_rows)
+
+    reference_table = reference.take(pa.array(common))
+    tables = []
+    batches = [np.empty((0, len(common), 3))]
+    for (table, coordinates), (reference_rows, rows) in zip(groups, matches):
+        selected = rows[np.searchsorted(reference_rows, common)]
+        if 'x' in table.column_names:
+            matched = table.take(pa.array(selected))
+        else:
+            # shared columns of an ensemble, without coordinates
+            placeholder = pa.array(np.zeros(len(selected), dtype=np.float32))
+            matched = pa.table({'x': placeholder, 'y': placeholder, 'z': placeholder})
+            for name in table.column_names:
+                matched = matched.append_column(name, table.column(name).take(pa.array(selected)))
+        tables.extend([matched] * len(coordinates))
+        batches.append(np.asarray(coordinates)[:, selected])
+
+    aligned, deviations = kabsch(np.concatenate(batches), spatial._points(reference_table))
+    squared = deviations ** 2
+    rmsd = np.sqrt(squared.mean(axis=1)) if len(common) else np.zeros(len(aligned))
+    bead_rmsd = np.sqrt(squared.mean(axis=0)) if len(aligned) else np.zeros(len(common))
+
+    return Alignment(
+        structures=[Structure(_with_columns(table, xyz, deviation=d))
+                    for table, xyz, d in zip(tables, aligned, deviations)],
+        rmsd=rmsd,
+        reference=Structure(_with_columns(reference_table, spatial._points(reference_table), rmsd=bead_rmsd)),
+    )
@@ -0,0 +1,377 @@
+"""
+Compact wire formats for sending structures to the browser.
+
+Coordinates can be shipped as float32, as float16 relative to the center of
+the bounding box, or as int16 quantized over the bounding box. The scale and
+offset needed to restore them are stored in the schema metadata, and the
+widget front end dequantizes them before handing the table to uchimata.
+
+Before a structure is sent, it is projected to the columns its viewconfig
+refers to (see project()), with string columns other than 'chr'
+dictionary-encoded. Value
+arrays given as numpy or Arrow arrays in a viewconfig travel as hidden columns
+of the structure instead of JSON lists (see detach_values()).
+
+The bounding box, centroid and display frame (centering and normalization)
+of each structure are computed in Python and stored in the schema metadata
+too (see with_frame()).
+
+Serialized Arrow IPC payloads can additionally be compressed with ZSTD or
+LZ4 (see set_compression()). Structures sent by the Widget are wrapped
+whole in a standard ZSTD or LZ4 frame, which the front end and the readers
+in this package recognize by its magic number. Bytes returned by the public
+API use Arrow's own IPC body compression instead (see ipc_options()), so
+they stay valid Arrow IPC streams.
+"""
+
+import json
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import chromosomes
+
+ENCODINGS = ("float32", "float16", "int16")
+CODECS = ("zstd", "lz4")
+
+# frame magic numbers, as they appear at the start of the payload
+_MAGIC = {b"\x28\xb5\x2f\xfd": "zstd", b"\x04\x22\x4d\x18": "lz4"}
+
+# Compression applied to serialized structures, see set_compression()
+_compression = {"codec": None, "min_bytes": 1 << 16}
+
+_AXES = ('x', 'y', 'z')
+# viewconfig 'values' sent as binary columns instead of JSON lists
+_VALUE_TYPES = (np.ndarray, pa.Array, pa.ChunkedArray)
+_VALUES_PREFIX = "__values:"
+
+# columns the front end needs regardless of the viewconfig
+_STRUCTURAL_COLUMNS = ('x', 'y', 'z', 'chr')
+# quantization steps across the bounding box, symmetric around zero
+_INT16_LEVELS = 65534
+
+def encode_coordinates(table, encoding):
+    """
+    Encode the 'x', 'y' and 'z' columns of a structure table for transport.
+
+    - float32: coordinates cast to 32-bit floats (12 bytes per bead).
+    - float16: coordinates relative to the bounding box center, as 16-bit
+      floats (6 bytes per bead, about 3 significant digits).
+    - int16: coordinates quantized to 65535 levels over the bounding box of
+      each axis (6 bytes per bead, error at most half a level).
+
+    Args:
+        table (pa.Table): Structure table with 'x', 'y' and 'z' columns.
+        encoding (str): One of "float32", "float16" or "int16".
+
+    Returns:
+        pa.Table: The table with encoded coordinate columns. For float16 and
+            int16 the schema metadata holds 'uchimata:encoding',
+            'uchimata:scale' and 'uchimata:offset'.
+
+    Raises:
+        ValueError: If the encoding is not supported.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}.")
+
+    values = [np.asarray(table.column(axis).to_numpy(), dtype=np.float64) for axis in _AXES]
+    if encoding == "float32":
+        encoded = [pa.array(v.astype(np.float32)) for v in values]
+        scale = offset = None
+    else:
+        low = np.array([v.min() if len(v) else 0.0 for v in values])
+        high = np.array([v.max() if len(v) else 0.0 for v in values])
+        if encoding == "float16":
+            offset = (low + high) / 2
+            scale = np.ones(3)
+            encoded = [pa.array((v - o).astype(np.float16)) for v, o in zip(values, offset)]
+        else:
+            # map [low, high] onto the full int16 range
+            offset = (low + high) / 2
+            scale = np.where(high > low, (high - low) / _INT16_LEVELS, 1.0)
+            encoded = [pa.array(np.round((v - o) / s).astype(np.int16)) for v, o, s in zip(values, offset, scale)]
+
+    for axis, column in zip(_AXES, encoded):
+        table = table.set_column(table.schema.get_field_index(axis), axis, column)
+
+    if scale is not None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"uchimata:encoding"] = encoding.encode()
+        metadata[b"uchimata:scale"] = json.dumps(scale.tolist()).encode()
+        metadata[b"uchimata:offset"] = json.dumps(offset.tolist()).encode()
+        table = table.replace_schema_metadata(metadata)
+    return table
+
+def decode_coordinates(table):
+    """
+    Restore float32 coordinates of a table encoded with encode_coordinates().
+
+    Tables without encoding metadata are returned unchanged.
+
+    Args:
+        table (pa.Table): Structure table.
+
+    Returns:
+        pa.Table: The table with float32 'x', 'y' and 'z' columns.
+    """
+    metadata = table.schema.metadata or {}
+    if b"uchimata:encoding" not in metadata:
+        return table
+
+    scale = json.loads(metadata[b"uchimata:scale"])
+    offset = json.loads(metadata[b"uchimata:offset"])
+    for axis, s, o in zip(_AXES, scale, offset):
+        values = np.asarray(table.column(axis).to_numpy(), dtype=np.float64) * s + o
+        table = table.set_column(table.schema.get_field_index(axis), axis, pa.array(values.astype(np.float32)))
+
+    encoding_keys = (b"uchimata:encoding", b"uchimata:scale", b"uchimata:offset")
+    metadata = {k: v for k, v in metadata.items() if k not in encoding_keys}
+    return table.replace_schema_metadata(metadata or None)
+
+def with_frame(table, stats, frame):
+    """
+    Store the bounding statistics and display frame of a structure in its schema metadata.
+
+    The front end moves the coordinates into the frame instead of centering
+    and normalizing every structure itself, so several structures (or
+    widgets) can be shown in one consistent frame.
+
+    Args:
+        table (pa.Table): Structure table.
+        stats (dict): Bounding statistics of the coordinates in the table,
+            see uchimata.spatial.bounds().
+        frame (dict): Display frame, see uchimata.spatial.frame(). An
+            identity frame (offset 0, scale 1) marks coordinates that are
+            already in their display frame.
+
+    Returns:
+        pa.Table: The table with 'uchimata:bounds' and 'uchimata:frame'
+            schema metadata.
+    """
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"uchimata:bounds"] = json.dumps(stats).encode()
+    metadata[b"uchimata:frame"] = json.dumps(frame).encode()
+    return table.replace_schema_metadata(metadata)
+
+def viewconfig_fields(viewconfig):
+    """
+    Find the columns a viewconfig refers to through its 'field' keys.
+
+    Args:
+        viewconfig (dict): Viewconfig, e.g. {"color": {"field": "count"}}.
+
+    Returns:
+        set: Names of the referenced columns.
+    """
+    fields = set()
+    stack = [viewconfig or {}]
+    while stack:
+        item = stack.pop()
+        field = item.get("field")
+        if isinstance(field, str):
+            fields.add(field)
+        stack.extend(value for value in item.values() if isinstance(value, dict))
+    return fields
+
+def detach_values(viewconfig, lists=False):
+    """
+    Move numpy and Arrow value arrays out of a viewconfig.
+
+    Every 'values' entry holding a numpy array, pa.Array or pa.ChunkedArray is
+    replaced with a 'field' entry naming a hidden column, e.g.
+    {"color": {"values": arr}} becomes {"color": {"field": "__values:color"}}.
+    Other entries, including 'values' given as lists, are kept as they are.
+
+    Args:
+        viewconfig (dict): Viewconfig.
+        lists (bool): Detach 'values' given as lists (or tuples or ranges) as
+            well, e.g. for structures sent coarsened, whose values have to be
+            coarsened with the beads.
+
+    Returns:
+        tuple: (viewconfig, columns), the JSON-serializable viewconfig and a
+            dict mapping the hidden column names to the arrays.
+    """
+    columns = {}
+
+    def detach(item, path):
+        result = {}
+        for key, value in item.items():
+            if isinstance(value, dict):
+                result[key] = detach(value, path + (key,))
+            elif key == "values" and isinstance(value, _VALUE_TYPES):
+                columns[_VALUES_PREFIX + ".".join(path)] = value
+            elif key == "values" and lists and isinstance(value, (list, tuple, range)):
+                columns[_VALUES_PREFIX + ".".join(path)] = np.asarray(value)
+            else:
+                result[key] = value
+        if _VALUES_PREFIX + ".".join(path) in columns:
+            result["field"] = _VALUES_PREFIX + ".".join(path)
+        return result
+
+    return detach(viewconfig or {}, ()), columns
+
+def attach_values(table, columns):
+    """
+    Add the value arrays detached from a viewconfig as columns of a structure.
+
+    Numeric numpy arrays are wrapped without copying. Columns that already
+    exist (from an earlier viewconfig) are replaced.
+
+    Args:
+        table (pa.Table): Structure table.
+        columns (dict): Hidden column names and arrays, see detach_values().
+
+    Returns:
+        pa.Table: The table with the value columns.
+
+    Raises:
+        ValueError: If an array does not have one value per bead.
+    """
+    for name, values in columns.items():
+        column = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values)
+        if len(column) != table.num_rows:
+            raise ValueError(f"Viewconfig values for '{name[len(_VALUES_PREFIX):]}' have length {len(column)}, "
+                             f"expected one value per bead ({table.num_rows}).")
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, column)
+        else:
+            table = table.append_column(name, column)
+    return table
+
+def project(table, fields):
+    """
+    Reduce a structure table to the columns needed to display it.
+
+    Keeps the coordinates, 'chr' (which delimits the chromosomes) and the given
+    fields, dictionary-encodes string columns other than 'chr' and drops
+    schema metadata that is not used by the front end (e.g. the pandas index
+    description). For tables with a 'haplotype' column (see
+    split_haplotypes()), 'chr' holds the combined labels like "15(pat)", so
+    that every haplotype is drawn as a polymer of its own. 'chr' stays
+    dictionary-encoded, see plain_chr() for sending it as plain strings.
+
+    Args:
+        table (pa.Table): Structure table.
+        fields (set): Names of the columns referenced by the viewconfig, see
+            viewconfig_fields(). Names that are not in the table are ignored.
+
+    Returns:
+        pa.Table: The projected table.
+    """
+    if 'haplotype' in table.column_names and 'chr' in table.column_names:
+        table = table.set_column(table.column_names.index('chr'), 'chr', chromosomes.labels(table))
+    table = table.select([name for name in table.column_names if name in _STRUCTURAL_COLUMNS or name in fields])
+    for i, (name, column) in enumerate(zip(table.column_names, table.columns)):
+        if name != 'chr' and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+            table = table.set_column(i, name, pc.dictionary_encode(column.combine_chunks()))
+
+    metadata = {k: v for k, v in (table.schema.metadata or {}).items() if k.startswith(b"uchimata:")}
+    return table.replace_schema_metadata(metadata or None)
+
+def plain_chr(table):
+    """
+    Turn a dictionary-encoded 'chr' column back into plain strings.
+
+    Structure tables keep 'chr' dictionary-encoded (see
+    uchimata.chromosomes), but the front end only loads a table as it is if
+    none of its columns are dictionary-encoded.
+
+    Args:
+        table (pa.Table): Structure table.
+
+    Returns:
+        pa.Table: The table with a plain string 'chr' column, if it has one.
+    """
+    if 'chr' not in table.column_names:
+        return table
+    column = table.column('chr')
+    if not pa.types.is_dictionary(column.type):
+        return table
+    return table.set_column(table.column_names.index('chr'), 'chr', column.cast(column.type.value_type))
+
+def set_compression(codec, min_bytes=1 << 16):
+    """
+    Configure compression of all serialized structures.
+
+    Structures sent by Widget are compressed as a whole (see compress()).
+    The bytes returned by the from_* converters and the query functions are
+    compressed inside the Arrow IPC stream (see ipc_options()), so that they
+    can still be read with pa.ipc.open_stream(). Payloads smaller than
+    min_bytes are left uncompressed.
+
+    Args:
+        codec (str): "zstd", "lz4", or None to disable compression.
+        min_bytes (int): Smallest uncompressed payload worth compressing.
+
+    Raises:
+        ValueError: If the codec is not supported.
+
+    Example:
+        >>> uchimata.set_compression("zstd")
+    """
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {CODECS} or None.")
+    _compression["codec"] = codec
+    _compression["min_bytes"] = min_bytes
+
+def compression_codec(data):
+    """Name of the codec an Arrow payload was compressed with, or None."""
+    return _MAGIC.get(bytes(data[:4]))
+
+def ipc_options(table):
+    """
+    IPC write options of the bytes returned by the public API.
+
+    Args:
+        table (pa.Table): The table to serialize.
+
+    Returns:
+        pa.ipc.IpcWriteOptions: Options compressing the buffers of the IPC
+            stream with the configured codec, or default options if
+            compression is off or the table is smaller than min_bytes.
+    """
+    codec = _compression["codec"]
+    if codec is None or table.nbytes < _compression["min_bytes"]:
+        return pa.ipc.IpcWriteOptions()
+    return pa.ipc.IpcWriteOptions(compression=codec)
+
+def compress(data):
+    """
+    Compress Arrow IPC bytes for the widget according to the configured compression.
+
+    Args:
+        data (bytes): Arrow IPC bytes.
+
+    Returns:
+        bytes: A ZSTD or LZ4 frame, or data unchanged if compression is off,
+            the payload is small, already compressed or does not shrink.
+    """
+    codec = _compression["codec"]
+    if codec is None or len(data) < _compression["min_bytes"] or compression_codec(data) is not None:
+        return data
+    compressed = pa.compress(data, codec=codec, asbytes=True)
+    return compressed if len(compressed) < len(data) else data
+
+def decompress(data):
+    """
+    Undo compress().
+
+    Args:
+        data (bytes or pa.NativeFile): Possibly compressed Arrow IPC payload.
+
+    Returns:
+        The decompressed payload as a pa.Buffer, or data unchanged if it is
+            not compressed.
+    """
+    if isinstance(data, pa.NativeFile):
+        codec = compression_codec(data.read(4))
+        data.seek(0)
+    else:
+        codec = compression_codec(data)
+    if codec is None:
+        return data
+    source = data if isinstance(data, pa.NativeFile) else pa.BufferReader(data)
+    return pa.CompressedInputStream(source, codec).read_buffer()
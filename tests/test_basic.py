@@ -131,3 +131,16 @@ def test_options_default():
 
     assert isinstance(w, uchi.Widget)
     assert w.options == {}
+
+def test_from_numpy_columns():
+    """from_numpy converts straight to Arrow and accepts extra columns"""
+    structure = np.array([[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]])
+    arrow_bytes = uchi.from_numpy(structure, chr=np.array(["chr1", "chr2"]), coord=np.array([0, 100]))
+    table = pa.ipc.open_stream(arrow_bytes).read_all()
+
+    assert table.column_names == ["x", "y", "z", "chr", "coord"]
+    assert table.schema.field("x").type == pa.float32()
+    assert table.schema.metadata is None
+    assert table["y"].to_pylist() == [1.0, 4.0]
+    assert table["chr"].to_pylist() == ["chr1", "chr2"]
+    assert table["coord"].to_pylist() == [0, 100]
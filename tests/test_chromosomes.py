@@ -0,0 +1,64 @@
+import pathlib
+
+import uchimata as uchi
+from uchimata.readers import read_3dg
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).parent.parent
+TAN_3DG = ROOT / "data" / "tan-2018" / "GSE117876_RAW" / "selected" / "GSM3271347_gm12878_01.impute.3dg.txt"
+TAN_MODEL = ROOT / "data" / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow"
+
+def test_chr_is_dictionary():
+    table = uchi.Structure(TAN_MODEL).table
+    assert pa.types.is_dictionary(table.schema.field("chr").type)
+    assert table["chr"].num_chunks == 1
+    assert table["chr"].chunk(0).dictionary.to_pylist()[0] == "15(pat)"
+
+def test_rename_rewrites_dictionary():
+    """Renaming keeps the per-bead codes and only replaces the names"""
+    model = uchi.Structure(TAN_MODEL)
+    renamed = model.rename_chromosomes(lambda name: "chr" + name)
+    before = model.table["chr"].chunk(0)
+    after = renamed.table["chr"].chunk(0)
+    assert after.indices.buffers()[1].address == before.indices.buffers()[1].address
+    assert after.dictionary.to_pylist()[0] == "chr15(pat)"
+    assert renamed.select("chr15(pat)").num_rows == model.select("15(pat)").num_rows
+
+def test_rename_merges_chromosomes():
+    points = np.zeros((4, 3))
+    model = uchi.Structure(pa.table({"x": points[:, 0], "y": points[:, 1], "z": points[:, 2],
+                                     "chr": ["a", "b", "c", "a"], "coord": [0, 0, 0, 10]}))
+    merged = model.rename_chromosomes({"b": "a"})
+    assert merged.table["chr"].to_pylist() == ["a", "a", "c", "a"]
+    assert merged.table["chr"].chunk(0).dictionary.to_pylist() == ["a", "c"]
+
+def test_split_haplotypes():
+    """Haplotypes move to their own column and stay selectable"""
+    model = uchi.Structure(TAN_MODEL)
+    split = model.split_haplotypes()
+    assert split.table.column_names == ["x", "y", "z", "chr", "haplotype", "coord"]
+    assert set(split.table["haplotype"].to_pylist()) == {"pat", "mat"}
+    assert "15" in split.table["chr"].chunk(0).dictionary.to_pylist()
+
+    pat = split.select("15(pat):30000000-40000000")
+    expected = model.select("15(pat):30000000-40000000")
+    assert pat.table["x"].equals(expected.table["x"])
+    assert set(pat.table["haplotype"].to_pylist()) == {"pat"}
+    assert split.select("15").num_rows == model.select("15(pat)").num_rows + model.select("15(mat)").num_rows
+
+    regions = pd.DataFrame({"chrom": ["15"], "start": [30000000], "end": [40000000]})
+    both = split.select_bioframe(regions)
+    assert both.num_rows == expected.num_rows + model.select("15(mat):30000000-40000000").num_rows
+
+    assert read_3dg(TAN_3DG, split_haplotypes=True).table.equals(split.table)
+
+def test_widget_sends_haplotype_labels():
+    """Split haplotypes reach the front end as separate chromosomes"""
+    split = uchi.Structure(TAN_MODEL).split_haplotypes()
+    w = uchi.Widget(split.select("15"))
+    sent = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert sent.column_names == ["x", "y", "z", "chr"]
+    assert sent["chr"].unique().to_pylist() == ["15(pat)", "15(mat)"]
+    assert sent.num_rows == split.select("15").num_rows
@@ -0,0 +1,30 @@
+import uchimata as uchi
+import numpy as np
+
+def brute_force(a, b):
+    return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2)
+
+def make_model():
+    points = np.random.default_rng(0).random((70, 3)) * 100 + 1000
+    chroms = ["chr1"] * 40 + ["chr2"] * 30
+    coords = np.concatenate([np.arange(40), np.arange(30)]) * 1000
+    return points, uchi.from_numpy(points, chr=chroms, coord=coords)
+
+def test_tiles_match_brute_force():
+    """Tiles of any size (and in parallel) give the full matrix"""
+    points, model = make_model()
+    expected = brute_force(points, points).astype(np.float32)
+    for block_size, workers in [(16, None), (7, 3), (1000, None)]:
+        matrix = uchi.distance_matrix(model, block_size=block_size, workers=workers)
+        assert matrix.dtype == np.float32
+        assert np.allclose(matrix, expected, atol=1e-3)
+        assert np.array_equal(matrix, matrix.T)
+        assert np.all(np.diag(matrix) == 0)
+
+def test_regions_and_memmap(tmp_path):
+    points, model = make_model()
+    path = tmp_path / "distances.npy"
+    matrix = uchi.distance_matrix(model, "chr1:5000-14000", "chr2", dtype=np.float64, out=path, block_size=4)
+    assert isinstance(matrix, np.memmap)
+    assert matrix.shape == (10, 30)
+    assert np.allclose(np.load(path), brute_force(points[5:15], points[40:]))
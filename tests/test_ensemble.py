@@ -0,0 +1,73 @@
+import pathlib
+
+import uchimata as uchi
+import numpy as np
+import pyarrow as pa
+import pytest
+
+STEVENS_MODELS = sorted((pathlib.Path(__file__).parent.parent / "data" / "stevens-2017" / "out").glob("*Cell_1_model_*.arrow"))
+
+def test_ensemble_from_models():
+    """Models keep their coordinates, the genomic columns are stored once"""
+    ensemble = uchi.StructureEnsemble(STEVENS_MODELS[:3])
+    assert ensemble.coordinates.shape == (3, ensemble.num_beads, 3)
+    assert ensemble.coordinates.dtype == np.float32
+    assert ensemble.shared.column_names == ["chr", "coord"]
+
+    model = uchi.Structure(STEVENS_MODELS[2]).table
+    assert np.allclose(ensemble[2].table["y"].to_numpy(), model["y"].to_numpy(), atol=1e-4)
+    assert ensemble[2].table["coord"].equals(model["coord"])
+
+def test_ensemble_select():
+    """One index lookup selects the same beads in every model"""
+    ensemble = uchi.StructureEnsemble(STEVENS_MODELS[:3])
+    selected = ensemble.select("chr f:10000000-20000000")
+    for i in range(3):
+        expected = uchi.Structure(STEVENS_MODELS[i]).select("chr f:10000000-20000000").table
+        assert selected[i].num_rows == expected.num_rows
+        assert np.allclose(selected[i].table["x"].to_numpy(), expected["x"].to_numpy(), atol=1e-4)
+
+    with pytest.raises(ValueError):
+        ensemble.select("chr f:1000")
+
+def test_ensemble_from_array():
+    coordinates = np.random.rand(4, 6, 3)
+    ensemble = uchi.StructureEnsemble(coordinates, {"chr": ["a"] * 3 + ["b"] * 3, "coord": np.arange(6)})
+    assert len(ensemble) == 4
+    assert ensemble.select("b")[3].num_rows == 3
+
+    with pytest.raises(ValueError):
+        uchi.StructureEnsemble(coordinates, {"chr": ["a"] * 5})
+    with pytest.raises(ValueError):
+        uchi.StructureEnsemble([uchi.from_numpy(np.zeros((2, 3))), uchi.from_numpy(np.zeros((3, 3)))])
+
+def test_widget_shares_columns():
+    """The widget sends the shared columns once and coordinates per model"""
+    ensemble = uchi.StructureEnsemble(STEVENS_MODELS[:3])
+    w = uchi.Widget(ensemble, viewconfig={"color": {"field": "coord"}})
+    assert len(w.structures) == 3
+    assert len(w.shared) == 1
+
+    key, payload = next(iter(w.shared.items()))
+    assert pa.ipc.open_stream(payload).read_all().column_names == ["chr", "coord"]
+    for structure in w.structures:
+        table = pa.ipc.open_stream(structure).read_all()
+        assert table.column_names == ["x", "y", "z"]
+        assert table.schema.metadata[b"uchimata:shared"] == key.encode()
+
+    # an added ensemble sends its shared columns along with its models
+    w.add_structure(ensemble.select("chr a"), {"color": {"field": "coord"}})
+    assert len(w.structures) == 3 + 3
+    assert len(w.shared) == 2
+
+def test_ensemble_select_haplotypes():
+    """A chromosome without a haplotype selects all of its haplotypes, as for a Structure"""
+    tan_model = pathlib.Path(__file__).parent.parent / "data" / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow"
+    split = uchi.Structure(tan_model).split_haplotypes()
+    ensemble = uchi.StructureEnsemble([split, split])
+
+    expected = split.select("15:30000000-40000000").table
+    selected = ensemble.select("15:30000000-40000000")
+    assert selected.num_beads == expected.num_rows > 0
+    assert np.allclose(selected[1].table["x"].to_numpy(), expected["x"].to_numpy())
+    assert selected[1].table["haplotype"].equals(expected["haplotype"])
@@ -0,0 +1,112 @@
+import uchimata as uchi
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+def genome(n=1000, seed=0):
+    points = np.random.default_rng(seed).standard_normal((n, 3))
+    chroms = np.repeat(["chr1", "chr2"], n // 2)
+    coords = np.tile(np.arange(n // 2) * 100_000, 2)
+    return points, chroms, coords
+
+def stages(stats, call):
+    return {record.stage: record for record in stats.records if record.call == call}
+
+def test_nothing_recorded_when_inactive():
+    points, chroms, coords = genome()
+    stats = uchi.stats()
+    uchi.select(uchi.from_numpy(points, chr=chroms, coord=coords), "chr1")
+    assert stats.records == []
+
+    with stats:
+        pass
+    uchi.cut(uchi.from_numpy(points))
+    assert stats.records == []
+    assert stats.to_table().num_rows == 0
+
+def test_select_stages():
+    # a model of its own, so that it is decoded rather than found in the structure cache
+    points, chroms, coords = genome(seed=1)
+    model = uchi.from_numpy(points, chr=chroms, coord=coords)
+    with uchi.stats() as stats:
+        result = uchi.select(model, "chr1")
+
+    recorded = stages(stats, "select")
+    assert list(recorded) == ["decode", "query", "encode", "total"]
+    assert recorded["decode"].bytes == len(model)
+    assert recorded["decode"].rows_out == 1000
+    assert (recorded["query"].rows_in, recorded["query"].rows_out) == (1000, 500)
+    assert recorded["encode"].rows_in == 500
+    assert recorded["encode"].bytes == recorded["total"].bytes == len(result)
+    assert len({record.call_id for record in stats.records}) == 1
+    assert recorded["total"].seconds >= recorded["query"].seconds
+
+def test_duckdb_stage():
+    points, chroms, coords = genome()
+    table = pa.Table.from_pydict({"x": points[:, 0], "y": points[:, 1], "z": points[:, 2],
+                                  "chr": chroms, "coord": coords})
+    relation = duckdb.arrow(table)
+    with uchi.stats() as stats:
+        uchi.cut(uchi.select(uchi.Structure(relation), "chr2")).table
+
+    duckdb_records = [record for record in stats.records if record.stage == "duckdb"]
+    assert len(duckdb_records) == 1
+    assert duckdb_records[0].rows_out == (points[500:, 0] > 0).sum()
+
+def test_nested_calls_belong_to_the_outer_call():
+    points, _, _ = genome()
+    with uchi.stats() as stats:
+        uchi.Widget(points)
+
+    assert {record.call for record in stats.records} == {"Widget"}
+    recorded = stages(stats, "Widget")
+    assert {"convert", "encode", "transport", "sync", "total"} <= set(recorded)
+    assert recorded["convert"].rows_out == 1000
+
+def test_front_end_timings():
+    points, _, _ = genome()
+    with uchi.stats() as stats:
+        w = uchi.Widget(points, lod=10, progressive=True)
+    records = len(stats.records)
+
+    # reported by the front end after the widget was displayed
+    w._handle_message(w, {"type": "rendered", "timings": [
+        {"stage": "decode", "seconds": 0.002, "rows": 100, "bytes": 4096},
+        {"stage": "load", "seconds": 0.001, "rows": 100},
+        {"stage": "display", "seconds": 0.01},
+        {"stage": "first_frame", "seconds": 0.05},
+    ]}, [])
+
+    front_end = stats.records[records:]
+    assert [record.stage for record in front_end] == ["js.decode", "js.load", "js.display", "js.first_frame"]
+    assert {record.call_id for record in stats.records} == {front_end[0].call_id}
+    assert (front_end[0].rows_out, front_end[0].bytes) == (100, 4096)
+    # progressive refinement still follows the message
+    assert w._full_structures is None
+
+def test_summary_and_report():
+    points, chroms, coords = genome()
+    model = uchi.from_numpy(points, chr=chroms, coord=coords)
+    with uchi.stats() as stats:
+        uchi.select(model, "chr1")
+        uchi.select(model, "chr2")
+
+    summary = stats.summary()
+    total = summary.filter(pa.compute.equal(summary["stage"], "total")).to_pylist()
+    assert total[0]["call"] == "select"
+    assert total[0]["runs"] == 2
+    assert total[0]["seconds"] > 0
+
+    report = stats.report()
+    assert "select" in report and "query" in report
+    assert len(report.splitlines()) == 2 + summary.num_rows
+
+def test_widget_serializes_once():
+    points, chroms, coords = genome(seed=2)
+    model = uchi.Structure(uchi.from_numpy(points, chr=chroms, coord=coords))
+    for source in (model, points):
+        with uchi.stats() as stats:
+            uchi.Widget(source)
+        recorded = [record.stage for record in stats.records]
+        assert recorded.count("encode") == 1
+        assert "decode" not in recorded
@@ -0,0 +1,85 @@
+import uchimata as uchi
+import numpy as np
+import pyarrow as pa
+import pytest
+
+def make_model():
+    points = np.arange(30, dtype=np.float64).reshape(10, 3)
+    return uchi.from_numpy(points,
+                           chr=np.array(["chr1"] * 5 + ["chr2"] * 5),
+                           coord=np.arange(10) * 100,
+                           count=np.arange(10))
+
+def test_coarsen_per_chromosome():
+    """Consecutive beads are merged without crossing chromosome boundaries"""
+    table = pa.ipc.open_stream(uchi.coarsen(make_model(), 2)).read_all()
+
+    assert table["chr"].to_pylist() == ["chr1", "chr1", "chr1", "chr2", "chr2", "chr2"]
+    assert table["coord"].to_pylist() == [0, 200, 400, 500, 700, 900]
+    assert table["count"].to_pylist() == [1, 5, 4, 11, 15, 9]
+    assert table["x"].to_pylist() == [1.5, 7.5, 12.0, 16.5, 22.5, 27.0]
+    assert table.schema.field("x").type == pa.float32()
+
+def test_pyramid_levels():
+    """The pyramid contains the full resolution and every requested level"""
+    levels = uchi.pyramid(uchi.Structure(make_model()), factors=(2, 4))
+    assert sorted(levels) == [1, 2, 4]
+    assert [levels[f].num_rows for f in (1, 2, 4)] == [10, 6, 4]
+
+def test_widget_progressive_lod():
+    """A progressive widget starts coarse and refines after the first render"""
+    model = make_model()
+    w = uchi.Widget(model, lod=4, progressive=True, project=False, bake=False)
+    assert pa.ipc.open_stream(w.structures[0]).read_all().num_rows == 4
+
+    w._handle_message(w, {"type": "rendered"}, [])
+    assert pa.ipc.open_stream(w.structures[0]).read_all().equals(uchi.Structure(model).table)
+
+def test_widget_full_resolution_after_refine():
+    """Structures re-sent or added after refine() are not coarsened"""
+    w = uchi.Widget(make_model(), lod=4, progressive=True)
+    w.refine()
+
+    w.update_viewconfig(0, color={"field": "count"})
+    assert pa.ipc.open_stream(w.structures[0]).read_all().num_rows == 10
+    w.add_structure(make_model())
+    assert pa.ipc.open_stream(w.structures[1]).read_all().num_rows == 10
+    w.options = {"center": False}
+    assert [pa.ipc.open_stream(s).read_all().num_rows for s in w.structures] == [10, 10]
+
+def test_widget_lod_viewconfig_values():
+    """Integer viewconfig values are averaged, not summed, when coarsened"""
+    points = np.arange(24, dtype=np.float64).reshape(8, 3)
+    w = uchi.Widget(points, lod=4, viewconfig={"color": {"values": np.arange(8)}})
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table["__values:color"].to_pylist() == [1.5, 5.5]
+    # list values are coarsened the same way
+    w = uchi.Widget(points, lod=4, viewconfig={"color": {"values": list(range(8))}})
+    assert w.viewconfigs[0]["color"] == {"field": "__values:color"}
+    assert pa.ipc.open_stream(w.structures[0]).read_all()["__values:color"].to_pylist() == [1.5, 5.5]
+
+def test_coarsen_keeps_haplotypes_apart():
+    """Beads of the two haplotypes of a chromosome are never merged"""
+    points = np.arange(30, dtype=np.float64).reshape(10, 3)
+    model = uchi.Structure(uchi.from_numpy(points, chr=np.array(["15(pat)"] * 5 + ["15(mat)"] * 5),
+                                           coord=np.tile(np.arange(5) * 100, 2)))
+    coarse = model.split_haplotypes().coarsen(4).table
+
+    assert coarse["chr"].to_pylist() == ["15"] * 4
+    assert coarse["haplotype"].to_pylist() == ["pat", "pat", "mat", "mat"]
+    assert coarse["x"].to_pylist() == [4.5, 12.0, 19.5, 27.0]
+
+def test_coarsen_sums_only_count_columns():
+    """Integer columns other than the count columns keep the first bead's value"""
+    points = np.arange(24, dtype=np.float64).reshape(8, 3)
+    model = uchi.Structure(uchi.from_numpy(points, chr=np.array(["chr1"] * 8), bead_id=np.arange(8) + 100,
+                                           peaks=np.array([1, 0, 2, 1, 0, 0, 3, 1])))
+    table = model.coarsen(4).table
+    assert table["bead_id"].to_pylist() == [100, 104]
+    assert table["peaks"].to_pylist() == [1, 0]
+
+    table = model.coarsen(4, sum=("peaks",)).table
+    assert table["peaks"].to_pylist() == [4, 4]
+    assert table.schema.field("peaks").type == pa.int64()
+    with pytest.raises(ValueError):
+        model.coarsen(4, sum=("chr",))
@@ -0,0 +1,96 @@
+import pathlib
+
+import uchimata as uchi
+from uchimata.readers import read, read_3dg, read_pdb, read_xyz
+import numpy as np
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).parent.parent
+TAN_3DG = ROOT / "data" / "tan-2018" / "GSE117876_RAW" / "selected" / "GSM3271347_gm12878_01.impute.3dg.txt"
+TAN_MODEL = ROOT / "data" / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow"
+
+STEVENS_MODELS = sorted((ROOT / "data" / "stevens-2017" / "out").glob("*Cell_1_model_*.arrow"))
+
+def test_load_many_in_order():
+    """Structures come back in input order, with their timings"""
+    results = uchi.load_many(STEVENS_MODELS, workers=4)
+    assert [r.path for r in results] == STEVENS_MODELS
+    for result in results:
+        assert result.error is None
+        assert result.seconds >= 0
+        assert result.structure.table.equals(uchi.Structure(result.path).table)
+
+def test_load_many_filters():
+    """Selection and coarsening are applied to every file"""
+    results = uchi.load_many(STEVENS_MODELS[:2], workers=2, region="chr f", lod=4)
+    expected = uchi.Structure(STEVENS_MODELS[1]).select("chr f").coarsen(4)
+    assert results[1].structure.table.equals(expected.table)
+
+def test_load_many_errors():
+    """A failing file is reported without aborting the batch"""
+    missing = STEVENS_MODELS[0].with_name("missing.arrow")
+    results = uchi.load_many([STEVENS_MODELS[0], missing, STEVENS_MODELS[1]], workers=2)
+    assert [r.error is None for r in results] == [True, False, True]
+    assert results[1].structure is None
+    assert isinstance(results[1].error, OSError)
+
+def test_read_3dg():
+    """The .3dg reader matches the converted Arrow file, also when streamed"""
+    expected = uchi.Structure(TAN_MODEL).table
+    assert read_3dg(TAN_3DG).table.equals(expected)
+    assert read(TAN_3DG).table.equals(expected)
+
+    batches = list(read_3dg(TAN_3DG, stream=True, block_size=1 << 16))
+    assert len(batches) > 1
+    assert uchi.Structure(pa.Table.from_batches(batches)).table.equals(expected)
+
+def test_read_xyz():
+    table = read_xyz(ROOT / "sample_data" / "test.xyz").table
+    assert table.num_rows == 97
+    # the bundled Arrow conversion is missing the last atom
+    expected = uchi.Structure(ROOT / "sample_data" / "test.arrow").table
+    assert table.slice(0, expected.num_rows).equals(expected)
+
+def write_pdb(path, models, remarks=0):
+    """Write models in the fixed-width layout of the Stevens et al. 2017 PDB files."""
+    with open(path, "w") as file:
+        file.write("HEADER    genome structure\n")
+        for i in range(remarks):
+            file.write(f"REMARK {i:3d} {'':70s}\n")
+        for n, table in enumerate(models, start=1):
+            file.write(f"MODEL     {n:4d}\n")
+            for i, row in enumerate(table.to_pylist(), start=1):
+                file.write(f"HETATM{i:5d}  C   {row['chr']:>5s}{1:4d}    "
+                           f"{row['x']:8.3f}{row['y']:8.3f}{row['z']:8.3f}{1.0:6.2f}{0.0:6.2f}"
+                           f"{'':14s}{row['coord']:10d}\n")
+            file.write("ENDMDL\n")
+        file.write("END\n")
+
+def test_read_pdb(tmp_path):
+    """Each model of a multi-model PDB file can be read, or all of them at once"""
+    models = [uchi.Structure(path).table.slice(0, 500) for path in STEVENS_MODELS[:3]]
+    path = tmp_path / "cell.pdb"
+    write_pdb(path, models)
+
+    second = read_pdb(path, model=1, block_size=1 << 12).table
+    assert second.column_names == ["x", "y", "z", "chr", "coord"]
+    assert second["chr"].to_pylist() == models[1]["chr"].to_pylist()
+    assert second["coord"].equals(models[1]["coord"])
+    assert np.allclose(second["x"].to_numpy(), models[1]["x"].to_numpy(), atol=1e-3)
+    assert read(path).num_rows == 500
+
+    everything = read_pdb(path, model=None, block_size=1 << 12).table
+    assert np.bincount(everything["model"].to_numpy()).tolist() == [500, 500, 500]
+
+def test_read_pdb_long_header(tmp_path):
+    """Models are numbered from the first MODEL record, even if it comes after the first block"""
+    models = [uchi.Structure(path).table.slice(0, 100) for path in STEVENS_MODELS[:2]]
+    path = tmp_path / "cell.pdb"
+    write_pdb(path, models, remarks=200)
+    assert path.read_text().index("MODEL") > 1 << 12
+
+    first = read_pdb(path, model=0, block_size=1 << 12).table
+    assert first["coord"].equals(models[0]["coord"])
+    assert read_pdb(path, model=1, block_size=1 << 12).table["coord"].equals(models[1]["coord"])
+    everything = read_pdb(path, model=None, block_size=1 << 12).table
+    assert np.bincount(everything["model"].to_numpy()).tolist() == [100, 100]
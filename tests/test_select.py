@@ -0,0 +1,102 @@
+import pathlib
+
+import uchimata as uchi
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+STEVENS_MODEL = pathlib.Path(__file__).parent.parent / "data" / "stevens-2017" / "out" / "Stevens-2017_GSM2219497_Cell_1_model_1.arrow"
+
+def read_stream(arrow_bytes):
+    return pa.ipc.open_stream(arrow_bytes).read_all()
+
+def test_select_bioframe_matches_intervals():
+    """Rows selected via a bedframe are exactly the rows inside any interval"""
+    model = STEVENS_MODEL.read_bytes()
+    regions = pd.DataFrame({
+        "chrom": ["chr a", "chr b", "chr a", "chr zz"],
+        "start": [3000000, 5000000, 4000000, 0],
+        "end": [5000000, 9000000, 10000000, 10],
+    })
+    selected = read_stream(uchi.select_bioframe(model, regions))
+
+    table = pa.ipc.open_file(model).read_all()
+    chrs = np.array(table["chr"].to_pylist())
+    coords = table["coord"].to_numpy()
+    expected = np.zeros(table.num_rows, dtype=bool)
+    for _, row in regions.iterrows():
+        expected |= (chrs == row["chrom"]) & (coords >= row["start"]) & (coords <= row["end"])
+
+    assert selected.num_rows == expected.sum()
+    assert selected["coord"].to_pylist() == coords[expected].tolist()
+    assert selected["chr"].to_pylist() == chrs[expected].tolist()
+
+def test_select_bioframe_no_overlap():
+    """Intervals on unknown chromosomes select nothing"""
+    model = STEVENS_MODEL.read_bytes()
+    regions = pd.DataFrame({"chrom": ["chr zz"], "start": [0], "end": [10]})
+    selected = read_stream(uchi.select_bioframe(model, regions))
+    assert selected.num_rows == 0
+
+def test_select_region():
+    """A chr:start-end query selects the inclusive coordinate range"""
+    model = STEVENS_MODEL.read_bytes()
+    selected = read_stream(uchi.select(model, "chr a:3000000-5000000"))
+    assert selected.num_rows == 21
+    assert set(selected["chr"].to_pylist()) == {"chr a"}
+    assert selected["coord"].to_pylist() == list(range(3000000, 5000001, 100000))
+
+def test_select_many_matches_select():
+    """Batch selection returns the same results as individual select() calls"""
+    model = STEVENS_MODEL.read_bytes()
+    queries = ["chr b", "chr a:3000000-5000000", ("chr c", 4000000, 4500000)]
+    results = uchi.select_many(model, queries)
+    assert len(results) == 3
+    assert read_stream(results[0]).equals(read_stream(uchi.select(model, "chr b")))
+    assert read_stream(results[1]).equals(read_stream(uchi.select(model, "chr a:3000000-5000000")))
+    assert read_stream(results[2]).equals(read_stream(uchi.select(model, "chr c:4000000-4500000")))
+
+def test_structure_index_unsorted_table():
+    """The index answers queries on tables that are not in genomic order"""
+    table = pa.table({
+        "x": [0.0, 1.0, 2.0, 3.0, 4.0],
+        "y": [0.0, 0.0, 0.0, 0.0, 0.0],
+        "z": [0.0, 0.0, 0.0, 0.0, 0.0],
+        "chr": ["chr2", "chr1", "chr2", "chr1", "chr1"],
+        "coord": [20, 30, 10, 10, 20],
+    })
+    index = uchi.StructureIndex(table)
+    assert index.chromosomes == ["chr2", "chr1"]
+    assert index.query("chr1")["coord"].to_pylist() == [10, 20, 30]
+    assert index.query("chr1", 15, 30)["x"].to_pylist() == [4.0, 1.0]
+    assert index.query("chr3").num_rows == 0
+
+    overlapping = index.query_intervals(pa.array(["chr1", "chr1", "chr2"]),
+                                        np.array([10, 15, 20]), np.array([20, 30, 25]))
+    assert overlapping["chr"].to_pylist() == ["chr2", "chr1", "chr1", "chr1"]
+    assert overlapping["coord"].to_pylist() == [20, 10, 20, 30]
+
+def test_select_without_coord():
+    """Whole chromosomes can be selected from tables without a 'coord' column"""
+    table = pa.table({
+        "x": [0.0, 1.0, 2.0, 3.0],
+        "y": [0.0, 0.0, 0.0, 0.0],
+        "z": [0.0, 0.0, 0.0, 0.0],
+        "chr": ["chr2", "chr1", "chr2", "chr1"],
+    })
+    model = uchi.Structure(table).to_bytes()
+    assert read_stream(uchi.select(model, "chr2"))["x"].to_pylist() == [0.0, 2.0]
+    assert [s.num_rows for s in uchi.select_many(uchi.Structure(table), ["chr1", "chr2"])] == [2, 2]
+    with pytest.raises(ValueError):
+        uchi.select(model, "chr2:0-10")
+
+def test_select_integer_chr():
+    """Chromosome names match integer 'chr' columns"""
+    points = np.arange(12, dtype=np.float64).reshape(4, 3)
+    model = uchi.from_numpy(points, chr=np.array([1, 1, 2, 2], dtype=np.int64), coord=np.array([0, 100, 0, 100]))
+    assert read_stream(model).schema.field("chr").type == pa.int64()
+    assert read_stream(uchi.select(model, "1"))["x"].to_pylist() == [0.0, 3.0]
+    assert read_stream(uchi.select(model, "2:50-150"))["coord"].to_pylist() == [100]
+    regions = pd.DataFrame({"chrom": ["2"], "start": [0], "end": [50]})
+    assert read_stream(uchi.select_bioframe(model, regions))["x"].to_pylist() == [6.0]
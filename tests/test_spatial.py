@@ -0,0 +1,142 @@
+import json
+
+import uchimata as uchi
+import numpy as np
+import pyarrow as pa
+
+def make_grid():
+    axis = np.arange(-2.0, 3.0)
+    return np.array(np.meshgrid(axis, axis, axis)).reshape(3, -1).T
+
+def clipped_points(arrow_bytes):
+    table = pa.ipc.open_stream(arrow_bytes).read_all()
+    return np.column_stack([table["x"].to_numpy(), table["y"].to_numpy(), table["z"].to_numpy()])
+
+def test_clip_shapes():
+    """Each clip shape keeps exactly the points inside it"""
+    points = make_grid()
+    model = uchi.from_numpy(points)
+
+    half = clipped_points(uchi.clip(model, plane=((0, 1, 0), 0.5)))
+    assert len(half) == (points[:, 1] > 0.5).sum()
+
+    inside = clipped_points(uchi.clip(model, box=((-1, -1, -1), (1, 1, 1))))
+    assert len(inside) == 27
+
+    ball = clipped_points(uchi.clip(model, sphere=((0, 0, 0), 1.0)))
+    assert len(ball) == 7
+
+    slab = clipped_points(uchi.clip(model, slab=((0, 0, 1), -0.5, 0.5)))
+    assert np.all(slab[:, 2] == 0.0)
+    assert len(slab) == 25
+
+def test_clip_combined_and_inverted():
+    """Shapes are intersected, and invert keeps the complement"""
+    points = make_grid()
+    model = uchi.from_numpy(points)
+
+    combined = clipped_points(uchi.clip(model, box=((-1, -1, -1), (1, 1, 1)), plane=[((1, 0, 0), 0), ((0, 1, 0), 0)]))
+    assert len(combined) == 3
+    assert np.all(combined[:, :2] == 1.0)
+
+    outside = clipped_points(uchi.clip(model, sphere=((0, 0, 0), 1.0), invert=True))
+    assert len(outside) == len(points) - 7
+
+def test_cut_matches_clip():
+    """cut() is the positive-x half-space clip"""
+    model = uchi.from_numpy(make_grid())
+    assert uchi.cut(model) == uchi.clip(model, plane=((1, 0, 0), 0))
+
+def test_cut_positive_x():
+    """cut keeps only the points with a positive x coordinate"""
+    structure = np.array([[-1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [2.0, 1.0, 0.0], [0.0, 2.0, 0.0]])
+    model = uchi.from_numpy(structure)
+    table = pa.ipc.open_stream(uchi.cut(model)).read_all()
+    assert table["x"].to_pylist() == [1.0, 2.0]
+
+def test_spatial_index_matches_brute_force():
+    """Radius and nearest-neighbour queries agree with a brute-force search"""
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(2000, 3))
+    index = uchi.SpatialIndex(pa.table({"x": points[:, 0], "y": points[:, 1], "z": points[:, 2]}))
+
+    for query in [np.zeros(3), np.array([1.5, -0.5, 0.2]), np.array([10.0, 10.0, 10.0])]:
+        distances = np.linalg.norm(points - query, axis=1)
+        for radius in [0.1, 0.5, 2.0]:
+            assert np.array_equal(index.query_radius(query, radius), np.flatnonzero(distances <= radius))
+
+        rows, knn_distances = index.query_knn(query, 10)
+        assert np.array_equal(rows, np.argsort(distances, kind="stable")[:10])
+        assert np.allclose(knn_distances, np.sort(distances)[:10])
+
+def test_neighbors_of_locus():
+    """A locus query searches around the centroid of the locus beads"""
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [5.0, 0.0, 0.0], [0.5, 0.5, 0.0]])
+    model = uchi.from_numpy(points, chr=np.array(["chr1", "chr1", "chr2", "chr2"]), coord=np.array([0, 100, 0, 100]))
+
+    around = pa.ipc.open_stream(uchi.neighbors(model, "chr1", 0.8)).read_all()
+    assert around["coord"].to_pylist() == [0, 100, 100]
+
+    closest = pa.ipc.open_stream(uchi.nearest(model, (4.0, 0.0, 0.0), 2)).read_all()
+    assert closest["x"].to_pylist() == [1.0, 5.0]
+
+def test_bounds_and_frame():
+    points = make_grid() * 2 + 10
+    stats = uchi.bounds(uchi.from_numpy(points))
+    assert stats["min"] == [6.0] * 3 and stats["max"] == [14.0] * 3
+    assert stats["centroid"] == [10.0] * 3 and stats["count"] == 125
+
+    # one frame over two structures keeps their relative position and size
+    f = uchi.frame(uchi.from_numpy(points), uchi.from_numpy(points + 8))
+    assert f["offset"] == [14.0] * 3 and f["scale"] == 1 / 16
+
+def test_widget_frame_metadata():
+    """Widgets send the frame computed in Python, or bake it into the coordinates"""
+    small = uchi.from_numpy(make_grid())
+    large = uchi.from_numpy(make_grid() * 10 + 100)
+
+    w = uchi.Widget(small, large, bake=False)
+    frames = [json.loads(pa.ipc.open_stream(s).read_all().schema.metadata[b"uchimata:frame"]) for s in w.structures]
+    assert frames[0] == {"offset": [0.0] * 3, "scale": 0.25}
+    assert frames[1] == {"offset": [100.0] * 3, "scale": 0.025}
+
+    # baked by default: coordinates in the display frame, with an identity frame
+    w = uchi.Widget(small, large, frame="shared")
+    frames = [json.loads(pa.ipc.open_stream(s).read_all().schema.metadata[b"uchimata:frame"]) for s in w.structures]
+    assert frames == [{"offset": [0.0] * 3, "scale": 1.0}] * 2
+    coords = [clipped_points(s) for s in w.structures]
+    assert np.allclose(coords[0].mean(axis=0), -coords[1].mean(axis=0))
+    assert np.isclose(np.ptp(np.vstack(coords), axis=0).max(), 1.0)
+    stats = json.loads(pa.ipc.open_stream(w.structures[1]).read_all().schema.metadata[b"uchimata:bounds"])
+    assert np.allclose(stats["max"], coords[1].max(axis=0))
+
+    w = uchi.Widget(small, options={"center": False, "normalize": False})
+    assert b"uchimata:frame" not in (pa.ipc.open_stream(w.structures[0]).read_all().schema.metadata or {})
+    w.options = {"center": True}
+    assert b"uchimata:frame" in pa.ipc.open_stream(w.structures[0]).read_all().schema.metadata
+
+def test_query_pairs_matches_brute_force():
+    points = np.random.default_rng(0).random((400, 3)) * 5
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+    expected = set(zip(*[rows.tolist() for rows in np.nonzero(np.triu(distances <= 0.7, 1))]))
+    for cell_size in (None, 0.3, 0.7, 2.0):
+        index = uchi.SpatialIndex(uchi.Structure(uchi.from_numpy(points)).table, cell_size)
+        rows_a, rows_b = index.query_pairs(0.7, chunk_size=64)
+        assert len(rows_a) == len(expected)
+        assert set(zip(rows_a.tolist(), rows_b.tolist())) == expected
+
+def test_contacts_ensemble():
+    """Contacts of all models are counted together"""
+    points = make_grid()
+    stretched = points * (1, 1, 3)
+    ensemble = uchi.StructureEnsemble(np.stack([points, points, stretched]))
+    pixels = uchi.contacts(ensemble, cutoff=1.0)
+    assert pixels.column_names == ["bin1_id", "bin2_id", "count"]
+
+    counts = {(a, b): c for a, b, c in zip(*[pixels[name].to_pylist() for name in pixels.column_names])}
+    # neighbours along z are only in contact in the two unstretched models
+    assert counts[(0, 1)] == 2
+    assert counts[(0, 5)] == 3
+    assert len(counts) == 3 * 4 * 25
+    assert np.all(np.diff(pixels["bin1_id"].to_numpy()) >= 0)
+    assert uchi.contacts(uchi.from_numpy(points), cutoff=1.0).num_rows == len(counts)
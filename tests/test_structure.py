@@ -0,0 +1,72 @@
+import concurrent.futures
+import pathlib
+
+import uchimata as uchi
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+STEVENS_MODEL = pathlib.Path(__file__).parent.parent / "data" / "stevens-2017" / "out" / "Stevens-2017_GSM2219497_Cell_1_model_1.arrow"
+
+def test_structure_chaining():
+    """Chained operations on a Structure match the bytes-based functions"""
+    model = STEVENS_MODEL.read_bytes()
+    structure = uchi.Structure(model)
+
+    chained = uchi.cut(uchi.select(structure, "chr f"))
+    assert isinstance(chained, uchi.Structure)
+
+    expected = pa.ipc.open_stream(uchi.cut(uchi.select(model, "chr f"))).read_all()
+    assert chained.table.equals(expected)
+    assert structure.select("chr f").cut().table.equals(expected)
+
+def test_select_accepts_stream_format():
+    """Query functions accept both the IPC file and the IPC stream format"""
+    model = STEVENS_MODEL.read_bytes()
+    stream_bytes = uchi.Structure(model).to_bytes()
+    assert not stream_bytes.startswith(b"ARROW1")
+
+    from_file = pa.ipc.open_stream(uchi.select(model, "chr b")).read_all()
+    from_stream = pa.ipc.open_stream(uchi.select(stream_bytes, "chr b")).read_all()
+    assert from_file.equals(from_stream)
+
+def test_structure_from_relation():
+    """Operations on a relation-backed Structure are composed lazily"""
+    table = pa.table({
+        "x": [-1.0, 1.0, 2.0, 3.0],
+        "y": [0.0, 0.0, 0.0, 0.0],
+        "z": [0.0, 0.0, 0.0, 0.0],
+        "chr": ["chr1", "chr1", "chr1", "chr2"],
+        "coord": [0, 100, 200, 0],
+    })
+    relation = duckdb.arrow(table)
+    structure = uchi.Structure(relation).select("chr1:0-150").cut()
+    assert repr(structure) == "Structure(<pending query>)"
+    assert structure.table["x"].to_pylist() == [1.0]
+
+def test_widget_accepts_structure():
+    """Widget serializes a Structure once when it is displayed"""
+    structure = uchi.Structure(np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]]))
+    w = uchi.Widget(structure)
+    assert len(w.structures) == 1
+    assert pa.ipc.open_stream(w.structures[0]).read_all().num_rows == 2
+
+def test_path_inputs(tmp_path):
+    """Paths to IPC file and stream format files are memory-mapped and queried"""
+    stream_path = tmp_path / "model.arrows"
+    stream_path.write_bytes(uchi.Structure(STEVENS_MODEL).to_bytes())
+
+    expected = pa.ipc.open_stream(uchi.select(STEVENS_MODEL.read_bytes(), "chr c")).read_all()
+    for path in [STEVENS_MODEL, str(STEVENS_MODEL), stream_path]:
+        selected = pa.ipc.open_stream(uchi.select(path, "chr c")).read_all()
+        assert selected.equals(expected)
+
+    w = uchi.Widget(STEVENS_MODEL)
+    assert pa.ipc.open_stream(w.structures[0]).read_all().num_rows == 25724
+
+def test_structure_cache_threads():
+    """Queries from many threads share the structure cache while it evicts"""
+    models = [uchi.from_numpy(np.full((4, 3), i, dtype=np.float64), chr=np.array(["chr1"] * 4)) for i in range(40)]
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        counts = list(pool.map(lambda model: uchi.Structure(uchi.select(model, "chr1")).num_rows, models * 5))
+    assert counts == [4] * 200
@@ -0,0 +1,61 @@
+import pathlib
+
+import uchimata as uchi
+import numpy as np
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).parent.parent
+STEVENS_MODELS = sorted((ROOT / "data" / "stevens-2017" / "out").glob("*.arrow"))
+
+def rotation(seed):
+    q, _ = np.linalg.qr(np.random.default_rng(seed).normal(size=(3, 3)))
+    return q * np.sign(np.linalg.det(q))
+
+def points_of(structure):
+    table = structure.table
+    return np.column_stack([table[axis].to_numpy() for axis in ("x", "y", "z")])
+
+def test_align_recovers_rigid_motion():
+    """A rotated and shifted copy is superposed back onto the original"""
+    points = np.random.default_rng(0).random((60, 3)) * 10
+    moved = points @ rotation(1).T + (5.0, -3.0, 2.0)
+    result = uchi.align(uchi.from_numpy(points), uchi.from_numpy(moved))
+    assert result.rmsd[0] < 1e-5
+    assert np.allclose(points_of(result.structures[0]), points, atol=1e-4)
+    assert result.structures[0].table["deviation"].to_numpy().max() < 1e-4
+
+    # a mirror image is not a rotation
+    mirrored = uchi.align(uchi.from_numpy(points), uchi.from_numpy(points * (-1, 1, 1)))
+    assert mirrored.rmsd[0] > 0.1
+
+def test_align_matches_genomic_positions():
+    """Beads are matched on (chr, coord), whatever their order, and unmatched beads are dropped"""
+    points = np.random.default_rng(2).random((6, 3))
+    chroms = ["a", "a", "a", "b", "b", "b"]
+    coords = [0, 10, 20, 0, 10, 20]
+    reference = uchi.from_numpy(points, chr=chroms, coord=coords)
+    order = [4, 0, 2, 5, 3]
+    shuffled = uchi.from_numpy(points[order] @ rotation(3).T,
+                               chr=[chroms[i] for i in order], coord=[coords[i] for i in order])
+
+    result = uchi.align(reference, shuffled)
+    assert result.reference.table["coord"].to_pylist() == [0, 20, 0, 10, 20]
+    assert result.structures[0].table["chr"].to_pylist() == ["a", "a", "b", "b", "b"]
+    assert result.rmsd[0] < 1e-5
+
+def test_align_ensemble():
+    """All models of an ensemble are superposed in one pass, like separate structures"""
+    ensemble = uchi.StructureEnsemble(STEVENS_MODELS[:4])
+    result = uchi.align(ensemble, ensemble)
+    assert len(result.structures) == 4
+    assert result.rmsd[0] < 1e-6 and np.all(result.rmsd[1:] > 0)
+    assert np.allclose(result.rmsd, uchi.align(STEVENS_MODELS[0], *STEVENS_MODELS[:4]).rmsd)
+
+    bead_rmsd = result.reference.table["rmsd"].to_numpy()
+    deviations = np.stack([s.table["deviation"].to_numpy() for s in result.structures])
+    assert np.allclose(bead_rmsd, np.sqrt((deviations ** 2).mean(axis=0)))
+
+def test_align_without_genomic_columns():
+    with pytest.raises(ValueError):
+        uchi.align(uchi.from_numpy(np.zeros((3, 3))), uchi.from_numpy(np.zeros((4, 3))))
@@ -0,0 +1,61 @@
+import pathlib
+
+import uchimata as uchi
+import bioframe
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).parent.parent
+STEVENS_MODEL = ROOT / "data" / "stevens-2017" / "out" / "Stevens-2017_GSM2219497_Cell_1_model_1.arrow"
+
+def random_track(structure, n, seed=0):
+    rng = np.random.default_rng(seed)
+    table = structure.table
+    chroms = np.asarray(table["chr"].to_pylist())
+    coords = table["coord"].to_numpy()
+    rows = rng.integers(0, len(chroms), n)
+    starts = coords[rows] + rng.integers(-200_000, 200_000, n)
+    return pd.DataFrame({
+        "chrom": chroms[rows],
+        "start": starts,
+        "end": starts + rng.integers(1, 400_000, n),
+        "value": rng.random(n),
+    })
+
+def test_infer_resolution():
+    assert uchi.tracks.infer_resolution(uchi.Structure(STEVENS_MODEL).table) == 100_000
+
+def test_annotate_matches_bioframe():
+    """Counts and sums equal a bioframe join on bins of the model resolution"""
+    model = uchi.Structure(STEVENS_MODEL)
+    track = random_track(model, 5000)
+
+    df = model.table.to_pandas()
+    bins = pd.DataFrame({"chrom": df["chr"].astype(str), "start": df["coord"], "end": df["coord"] + 100_000})
+    expected = bioframe.count_overlaps(bins, track)["count"].to_numpy()
+    overlaps = bioframe.overlap(bins.assign(bin=np.arange(len(bins))), track, how="left", suffixes=("", "_track"))
+    expected_sum = overlaps.groupby("bin")["value_track"].sum().reindex(np.arange(len(bins))).fillna(0).to_numpy()
+
+    annotated = uchi.annotate(model, track, how="sum")
+    counts = uchi.annotate(annotated, track).table["count"].to_numpy()
+    assert np.array_equal(counts, expected)
+    assert np.allclose(annotated.table["value_sum"].to_numpy(), expected_sum)
+
+def test_annotate_mean_and_bytes():
+    points = np.zeros((4, 3))
+    model = uchi.from_numpy(points, chr=["a", "a", "a", "b"], coord=[0, 10, 20, 0])
+    track = pa.table({"chrom": ["a", "a", "b", "c"], "start": [5, 12, 0, 0], "end": [15, 13, 1, 5], "value": [1.0, 3.0, 5.0, 7.0]})
+
+    table = uchi.Structure(uchi.annotate(model, track, how="mean")).table
+    assert table["value_mean"].to_pylist() == [1.0, 2.0, None, 5.0]
+    table = uchi.Structure(uchi.annotate(model, track, name="genes")).table
+    assert table["genes"].to_pylist() == [1, 2, 0, 1]
+
+def test_annotate_invalid():
+    model = uchi.Structure(STEVENS_MODEL)
+    with pytest.raises(ValueError):
+        model.annotate(pd.DataFrame({"chrom": ["chr a"], "start": [0]}))
+    with pytest.raises(ValueError):
+        model.annotate(random_track(model, 10), how="median")
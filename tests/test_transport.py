@@ -0,0 +1,79 @@
+import pathlib
+
+import uchimata as uchi
+from uchimata import transport
+from uchimata.transport import decode_coordinates, encode_coordinates
+import numpy as np
+import pyarrow as pa
+import pytest
+
+TAN_MODEL = pathlib.Path(__file__).parent.parent / "data" / "tan-2018" / "out" / "Tan-2018_GSM3271347_gm12878_01.arrow"
+
+@pytest.mark.parametrize("encoding, bytes_per_coordinate", [("float32", 4), ("float16", 2), ("int16", 2)])
+def test_encoding_roundtrip(encoding, bytes_per_coordinate):
+    """Encoded coordinates shrink the payload and decode within the error bound"""
+    table = uchi.Structure(TAN_MODEL).table
+    encoded = encode_coordinates(table, encoding)
+    assert encoded["x"].nbytes == table.num_rows * bytes_per_coordinate
+    assert encoded["chr"].equals(table["chr"])
+
+    decoded = decode_coordinates(encoded)
+    assert decoded.schema.metadata is None
+    for axis in ["x", "y", "z"]:
+        original = table[axis].to_numpy()
+        restored = decoded[axis].to_numpy()
+        extent = original.max() - original.min()
+        if encoding == "int16":
+            assert np.abs(restored - original).max() <= extent / 65534
+        else:
+            assert np.abs(restored - original).max() <= 1e-3 * extent
+
+def test_widget_encoding():
+    """Widget sends the encoded structure with its dequantization metadata"""
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 2.0, 3.0], [2.0, 4.0, 6.0]])
+    w = uchi.Widget(points, encoding="int16", options={"center": False, "normalize": False})
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table.schema.field("x").type == pa.int16()
+    assert table.schema.metadata[b"uchimata:encoding"] == b"int16"
+    assert np.allclose(decode_coordinates(table)["z"].to_numpy(), [0.0, 3.0, 6.0], atol=1e-3)
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        uchi.Widget(np.zeros((2, 3)), encoding="int8")
+
+@pytest.mark.parametrize("codec", ["zstd", "lz4"])
+def test_compression_roundtrip(codec):
+    """Compressed payloads are smaller and read back to the same table"""
+    table = uchi.Structure(TAN_MODEL).table
+    uncompressed = uchi.Structure(table).to_bytes()
+    uchi.set_compression(codec, min_bytes=0)
+    try:
+        # bytes of the public API stay Arrow IPC, with compressed buffers
+        compressed = uchi.Structure(table).to_bytes()
+        assert transport.compression_codec(compressed) is None
+        assert len(compressed) < len(uncompressed)
+        assert pa.ipc.open_stream(compressed).read_all().equals(table)
+
+        selected = uchi.select(compressed, "chr1")
+        assert pa.ipc.open_stream(selected).read_all().equals(uchi.Structure(table).select("chr1").table)
+
+        # the widget compresses whole payloads for the front end
+        w = uchi.Widget(table, project=False, options={"center": False, "normalize": False})
+        assert transport.compression_codec(w.structures[0]) == codec
+        assert uchi.Structure(w.structures[0]).table.equals(table)
+    finally:
+        uchi.set_compression(None)
+
+def test_compression_min_bytes():
+    """Payloads below the threshold are left uncompressed"""
+    uchi.set_compression("zstd")
+    try:
+        small = uchi.from_numpy(np.zeros((10, 3)))
+        assert transport.compression_codec(small) is None
+        assert pa.ipc.open_stream(small).read_all().num_rows == 10
+    finally:
+        uchi.set_compression(None)
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        uchi.set_compression("gzip")
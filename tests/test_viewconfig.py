@@ -1,6 +1,7 @@
 import uchimata as uchi
 import numpy as np
 import pyarrow as pa
+import pytest
 
 def test_no_viewconfig_supplied():
     """Test that widget works without viewconfig (uses default empty dict)"""
@@ -25,3 +26,72 @@ def test_multiple_structures_no_viewconfig():
     assert len(w.structures) == 2
     assert len(w.viewconfigs) == 2
     assert all(v == {} for v in w.viewconfigs)
+
+def test_update_viewconfig():
+    """Updating one viewconfig leaves the others untouched"""
+    struct1 = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    struct2 = np.array([[2.0, 0.0, 0.0], [3.0, 0.0, 0.0]])
+    vc = {"color": "red", "scale": 0.01}
+
+    w = uchi.Widget(struct1, struct2, viewconfig=vc)
+    w.update_viewconfig(1, color="blue")
+    assert w.viewconfigs[0] == vc
+    assert w.viewconfigs[1] == {"color": "blue", "scale": 0.01}
+
+    w.update_viewconfig(-1, {"color": "green"})
+    assert w.viewconfigs[1] == {"color": "green"}
+
+def test_add_and_remove_structure():
+    """Structures can be appended and removed after the widget is created"""
+    struct1 = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    struct2 = np.array([[2.0, 0.0, 0.0], [3.0, 0.0, 0.0], [4.0, 0.0, 0.0]])
+
+    w = uchi.Widget(struct1)
+    w.add_structure(struct2, {"color": "blue"})
+    assert len(w.structures) == 2
+    assert w.viewconfigs[1] == {"color": "blue"}
+    assert pa.ipc.open_stream(w.structures[1]).read_all().num_rows == 3
+
+    w.remove_structure(0)
+    assert len(w.structures) == 1
+    assert w.viewconfigs == [{"color": "blue"}]
+
+def test_projection_to_viewconfig_fields():
+    """Only the coordinates, chr and the fields used by the viewconfig are sent"""
+    points = np.arange(12, dtype=np.float64).reshape(4, 3)
+    model = uchi.from_numpy(points, chr=np.array(["chr1", "chr1", "chr2", "chr2"]),
+                            coord=np.arange(4) * 100, count=np.arange(4), other=np.zeros(4))
+
+    w = uchi.Widget(model, viewconfig={"color": {"field": "count", "colorScale": "Blues"}})
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table.column_names == ["x", "y", "z", "chr", "count"]
+    # chr is sent plain, so the front end can load the table without decoding it
+    assert table.schema.field("chr").type == pa.string()
+    assert table["chr"].to_pylist() == ["chr1", "chr1", "chr2", "chr2"]
+
+    # the structure is sent again once the viewconfig needs another column
+    w.update_viewconfig(0, scale={"field": "coord", "min": 0, "max": 300})
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table.column_names == ["x", "y", "z", "chr", "coord", "count"]
+
+    w = uchi.Widget(model, project=False, bake=False)
+    assert pa.ipc.open_stream(w.structures[0]).read_all().equals(uchi.Structure(model).table)
+
+def test_array_values_sent_as_columns():
+    """numpy values in a viewconfig travel as a column instead of a JSON list"""
+    points = np.arange(12, dtype=np.float64).reshape(4, 3)
+    values = np.array([0.5, 1.5, 2.5, 3.5])
+
+    w = uchi.Widget(points, viewconfig={"color": {"values": values, "colorScale": "Viridis"}})
+    assert w.viewconfigs[0] == {"color": {"field": "__values:color", "colorScale": "Viridis"}}
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table["__values:color"].to_pylist() == values.tolist()
+
+    # replacing the values re-sends the structure with the new column
+    w.update_viewconfig(0, color={"values": pa.array([3, 2, 1, 0])}, scale={"values": values})
+    table = pa.ipc.open_stream(w.structures[0]).read_all()
+    assert table["__values:color"].to_pylist() == [3, 2, 1, 0]
+    assert table["__values:scale"].to_pylist() == values.tolist()
+
+    with pytest.raises(ValueError):
+        uchi.Widget(points, viewconfig={"color": {"values": np.zeros(3)}})